@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+广告分析结果的结构定义：用于Ollama的format参数约束输出，并对返回结果做类型校验
+"""
+
+import json
+import threading
+from dataclasses import dataclass, asdict
+
+AD_TYPES = ('硬广', '软广', '无')
+
+_decoder = json.JSONDecoder()
+
+# 传给Ollama format参数的JSON Schema
+AD_RESULT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'is_ad': {'type': 'boolean'},
+        'ad_type': {'type': 'string', 'enum': list(AD_TYPES)},
+        'product_name': {'type': 'string'},
+        'ad_text': {'type': 'string'},
+        'confidence': {'type': 'number', 'minimum': 0, 'maximum': 1},
+        'timestamp': {'type': 'string'},
+    },
+    'required': ['is_ad', 'ad_type', 'product_name', 'ad_text', 'confidence', 'timestamp'],
+}
+
+
+@dataclass
+class AdAnalysis:
+    """
+    单个视频（或窗口）的广告分析结果
+    """
+    is_ad: bool
+    ad_type: str
+    product_name: str
+    ad_text: str
+    confidence: float
+    timestamp: str
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        校验并构造结果，不符合结构时抛出ValueError
+        """
+        if not isinstance(data, dict):
+            raise ValueError(f"结果不是JSON对象: {type(data).__name__}")
+        missing = [name for name in AD_RESULT_SCHEMA['required'] if name not in data]
+        if missing:
+            raise ValueError(f"缺少字段: {missing}")
+        if not isinstance(data['is_ad'], bool):
+            raise ValueError(f"is_ad 不是布尔值: {data['is_ad']!r}")
+        if data['ad_type'] not in AD_TYPES:
+            raise ValueError(f"ad_type 取值无效: {data['ad_type']!r}")
+        confidence = data['confidence']
+        if isinstance(confidence, bool) or not isinstance(confidence, (int, float)) or not 0 <= confidence <= 1:
+            raise ValueError(f"confidence 不在0-1之间: {confidence!r}")
+        for name in ('product_name', 'ad_text', 'timestamp'):
+            if not isinstance(data[name], str):
+                raise ValueError(f"{name} 不是字符串: {data[name]!r}")
+        return cls(
+            is_ad=data['is_ad'],
+            ad_type=data['ad_type'],
+            product_name=data['product_name'],
+            ad_text=data['ad_text'],
+            confidence=float(confidence),
+            timestamp=data['timestamp'],
+        )
+
+    @classmethod
+    def from_json(cls, text):
+        """
+        解析JSON文本（不做正则提取和修补），失败时抛出ValueError
+
+        与流式调用的JsonObjectScanner一致，从第一个 { 开始解析一个完整对象，忽略其后多余的文本
+        """
+        if not text:
+            raise ValueError("响应为空")
+        start = text.find('{')
+        if start < 0:
+            raise ValueError("响应中没有JSON对象")
+        try:
+            data, _ = _decoder.raw_decode(text, start)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON解析失败: {e}")
+        return cls.from_dict(data)
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+
+class ParseStats:
+    """
+    结构化输出的解析统计（多线程安全）
+    """
+
+    def __init__(self):
+        self.responses = 0
+        self.failures = 0
+        self.reasks = 0
+        self.exhausted = 0
+        self._lock = threading.Lock()
+
+    def record(self, ok, reask=False):
+        with self._lock:
+            self.responses += 1
+            if not ok:
+                self.failures += 1
+            if reask:
+                self.reasks += 1
+
+    def record_exhausted(self):
+        with self._lock:
+            self.exhausted += 1
+
+    @property
+    def failure_rate(self):
+        return self.failures / self.responses if self.responses else 0.0
+
+    def report(self):
+        with self._lock:
+            return {
+                'responses': self.responses,
+                'failures': self.failures,
+                'failure_rate': self.failure_rate,
+                'reasks': self.reasks,
+                'exhausted': self.exhausted,
+            }
+
+    def print_report(self):
+        report = self.report()
+        if not report['responses']:
+            return report
+        print(f"结构化输出: 响应 {report['responses']} 个，解析失败 {report['failures']} 个"
+              f"（失败率 {report['failure_rate']:.1%}），重新请求 {report['reasks']} 次，"
+              f"超出重试次数 {report['exhausted']} 个")
+        return report
+
+
+# 进程内共享的解析统计
+parse_stats = ParseStats()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可替换的语音识别后端，transcribe() 均返回与openai-whisper相同结构的结果
+（text、segments[id/seek/start/end/text/tokens/temperature/avg_logprob/compression_ratio/no_speech_prob]、language）
+
+- whisper：openai-whisper，fp32，默认后端
+- faster-whisper：CTranslate2实现，CPU上使用int8量化，需要安装faster-whisper
+"""
+
+ASR_BACKENDS = ('whisper', 'faster-whisper')
+DEFAULT_ASR_BACKEND = 'whisper'
+
+
+class WhisperBackend:
+    """
+    openai-whisper后端
+    """
+
+    name = 'whisper'
+
+    def __init__(self, model_name="base", cpu_threads=None):
+        import whisper
+        self.model_name = model_name
+        self.model = whisper.load_model(model_name)
+
+    def load_audio(self, path):
+        return load_audio(path, self.name)
+
+    def transcribe(self, audio, language='zh'):
+        return self.model.transcribe(audio, language=language)
+
+
+class FasterWhisperBackend:
+    """
+    faster-whisper后端：CPU int8推理，贪心解码（与whisper.transcribe的默认解码方式一致）
+    """
+
+    name = 'faster-whisper'
+
+    def __init__(self, model_name="base", cpu_threads=None, compute_type='int8'):
+        import faster_whisper
+        self.model_name = model_name
+        self.model = faster_whisper.WhisperModel(
+            model_name, device='cpu', compute_type=compute_type, cpu_threads=cpu_threads or 0
+        )
+
+    def load_audio(self, path):
+        return load_audio(path, self.name)
+
+    def transcribe(self, audio, language='zh'):
+        segments, info = self.model.transcribe(audio, language=language, beam_size=1, vad_filter=False)
+        result_segments = []
+        for i, segment in enumerate(segments):
+            result_segments.append({
+                'id': i,
+                'seek': segment.seek,
+                'start': segment.start,
+                'end': segment.end,
+                'text': segment.text,
+                'tokens': list(segment.tokens),
+                'temperature': segment.temperature,
+                'avg_logprob': segment.avg_logprob,
+                'compression_ratio': segment.compression_ratio,
+                'no_speech_prob': segment.no_speech_prob,
+            })
+        return {
+            'text': ''.join(segment['text'] for segment in result_segments),
+            'segments': result_segments,
+            'language': info.language,
+        }
+
+
+def load_audio(path, backend=DEFAULT_ASR_BACKEND):
+    """
+    读取音频文件为16kHz单声道float32数组（不加载模型）
+    """
+    if backend == 'faster-whisper':
+        import faster_whisper
+        return faster_whisper.decode_audio(path, sampling_rate=16000)
+    import whisper
+    return whisper.load_audio(path)
+
+
+def load_backend(backend=DEFAULT_ASR_BACKEND, model_name="base", cpu_threads=None):
+    """
+    按名称创建并加载后端模型
+    """
+    if backend == 'whisper':
+        return WhisperBackend(model_name, cpu_threads)
+    if backend == 'faster-whisper':
+        return FasterWhisperBackend(model_name, cpu_threads)
+    raise ValueError(f"未知的ASR后端: {backend}")
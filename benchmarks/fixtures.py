@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试用的合成数据：按视频数量生成文件名、发布时间、Ollama响应、转写分段、
+分析文件和结果表，结构与output目录下的真实文件一致；同一个seed生成的数据相同
+"""
+
+import os
+import json
+import random
+import string
+
+import pandas as pd
+
+# 合成数据中出现的商品名称和填充语句
+PRODUCTS = (
+    '索尼A7M4', '大疆Pocket3', '戴森吹风机', '小米手环8', '罗技MX Master', '苹果AirPods', '佳能R6',
+    '乐高机械组', '科沃斯扫地机', '九号平衡车', 'Switch OLED', '漫步者耳机', '雷蛇键盘', '石头洗地机',
+)
+FILLER = (
+    '今天我们来聊一聊', '大家好欢迎回到我的频道', '这个地方真的太漂亮了', '接下来我们去下一个景点',
+    '我觉得这个还是挺不错的', '天气有点冷大家注意保暖', '最近一直在忙工作的事情', '感谢大家的支持',
+    '这一期视频就到这里', '我们下期再见', '先给大家看一下这个', '说实话我也没想到',
+)
+
+# 转写文本池的大小：find_text_timestamps在多个视频间复用这些转写，避免数据量随视频数线性增长
+TRANSCRIPT_POOL = 64
+
+
+def bilibili_id(rng):
+    return 'BV1' + ''.join(rng.choice(string.ascii_letters + string.digits) for _ in range(9))
+
+
+def make_filenames(n, seed=0):
+    """
+    生成n个带B站ID的视频文件名
+    """
+    rng = random.Random(seed)
+    return [f"视频标题{i} [{bilibili_id(rng)}].mp4" for i in range(n)]
+
+
+def make_published(filenames, seed=0):
+    """
+    生成published.json的内容：约一半按文件名匹配，约四成只能按ID匹配，其余没有发布时间
+    """
+    rng = random.Random(seed)
+    published = {}
+    for filename in filenames:
+        roll = rng.random()
+        if roll >= 0.9:
+            continue
+        video_id = filename[filename.index('[') + 1:filename.index(']')]
+        info = {'publish_date': f"20{rng.randint(20, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"}
+        if roll < 0.5:
+            info['filename'] = filename
+        published[video_id] = info
+    return published
+
+
+def make_ollama_response(rng):
+    """
+    生成一条Ollama响应：多数是合法JSON，部分带说明文字、末尾多余逗号或没有JSON
+    """
+    is_ad = rng.random() < 0.4
+    result = {
+        'is_ad': is_ad,
+        'ad_type': rng.choice(('硬广', '软广')) if is_ad else '无',
+        'product_name': '、'.join(rng.sample(PRODUCTS, rng.randint(1, 2))) if is_ad else '',
+        'ad_text': rng.choice(FILLER) if is_ad else '',
+        'confidence': round(rng.random(), 2),
+        'timestamp': '',
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    roll = rng.random()
+    if roll < 0.15:
+        return f"根据分析，结果如下：\n```json\n{text}\n```\n以上是分析结果。"
+    if roll < 0.25:
+        return text.replace('"timestamp": ""', '"timestamp": "",').replace('}', ',}')
+    if roll < 0.3:
+        return '无法判断该内容是否包含广告。'
+    return text
+
+
+def make_ollama_responses(n, seed=0):
+    rng = random.Random(seed)
+    return [make_ollama_response(rng) for _ in range(n)]
+
+
+def make_segments(rng, count=200, products=()):
+    """
+    生成whisper格式的转写分段，商品名称随机出现在若干分段中
+    """
+    segments = []
+    start = 0.0
+    for i in range(count):
+        duration = rng.uniform(1.5, 6.0)
+        text = rng.choice(FILLER)
+        if products and rng.random() < 0.05:
+            text += rng.choice(products)
+        segments.append({
+            'id': i, 'seek': 0, 'start': round(start, 2), 'end': round(start + duration, 2), 'text': text,
+            'tokens': [], 'temperature': 0.0, 'avg_logprob': -0.3,
+            'compression_ratio': 1.2, 'no_speech_prob': 0.05,
+        })
+        start += duration
+    return segments
+
+
+def make_transcript_jobs(n, segments_per_video=200, seed=0):
+    """
+    生成n个 (转写数据, 搜索文本) 任务，转写数据从固定大小的池中循环取用
+    """
+    rng = random.Random(seed)
+    pool = []
+    for _ in range(min(n, TRANSCRIPT_POOL)):
+        products = rng.sample(PRODUCTS, 2)
+        segments = make_segments(rng, segments_per_video, products)
+        pool.append(({'segments': segments, 'text': ''.join(s['text'] for s in segments)}, products))
+    jobs = []
+    for i in range(n):
+        transcript, products = pool[i % len(pool)]
+        search_texts = products[:1] if rng.random() < 0.5 else products + [rng.choice(PRODUCTS)]
+        jobs.append((transcript, search_texts))
+    return jobs
+
+
+def make_results_frame(n, seed=0):
+    """
+    生成网页使用的结果表（generate_webpage.PAGE_COLUMNS）
+    """
+    rng = random.Random(seed)
+    filenames = make_filenames(n, seed)
+    rows = []
+    for filename in filenames:
+        is_ad = rng.random() < 0.4
+        product_name = rng.choice(('、'.join(rng.sample(PRODUCTS, 2)), rng.choice(PRODUCTS), '无', '')) if is_ad else ''
+        ads_time = '; '.join(f"{rng.randint(0, 30):02d}:{rng.randint(0, 59):02d}" for _ in range(rng.randint(0, 3)))
+        rows.append({
+            '文件名': filename,
+            '发布时间': f"20{rng.randint(20, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            '是否包含广告': is_ad,
+            '商品名称': product_name,
+            '广告文本': rng.choice(FILLER) if is_ad else '',
+            '置信度': round(rng.random(), 2),
+            'ads_time': ads_time if is_ad else '',
+        })
+    return pd.DataFrame(rows)
+
+
+def write_output_tree(root, n, segments_per_video=20, seed=0):
+    """
+    在root下生成output/analysis/*_analysis.json和output/published.json，
+    返回视频路径列表（视频文件本身不需要存在）
+    """
+    rng = random.Random(seed)
+    filenames = make_filenames(n, seed)
+    analysis_dir = os.path.join(root, 'output', 'analysis')
+    os.makedirs(analysis_dir, exist_ok=True)
+    for filename in filenames:
+        segments = make_segments(rng, segments_per_video)
+        analysis = {
+            'transcript_path': os.path.join('output', 'transcript', os.path.splitext(filename)[0] + '.npz'),
+            'model': 'qwen2:7b-instruct',
+            'prompt_version': 2,
+            'analysis_mode': 'full',
+            'output_format': 'text',
+            'analysis_result': make_ollama_response(rng),
+            'segments': segments,
+        }
+        path = os.path.join(analysis_dir, os.path.splitext(filename)[0] + '_analysis.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(analysis, f, ensure_ascii=False)
+    with open(os.path.join(root, 'output', 'published.json'), 'w', encoding='utf-8') as f:
+        json.dump(make_published(filenames, seed), f, ensure_ascii=False)
+    return [os.path.join('videos', filename) for filename in filenames]
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+热点函数的基准测试：用合成数据按视频数量（默认100、1万、10万）测量耗时和峰值内存
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 100,10k --only summarize_results --json bench.json
+
+耗时取多次运行的最小值；峰值内存用tracemalloc在单独的一次运行中测量（只统计Python分配的内存）。
+某个函数在较小规模下超过 --max-seconds 时跳过更大的规模。
+所有文件在临时目录中生成，不会读写项目的output目录
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fixtures  # noqa: E402
+
+DEFAULT_SIZES = '100,10k,100k'
+
+
+def parse_size(value):
+    value = value.strip().lower()
+    if value.endswith('k'):
+        return int(float(value[:-1]) * 1000)
+    return int(value)
+
+
+class OutputTree:
+    """
+    summarize_results读取当前目录下的output目录，同一规模只生成一次
+    """
+
+    def __init__(self, workdir):
+        self.workdir = workdir
+        self.size = None
+        self.video_files = None
+
+    def prepare(self, n):
+        if self.size != n:
+            shutil.rmtree(os.path.join(self.workdir, 'output'), ignore_errors=True)
+            self.video_files = fixtures.write_output_tree(self.workdir, n)
+            self.size = n
+        return self.video_files
+
+    def reset_results(self):
+        """
+        删除汇总缓存和结果数据集（冷启动）
+        """
+        output_dir = os.path.join(self.workdir, 'output')
+        shutil.rmtree(os.path.join(output_dir, 'results'), ignore_errors=True)
+        summary_path = os.path.join(output_dir, 'summary.sqlite')
+        if os.path.exists(summary_path):
+            os.remove(summary_path)
+
+
+def build_benchmarks(tree):
+    """
+    返回 {名称: setup(n)}，setup返回 (被测函数, 每次运行前调用的重置函数或None)
+    """
+    import main
+    import generate_webpage
+    import video_timestamp
+    from publish_index import PublishDateIndex
+
+    def parse_ollama_response(n):
+        responses = fixtures.make_ollama_responses(n)
+        return (lambda: [main.parse_ollama_response(text) for text in responses]), None
+
+    def get_publish_date(n):
+        filenames = fixtures.make_filenames(n)
+        index = PublishDateIndex(fixtures.make_published(filenames))
+        return (lambda: [main.get_publish_date(filename, index) for filename in filenames]), None
+
+    def summarize_cold(n):
+        video_files = tree.prepare(n)
+        return (lambda: main.summarize_results(video_files)), tree.reset_results
+
+    def summarize_warm(n):
+        video_files = tree.prepare(n)
+        tree.reset_results()
+        with quiet():
+            main.summarize_results(video_files)
+        return (lambda: main.summarize_results(video_files)), None
+
+    def find_text_timestamps(n):
+        jobs = fixtures.make_transcript_jobs(n)
+        return (lambda: [video_timestamp.find_text_timestamps(data, texts) for data, texts in jobs]), None
+
+    def generate_html(n):
+        df = fixtures.make_results_frame(n)
+        return (lambda: generate_webpage.generate_html(df)), None
+
+    def count_brand_videos(n):
+        df = fixtures.make_results_frame(n)
+        return (lambda: generate_webpage.count_brand_videos(df)), None
+
+    return {
+        'parse_ollama_response': parse_ollama_response,
+        'get_publish_date': get_publish_date,
+        'summarize_results(cold)': summarize_cold,
+        'summarize_results(warm)': summarize_warm,
+        'find_text_timestamps': find_text_timestamps,
+        'generate_html': generate_html,
+        'count_brand_videos': count_brand_videos,
+    }
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    屏蔽被测函数的打印输出
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def measure(run, reset=None, repeat=3):
+    """
+    返回 (最短耗时秒数, tracemalloc峰值字节数)
+    """
+    timings = []
+    for _ in range(repeat):
+        if reset is not None:
+            reset()
+        gc.collect()
+        with quiet():
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+
+    if reset is not None:
+        reset()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        with quiet():
+            run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(timings), peak
+
+
+def print_table(results, sizes):
+    names = list(dict.fromkeys(result['name'] for result in results))
+    by_key = {(result['name'], result['size']): result for result in results}
+    header = f"{'函数':<26}" + ''.join(f"{f'n={size}':>24}" for size in sizes)
+    print('\n' + header)
+    print('-' * len(header))
+    for name in names:
+        cells = []
+        for size in sizes:
+            result = by_key.get((name, size))
+            if result is None:
+                cells.append(f"{'-':>24}")
+            elif result.get('skipped'):
+                cells.append(f"{'超时跳过':>20}")
+            else:
+                cells.append(f"{result['seconds']:>10.3f}s {result['peak_mb']:>10.1f}MB")
+        print(f"{name:<26}" + ''.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='热点函数基准测试（合成数据）')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'视频数量，逗号分隔，可用k表示千（默认: {DEFAULT_SIZES}）')
+    parser.add_argument('--only', default=None, help='只运行名称包含该字符串的基准测试')
+    parser.add_argument('--repeat', type=int, default=3, help='每个规模计时的运行次数，取最小值（默认: 3）')
+    parser.add_argument('--max-seconds', type=float, default=60.0,
+                        help='单次运行超过该时间后跳过更大的规模（默认: 60）')
+    parser.add_argument('--json', default=None, help='将结果保存为JSON文件')
+    parser.add_argument('--keep-workdir', action='store_true', help='保留生成的临时目录')
+    args = parser.parse_args()
+
+    sizes = sorted(parse_size(size) for size in args.sizes.split(','))
+    json_path = os.path.abspath(args.json) if args.json else None
+    workdir = tempfile.mkdtemp(prefix='ad-bench-')
+    cwd = os.getcwd()
+    # main.py导入时会在当前目录下创建output子目录，因此先切换到临时目录
+    os.chdir(workdir)
+    results = []
+    try:
+        tree = OutputTree(workdir)
+        benchmarks = build_benchmarks(tree)
+        if args.only:
+            benchmarks = {name: setup for name, setup in benchmarks.items() if args.only in name}
+        too_slow = set()
+        for size in sizes:
+            for name, setup in benchmarks.items():
+                if name in too_slow:
+                    results.append({'name': name, 'size': size, 'skipped': True})
+                    continue
+                with quiet():
+                    run, reset = setup(size)
+                seconds, peak = measure(run, reset, args.repeat)
+                result = {'name': name, 'size': size, 'seconds': seconds, 'peak_mb': peak / 1024 / 1024}
+                results.append(result)
+                print(f"{name:<26} n={size:<8} {seconds:>10.3f}s  峰值内存 {result['peak_mb']:.1f}MB")
+                if seconds > args.max_seconds:
+                    too_slow.add(name)
+                del run, reset
+                gc.collect()
+    finally:
+        os.chdir(cwd)
+        if args.keep_workdir:
+            print(f"临时目录: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(results, sizes)
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {json_path}")
+
+
+if __name__ == '__main__':
+    main()
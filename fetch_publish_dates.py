@@ -9,8 +9,11 @@ import json
 import os
 import re
 import time
+import argparse
 from typing import Dict, List
 
+from profiling import DEFAULT_PROFILE_DIR, configure_default_profiler, close_default_profiler, profile_section
+
 def extract_bilibili_id(filename):
     """
     从文件名中提取B站视频ID
@@ -54,24 +57,21 @@ def get_video_info(video_id):
         print(f"获取视频信息失败 {video_id}: {e}")
         return None
 
-def main():
+def fetch_all():
     """
-    主函数
+    抓取结果中所有B站视频的发布时间并保存
     """
     csv_path = os.path.join('output', 'ads_summary.csv')
     published_path = os.path.join('output', 'published.json')
     
-    if not os.path.exists(csv_path):
-        print(f"错误: 文件不存在 {csv_path}")
-        return
-    
-    # 读取CSV文件
+    # 只读取文件名列（结果数据集不存在时读取CSV文件）
     try:
-        import pandas as pd
-        df = pd.read_csv(csv_path)
-        print(f"成功加载 {len(df)} 条记录")
+        from results_dataset import load_results
+        df = load_results(['文件名'], csv_path=csv_path)
     except Exception as e:
-        print(f"读取CSV文件失败: {e}")
+        print(f"读取结果失败: {e}")
+        return
+    if df is None:
         return
     
     # 提取所有B站ID
@@ -91,7 +91,8 @@ def main():
     for video_id, filename in video_ids.items():
         print(f"获取视频信息: {video_id} ({filename})")
         
-        video_info = get_video_info(video_id)
+        with profile_section('fetch', filename):
+            video_info = get_video_info(video_id)
         if video_info:
             publish_time = video_info.get('pubdate', 0)
             if publish_time > 0:
@@ -126,5 +127,20 @@ def main():
     except Exception as e:
         print(f"保存文件失败: {e}")
 
+def main():
+    """
+    主函数
+    """
+    parser = argparse.ArgumentParser(description='抓取B站视频发布时间')
+    parser.add_argument('--profile', action='store_true', help='性能剖析：按视频记录cProfile数据及内存峰值')
+    parser.add_argument('--profile-dir', default=DEFAULT_PROFILE_DIR, help=f'性能剖析结果目录（默认: {DEFAULT_PROFILE_DIR}）')
+    args = parser.parse_args()
+
+    configure_default_profiler('fetch_publish_dates', args.profile, args.profile_dir)
+    try:
+        fetch_all()
+    finally:
+        close_default_profiler()
+
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -8,29 +8,14 @@
 import os
 import argparse
 
+from manifest import DEFAULT_MANIFEST_PATH, Manifest
+from video_index import scan_videos
+
 def get_video_files(dir_path):
     """
-    遍历目录，返回所有mp4文件的绝对路径和大小信息
+    遍历目录，返回所有mp4文件的绝对路径和大小信息（使用与main.py共享的目录索引）
     """
-    video_files = []
-    min_size_mb = 5  # 最小文件大小（MB）
-    min_size_bytes = min_size_mb * 1024 * 1024  # 转换为字节
-    
-    for root, dirs, files in os.walk(dir_path):
-        for file in files:
-            if file.lower().endswith('.mp4'):
-                file_path = os.path.join(root, file)
-                try:
-                    file_size = os.path.getsize(file_path)
-                    video_files.append({
-                        'path': file_path,
-                        'size_bytes': file_size,
-                        'size_mb': file_size / (1024 * 1024),
-                        'filename': os.path.basename(file_path)
-                    })
-                except OSError as e:
-                    print(f"无法获取文件大小: {file_path}, 错误: {e}")
-    return video_files
+    return scan_videos(dir_path)
 
 def delete_output_files(video_filename, output_dirs):
     """
@@ -99,6 +84,7 @@ def main():
     
     # 删除对应的输出文件
     total_deleted = 0
+    manifest = Manifest() if not args.dry_run and os.path.exists(DEFAULT_MANIFEST_PATH) else None
     
     for video in small_files:
         print(f"\n处理文件: {video['filename']} ({video['size_mb']:.1f}MB)")
@@ -116,6 +102,9 @@ def main():
             # 实际删除文件
             deleted_files = delete_output_files(video['filename'], output_dirs)
             total_deleted += len(deleted_files)
+            # 同时删除清单中的记录，避免main.py按清单误判为已处理
+            if manifest is not None:
+                manifest.delete(video['path'])
     
     if args.dry_run:
         print(f"\n[DRY RUN] 将删除 {total_deleted} 个输出文件")
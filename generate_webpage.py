@@ -7,8 +7,15 @@
 import pandas as pd
 import re
 import os
+import argparse
 from datetime import datetime
 
+from profiling import DEFAULT_PROFILE_DIR, configure_default_profiler, close_default_profiler, profile_section
+from results_dataset import load_results
+
+# 网页用到的结果列
+PAGE_COLUMNS = ['文件名', '发布时间', '是否包含广告', '商品名称', '广告文本', '置信度', 'ads_time']
+
 def extract_bilibili_id(filename):
     """
     从文件名中提取B站视频ID
@@ -864,27 +871,41 @@ def main():
     """
     主函数
     """
+    parser = argparse.ArgumentParser(description='生成广告数据展示网页')
+    parser.add_argument('--profile', action='store_true', help='性能剖析：按阶段记录cProfile数据及内存峰值')
+    parser.add_argument('--profile-dir', default=DEFAULT_PROFILE_DIR, help=f'性能剖析结果目录（默认: {DEFAULT_PROFILE_DIR}）')
+    args = parser.parse_args()
+
+    configure_default_profiler('generate_webpage', args.profile, args.profile_dir)
+    try:
+        build_page()
+    finally:
+        close_default_profiler()
+
+def build_page():
+    """
+    读取结果并生成网页
+    """
     csv_path = os.path.join('output', 'ads_summary.csv')
     html_path = os.path.join('output', 'ads_display.html')
     
     print("开始生成广告数据展示网页...")
     
-    # 检查CSV文件是否存在
-    if not os.path.exists(csv_path):
-        print(f"错误: 文件不存在 {csv_path}")
-        return
-    
     try:
-        # 读取CSV文件
-        df = pd.read_csv(csv_path)
-        print(f"成功加载 {len(df)} 条记录")
+        # 只读取网页需要的列（结果数据集不存在时读取CSV文件）
+        with profile_section('load'):
+            df = load_results(PAGE_COLUMNS, csv_path=csv_path)
+        if df is None:
+            return
         
         # 生成HTML
-        html_content = generate_html(df)
+        with profile_section('generate_html'):
+            html_content = generate_html(df)
         
         # 保存HTML文件
-        with open(html_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        with profile_section('write'):
+            with open(html_path, 'w', encoding='utf-8') as f:
+                f.write(html_content)
         
         print(f"网页生成成功！")
         print(f"文件保存到: {html_path}")
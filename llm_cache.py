@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM分析结果缓存：以 (模型名, 提示词版本, 转写文本) 的哈希为键，
+保存在单个SQLite文件中，超过容量上限时按最近最少使用淘汰到容量的90%
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from metrics import record_report
+
+DEFAULT_CACHE_PATH = os.path.join('output', 'llm_cache.sqlite')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# 超出容量时淘汰到容量的该比例，避免之后每次写入都触发淘汰
+LOW_WATERMARK = 0.9
+# 每批淘汰的条目数
+EVICT_BATCH = 500
+# 命中时的访问时间先记在内存中，累计到该数量（或写入、关闭时）再批量写回
+ACCESS_FLUSH = 256
+
+
+def make_cache_key(model_name, prompt_version, text):
+    """
+    计算缓存键：相同模型、相同提示词版本、相同文本得到相同的键
+    """
+    payload = json.dumps([model_name, str(prompt_version), text], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    基于SQLite的LLM结果缓存（多线程安全）
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)')
+        self._conn.commit()
+        # 已用容量（字节）只在打开和淘汰时从数据库统计，写入时增量维护
+        self._total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        # {键: 最近访问时间}，尚未写回数据库
+        self._pending_access = {}
+
+    def get(self, key):
+        """
+        读取缓存，未命中返回None
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT response FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._pending_access[key] = time.time()
+            if len(self._pending_access) >= ACCESS_FLUSH:
+                self._flush_access()
+                self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def _flush_access(self):
+        if self._pending_access:
+            self._conn.executemany(
+                'UPDATE entries SET last_access = ? WHERE key = ?',
+                [(last_access, key) for key, last_access in self._pending_access.items()],
+            )
+            self._pending_access.clear()
+
+    def put(self, key, model_name, prompt_version, response):
+        """
+        写入缓存，并在超出容量时淘汰最久未使用的条目
+        """
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self._lock:
+            old = self._conn.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, model_name, str(prompt_version), response, size, now, now),
+            )
+            self._pending_access.pop(key, None)
+            self._total += size - (old[0] if old is not None else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """
+        按最近访问时间分批淘汰，直到已用容量降到低水位
+        """
+        # 先写回访问时间，刚命中的条目不会被淘汰；其他进程也可能写入了同一文件，重新统计已用容量
+        self._flush_access()
+        self._total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        target = self.max_bytes * LOW_WATERMARK
+        while self._total > target:
+            rows = self._conn.execute(
+                'SELECT size FROM entries ORDER BY last_access LIMIT ?', (EVICT_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            count = freed = 0
+            for (size,) in rows:
+                if self._total - freed <= target:
+                    break
+                count += 1
+                freed += size
+            self._conn.execute(
+                'DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_access LIMIT ?)',
+                (count,),
+            )
+            self._total -= freed
+            self.evictions += count
+
+    def close(self):
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._conn.close()
+
+    def report(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def print_report(self):
+        if self.hits or self.misses:
+            print(f"LLM缓存: 命中 {self.hits} 次，未命中 {self.misses} 次，淘汰 {self.evictions} 条")
+        return self.report()
+
+
+# 进程内共享的默认缓存，None表示禁用
+_default_cache = None
+
+
+def configure_default_cache(path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, enabled=True):
+    """
+    按参数重新创建默认缓存
+    """
+    global _default_cache
+    close_default_cache()
+    if enabled:
+        _default_cache = LLMCache(path, max_bytes)
+    return _default_cache
+
+
+def get_default_cache():
+    return _default_cache
+
+
+def close_default_cache():
+    global _default_cache
+    if _default_cache is not None:
+        record_report('llm_cache', _default_cache.print_report())
+        _default_cache.close()
+        _default_cache = None
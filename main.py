@@ -1,81 +1,235 @@
 import os
 from pathlib import Path
 import subprocess
-import whisper
 import json
 import argparse
-import requests
 import pandas as pd
 import re
+import time
+import socket
+import sqlite3
+import itertools
+import wave
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+from functools import partial
+
+from ad_schema import AD_RESULT_SCHEMA, AdAnalysis, parse_stats
+from llm_cache import (
+    DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES, configure_default_cache, close_default_cache, get_default_cache,
+    make_cache_key,
+)
+from manifest import (
+    DEFAULT_MANIFEST_PATH, configure_default_manifest, close_default_manifest, get_default_manifest, quick_hash,
+)
+from ollama_client import (
+    OLLAMA_URL, DEFAULT_TIMEOUT, DEFAULT_KEEP_ALIVE, configure_default_client, close_default_client,
+    get_default_client,
+)
+from metrics import (
+    DEFAULT_METRICS_DIR, configure_default_metrics, close_default_metrics, inc, observe, record_event,
+    record_report, timed,
+)
+from pipeline import Stage, run_pipeline
+from profiling import DEFAULT_PROFILE_DIR, configure_default_profiler, close_default_profiler, profile_section, profiled
+from windowed_analysis import build_windows, merge_window_results
+from prescreen import DEFAULT_LEXICON_PATH, NO_AD_RESULT, Prescreen, load_lexicon, prescreen_stats
+from publish_index import load_publish_index
+from results_dataset import (
+    DEFAULT_DATASET_DIR, append_rows, dataset_exists, export_csv as export_results_csv, read_results,
+)
+from segment_filter import SegmentFilter, filter_stats
+from summary_cache import SummaryCache
+from asr_backends import ASR_BACKENDS, DEFAULT_ASR_BACKEND
+from transcriber import TranscriptionEngine, transcribe_to_file
+from vad import VAD_METHODS
+from transcript_store import (
+    DEFAULT_TRANSCRIPT_FORMAT, TRANSCRIPT_FORMATS, find_transcript, load_transcript, transcript_filename,
+)
+from video_index import scan_videos, watch_videos
+from work_queue import (
+    DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS, DEFAULT_QUEUE_PATH, LeaseKeeper, WorkQueue, default_worker_id,
+)
 
 # 指定视频目录
 VIDEO_DIR = os.path.expanduser('~/Downloads/ajjj/')
 
 
-def get_video_files(dir_path):
+# 最小视频文件大小，更小的文件跳过
+MIN_VIDEO_SIZE_BYTES = 5 * 1024 * 1024
+
+
+def get_video_infos(dir_path, full_scan=False):
+    """
+    扫描目录，返回所有mp4文件的信息（过滤5MB以下的文件）
+    使用持久化索引，只重新列出有变化的目录
+    """
+    video_infos = []
+    for info in scan_videos(dir_path, full_scan):
+        if info['size_bytes'] >= MIN_VIDEO_SIZE_BYTES:
+            video_infos.append(info)
+        else:
+            print(f"跳过小文件 ({info['size_mb']:.1f}MB): {info['path']}")
+    return video_infos
+
+
+def get_video_files(dir_path, full_scan=False):
     """
     遍历目录，返回所有mp4文件的绝对路径（过滤5MB以下的文件）
     """
-    video_files = []
-    min_size_mb = 5  # 最小文件大小（MB）
-    min_size_bytes = min_size_mb * 1024 * 1024  # 转换为字节
-    
-    for root, dirs, files in os.walk(dir_path):
-        for file in files:
-            if file.lower().endswith('.mp4'):
-                file_path = os.path.join(root, file)
-                # 检查文件大小
-                try:
-                    file_size = os.path.getsize(file_path)
-                    if file_size >= min_size_bytes:
-                        video_files.append(file_path)
-                    else:
-                        print(f"跳过小文件 ({file_size / (1024*1024):.1f}MB): {file_path}")
-                except OSError as e:
-                    print(f"无法获取文件大小: {file_path}, 错误: {e}")
-    return video_files
+    return [info['path'] for info in get_video_infos(dir_path, full_scan)]
 
 
 OUTPUT_AUDIO_DIR = os.path.join('output', 'audio')
 os.makedirs(OUTPUT_AUDIO_DIR, exist_ok=True)
 
-def extract_audio(video_path, audio_path):
+def extract_audio(video_path, audio_path, timeout=None):
     """
-    使用ffmpeg提取音频为16kHz单声道wav
+    使用ffmpeg提取音频为16kHz单声道wav（超时后终止ffmpeg并返回False）
     """
+    # 先写临时文件再改名，其他进程（或其他机器）不会读到写了一半的文件
+    tmp_path = f"{audio_path}.{socket.gethostname()}-{os.getpid()}.tmp"
     cmd = [
-        'ffmpeg', '-y', '-i', video_path,
-        '-vn', '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1', audio_path
+        'ffmpeg', '-nostdin', '-y', '-i', video_path,
+        '-vn', '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1', '-f', 'wav', tmp_path
     ]
+    start = time.perf_counter()
     try:
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+        os.replace(tmp_path, audio_path)
+        record_ffmpeg(video_path, 'wav', time.perf_counter() - start, get_wav_duration(audio_path))
         return True
     except subprocess.CalledProcessError as e:
         print(f"提取音频失败: {video_path}\n错误: {e}")
+        record_ffmpeg(video_path, 'wav', time.perf_counter() - start, status='failed')
+        return False
+    except subprocess.TimeoutExpired:
+        print(f"提取音频超时（{timeout}s）: {video_path}")
+        record_ffmpeg(video_path, 'wav', time.perf_counter() - start, status='timeout')
         return False
+    finally:
+        # 删除失败或超时留下的临时文件
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 
-def transcribe_audio(audio_path, transcript_path, model_name="base"):
+def record_ffmpeg(video_path, mode, seconds, audio_seconds=0.0, status='done'):
     """
-    使用whisper将音频转为带时间戳的中文文本，保存为json
+    记录一次ffmpeg调用的耗时（mode: wav写文件 / memory内存解码）
     """
-    model = whisper.load_model(model_name)
-    result = model.transcribe(audio_path, language='zh')
-    # 保存转写结果
-    with open(transcript_path, 'w', encoding='utf-8') as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
-    return result
+    record_event('ffmpeg', video=video_path, mode=mode, status=status, seconds=round(seconds, 3),
+                 audio_seconds=round(audio_seconds, 3))
+    observe('ffmpeg_seconds', seconds, mode=mode, status=status)
+    inc('ffmpeg_audio_seconds', audio_seconds, mode=mode)
 
-OUTPUT_TRANSCRIPT_DIR = os.path.join('output', 'transcript')
-os.makedirs(OUTPUT_TRANSCRIPT_DIR, exist_ok=True)
 
+# whisper要求的采样率
+SAMPLE_RATE = 16000
 
-def analyze_text_with_ollama(text, timestamps, model_name="qwen2:7b-instruct"):
+def decode_audio(video_path, timeout=None):
     """
-    使用Ollama分析文本，判断是否包含广告及商品信息
+    使用ffmpeg将音频直接解码为16kHz单声道float32数组（不落盘），
+    可直接传给whisper，避免写WAV后whisper再解码一次
     """
-    prompt = f"""
-    你是一位专精于社交媒体内容剖析的中文广告识别专家。请你仔细分析以下文字，判断其是否通过日常生活记录或个人分享的方式，隐晦地植入了商品或品牌的宣传信息，即使没有任何推荐语、营销语或购买引导。
+    cmd = [
+        'ffmpeg', '-nostdin', '-threads', '0', '-i', video_path,
+        '-vn', '-f', 'f32le', '-acodec', 'pcm_f32le', '-ar', str(SAMPLE_RATE), '-ac', '1', '-'
+    ]
+    start = time.perf_counter()
+    try:
+        out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             timeout=timeout).stdout
+    except subprocess.CalledProcessError as e:
+        print(f"解码音频失败: {video_path}\n错误: {e.stderr.decode(errors='ignore')[-500:]}")
+        record_ffmpeg(video_path, 'memory', time.perf_counter() - start, status='failed')
+        return None
+    except subprocess.TimeoutExpired:
+        print(f"解码音频超时（{timeout}s）: {video_path}")
+        record_ffmpeg(video_path, 'memory', time.perf_counter() - start, status='timeout')
+        return None
+    audio = np.frombuffer(out, np.float32)
+    record_ffmpeg(video_path, 'memory', time.perf_counter() - start, len(audio) / SAMPLE_RATE)
+    return audio
+
+
+def get_wav_duration(audio_path):
+    """
+    读取WAV文件时长（秒），读取失败返回0
+    """
+    try:
+        with wave.open(audio_path, 'rb') as f:
+            return f.getnframes() / float(f.getframerate())
+    except (OSError, wave.Error, EOFError):
+        return 0.0
+
+
+class ExtractionStats:
+    """
+    音频提取吞吐统计（多线程安全）
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.videos = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, audio_seconds):
+        with self._lock:
+            self.videos += 1
+            self.audio_seconds += audio_seconds
+
+    def record_failure(self):
+        with self._lock:
+            self.failed += 1
+
+    def report(self):
+        with self._lock:
+            elapsed = max(time.perf_counter() - self.start_time, 1e-9)
+            return {
+                'videos': self.videos,
+                'failed': self.failed,
+                'audio_seconds': self.audio_seconds,
+                'elapsed_seconds': elapsed,
+                'videos_per_second': self.videos / elapsed,
+                'audio_hours_per_second': self.audio_seconds / 3600 / elapsed,
+            }
+
+    def print_report(self):
+        report = self.report()
+        if not report['videos'] and not report['failed']:
+            return report
+        print(f"音频提取: 成功 {report['videos']} 个，失败 {report['failed']} 个，"
+              f"音频共 {report['audio_seconds'] / 3600:.2f} 小时，耗时 {report['elapsed_seconds']:.1f}s")
+        print(f"提取吞吐: {report['videos_per_second']:.2f} 视频/s，"
+              f"{report['audio_hours_per_second']:.3f} 音频小时/s")
+        return report
+
+
+def transcribe_audio(audio, transcript_path, model_name="base", vad=None, backend=DEFAULT_ASR_BACKEND):
+    """
+    使用whisper将音频转为带时间戳的中文文本，保存为.npz或.json
+    audio可以是音频文件路径或decode_audio返回的数组
+    （模型在进程内缓存，不会每个文件重新加载；vad不为None时只转写语音片段）
+    """
+    return transcribe_to_file(audio, transcript_path, model_name, vad, backend)
+
+OUTPUT_TRANSCRIPT_DIR = os.path.join('output', 'transcript')
+os.makedirs(OUTPUT_TRANSCRIPT_DIR, exist_ok=True)
+
+
+# 默认分析模型
+ANALYSIS_MODEL = "qwen2:7b-instruct"
+# 提示词模板版本，修改下方提示词后需递增，使缓存和已有分析结果失效
+PROMPT_VERSION = 2
+
+# 固定的分析指令，作为system提示词放在转写文本之前：每次调用的前缀完全相同，
+# Ollama可以复用已评估的前缀，每次只需评估转写文本部分
+ANALYSIS_SYSTEM_PROMPT = """你是一位专精于社交媒体内容剖析的中文广告识别专家。请你仔细分析用户给出的文字，判断其是否通过日常生活记录或个人分享的方式，隐晦地植入了商品或品牌的宣传信息，即使没有任何推荐语、营销语或购买引导。
 
 请特别关注以下类型的内容：
 - 作者是否在介绍某项活动（如拍摄、运动、学习、日常生活等）时顺带提及某个具体品牌或产品；
@@ -87,9 +241,6 @@ def analyze_text_with_ollama(text, timestamps, model_name="qwen2:7b-instruct"):
 
 即使没有推荐、购买、优惠等引导语，只要内容中出现真实商品、使用描述或可能对观众产生影响，都应视为潜在软广。
 
-内容如下：
-{text}
-
 请以JSON格式返回结果，包含以下字段：
 - is_ad: 是否包含广告（true/false）
 - ad_type: 广告类型（硬广/软广/无）
@@ -100,49 +251,202 @@ def analyze_text_with_ollama(text, timestamps, model_name="qwen2:7b-instruct"):
 
 只返回JSON格式结果，不要其他文字。"""
 
-    try:
-        response = requests.post(
-            'http://localhost:11434/api/generate',
-            json={
-                'model': model_name,
-                'prompt': prompt,
-                'stream': False
-            },
-            timeout=300
-        )
-        response.raise_for_status()
-        result = response.json()
-        return result['response']
-    except Exception as e:
-        print(f"Ollama调用失败: {e}")
-        return None
+
+@dataclass
+class AnalysisConfig:
+    """
+    广告分析配置
+    """
+    model_name: str = ANALYSIS_MODEL
+    # 分窗分析的窗口token上限，0表示整段分析
+    window_tokens: int = 0
+    window_overlap: int = 200
+    # 使用JSON Schema约束输出并校验，失败时最多重新请求max_reasks次
+    structured: bool = False
+    max_reasks: int = 2
+    # 发送前按whisper置信度过滤分段，None表示不过滤
+    segment_filter: Optional[SegmentFilter] = None
+    # 词典预筛，未命中的文本（窗口）不调用Ollama，None表示不预筛
+    prescreen: Optional[Prescreen] = None
+
+    @property
+    def analysis_mode(self):
+        mode = 'windowed' if self.window_tokens > 0 else 'full'
+        # 过滤或预筛后送给模型的内容不同，分析方式单独记录，切换时结果视为过期
+        if self.segment_filter is not None:
+            mode += '+filtered'
+        if self.prescreen is not None:
+            mode += '+prescreen'
+        return mode
+
+    @property
+    def output_format(self):
+        return 'schema' if self.structured else 'text'
+
+
+def analyze_text_with_ollama(text, timestamps, model_name=ANALYSIS_MODEL, structured=False, max_reasks=2):
+    """
+    使用Ollama分析文本，判断是否包含广告及商品信息
+    （通过共享的长连接客户端发送，可在多个线程中并发调用）
+
+    结果按 (模型, 提示词版本, 文本) 缓存，相同文本不会重复调用Ollama
+    structured为True时通过format参数约束输出为AD_RESULT_SCHEMA，校验失败时
+    最多重新请求max_reasks次，仍失败返回None（下次运行会重新分析）
+    """
+    cache = get_default_cache()
+    cache_version = f"{PROMPT_VERSION}-schema" if structured else PROMPT_VERSION
+    cache_key = make_cache_key(model_name, cache_version, text)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    # 只有转写文本随视频变化，固定的指令放在system中
+    prompt = f"内容如下：\n{text}"
+
+    client = get_default_client()
+    if not structured:
+        try:
+            result = client.complete(prompt, model_name, system=ANALYSIS_SYSTEM_PROMPT)
+            response = result['response']
+            if cache is not None and response and response.strip():
+                cache.put(cache_key, model_name, cache_version, response)
+            return response
+        except Exception as e:
+            print(f"Ollama调用失败: {e!r}")
+            return None
+
+    for attempt in range(max_reasks + 1):
+        try:
+            result = client.complete(prompt, model_name, system=ANALYSIS_SYSTEM_PROMPT, format=AD_RESULT_SCHEMA)
+        except Exception as e:
+            print(f"Ollama调用失败: {e!r}")
+            return None
+        try:
+            with timed('parse_seconds', format='schema'):
+                analysis = AdAnalysis.from_json(result['response'])
+        except ValueError as e:
+            parse_stats.record(False, reask=attempt < max_reasks)
+            print(f"结构化输出校验失败（第 {attempt + 1} 次）: {e}")
+            continue
+        parse_stats.record(True)
+        response = analysis.to_json()
+        if cache is not None:
+            cache.put(cache_key, model_name, cache_version, response)
+        return response
+
+    parse_stats.record_exhausted()
+    print(f"结构化输出连续 {max_reasks + 1} 次校验失败，放弃本次分析")
+    return None
 
 OUTPUT_ANALYSIS_DIR = os.path.join('output', 'analysis')
 os.makedirs(OUTPUT_ANALYSIS_DIR, exist_ok=True)
 
-def analyze_transcript(transcript_path, analysis_path):
+def prescreen_text(text, prescreen):
+    """
+    词典预筛，返回 (是否需要LLM分析, 命中的词条)
+    """
+    candidate, hits = prescreen.screen(text)
+    prescreen_stats.record(candidate)
+    return candidate, hits
+
+
+def analyze_windows(segments, config):
+    """
+    分窗分析：将分段组成有重叠的窗口并发分析，再合并为视频级结果
+    返回 (合并后的结果JSON字符串, 各窗口结果列表)
+    """
+    windows = build_windows(segments, config.window_tokens, config.window_overlap)
+    if not windows:
+        return None, []
+
+    def analyze_window(window):
+        # 词典预筛未命中的窗口直接判为无广告
+        if config.prescreen is not None and not prescreen_text(window['text'], config.prescreen)[0]:
+            return json.dumps(NO_AD_RESULT, ensure_ascii=False)
+        return analyze_text_with_ollama(
+            window['text'], window['segments'], config.model_name, config.structured, config.max_reasks
+        )
+
+    client = get_default_client()
+    with ThreadPoolExecutor(max_workers=min(len(windows), client.max_in_flight)) as executor:
+        responses = list(executor.map(analyze_window, windows))
+    # 任一窗口调用失败则整体视为失败，下次运行重新分析（成功的窗口会命中缓存）
+    if any(response is None for response in responses):
+        return None, []
+
+    parsed_results = [parse_ollama_response(response) for response in responses]
+    merged = merge_window_results(windows, parsed_results)
+    window_results = [
+        {'start': window['start'], 'end': window['end'], 'analysis_result': response}
+        for window, response in zip(windows, responses)
+    ]
+    return json.dumps(merged, ensure_ascii=False), window_results
+
+
+def analyze_transcript(transcript_path, analysis_path, config=None):
     """
     分析转写文本，判断广告信息
+
+    config.window_tokens > 0 时使用分窗分析，每次提示词长度与视频时长无关
     """
-    with open(transcript_path, 'r', encoding='utf-8') as f:
-        transcript_data = json.load(f)
+    if config is None:
+        config = AnalysisConfig()
+
+    transcript_data = load_transcript(transcript_path)
     
     # 获取转写文本
     text = transcript_data.get('text', '')
     segments = transcript_data.get('segments', [])
+    prompt_segments = segments
+    filter_result = None
+    if config.segment_filter is not None and segments:
+        # 去掉无语音、低置信度和重复的分段，只发送保留的文本
+        prompt_segments, filter_result = config.segment_filter.apply(segments)
+        text = ''.join(segment['text'] for segment in prompt_segments)
+        filter_stats.record(filter_result)
+        print(f"分段过滤: 保留 {filter_result['kept']}/{filter_result['segments']} 段，"
+              f"提示词约 {filter_result['tokens_before']} -> {filter_result['tokens_after']} token: {transcript_path}")
     
-    # 分析整个文本
-    analysis_result = analyze_text_with_ollama(text, segments)
+    window_results = None
+    prescreen_result = None
+    if config.prescreen is not None and not (config.window_tokens > 0 and prompt_segments):
+        prescreen_result = prescreen_text(text, config.prescreen)
+
+    if config.window_tokens > 0 and prompt_segments:
+        # 分窗分析（每个窗口单独预筛）
+        analysis_result, window_results = analyze_windows(prompt_segments, config)
+    elif prescreen_result is not None and not prescreen_result[0]:
+        # 未命中任何品牌/商品词和触发词，不调用Ollama
+        print(f"词典预筛未命中，判为无广告: {transcript_path}")
+        analysis_result = json.dumps(NO_AD_RESULT, ensure_ascii=False)
+    else:
+        # 分析整个文本
+        analysis_result = analyze_text_with_ollama(
+            text, prompt_segments, config.model_name, config.structured, config.max_reasks
+        )
     
-    # 保存分析结果
+    # 保存分析结果（记录模型、提示词版本和分析方式，用于判断结果是否过期）
     result = {
         'transcript_path': transcript_path,
+        'model': config.model_name,
+        'prompt_version': PROMPT_VERSION,
+        'analysis_mode': config.analysis_mode,
+        'output_format': config.output_format,
         'analysis_result': analysis_result,
         'segments': segments
     }
+    if window_results:
+        result['windows'] = window_results
+    if filter_result is not None:
+        result['segment_filter'] = filter_result
+    if prescreen_result is not None:
+        result['prescreen'] = {'candidate': prescreen_result[0], 'hits': prescreen_result[1]}
     
-    with open(analysis_path, 'w', encoding='utf-8') as f:
+    tmp_path = f"{analysis_path}.{socket.gethostname()}-{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
         json.dump(result, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, analysis_path)
     
     return result
 
@@ -150,91 +454,741 @@ def analyze_transcript(transcript_path, analysis_path):
 def parse_args():
     parser = argparse.ArgumentParser(description='解析视频文件中的广告')
     parser.add_argument('-f', '--force', action='store_true', help='强制覆盖已存在的输出文件')
+    parser.add_argument('--whisper-model', default='base', help='whisper模型大小（默认: base）')
+    parser.add_argument('--asr-workers', type=int, default=1,
+                        help='转写工作进程数，每个进程只加载一次模型（默认: 1）')
+    parser.add_argument('--torch-threads', type=int, default=None,
+                        help='每个转写进程的torch线程数（默认: torch自动设置）')
+    parser.add_argument('--asr-backend', choices=ASR_BACKENDS, default=DEFAULT_ASR_BACKEND,
+                        help='语音识别后端：whisper（openai-whisper，fp32）或 faster-whisper（CPU int8，'
+                             '需要安装faster-whisper）（默认: whisper）')
+    parser.add_argument('--chunk-seconds', type=float, default=0,
+                        help='长音频在静音处切成约N秒的块，由多个转写进程并行转写后拼接'
+                             '（需要 --asr-workers > 1，默认: 0 不切分）')
+    parser.add_argument('--vad', choices=VAD_METHODS, default=None,
+                        help='转写前做语音活动检测，只转写语音片段（energy: 按能量检测；webrtc: 使用webrtcvad；'
+                             'auto: 安装了webrtcvad时使用webrtc）')
+    parser.add_argument('--keep-wav', action='store_true',
+                        help='将提取的音频缓存为output/audio下的WAV文件（默认直接在内存中解码）')
+    parser.add_argument('--sequential', action='store_true',
+                        help='按阶段顺序执行（先全部提取，再全部转写，最后全部分析）')
+    parser.add_argument('--extract-workers', type=int, default=None,
+                        help='同时运行的ffmpeg提取进程数（默认: --keep-wav 时为CPU核数，'
+                             '内存解码时与 --asr-workers 相同）')
+    parser.add_argument('--extract-timeout', type=float, default=600,
+                        help='单个视频音频提取的超时时间，秒（默认: 600）')
+    parser.add_argument('--analyze-workers', type=int, default=None,
+                        help='广告分析阶段线程数（默认与 --ollama-concurrency 相同）')
+    parser.add_argument('--ollama-url', default=OLLAMA_URL, help=f'Ollama服务地址（默认: {OLLAMA_URL}）')
+    parser.add_argument('--ollama-model', default=ANALYSIS_MODEL, help=f'分析模型（默认: {ANALYSIS_MODEL}）')
+    parser.add_argument('--ollama-concurrency', type=int, default=1,
+                        help='同时发往Ollama的请求数，应与服务器 OLLAMA_NUM_PARALLEL 一致（默认: 1）')
+    parser.add_argument('--ollama-timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help=f'单个Ollama请求的截止时间，秒（默认: {DEFAULT_TIMEOUT}）')
+    parser.add_argument('--ollama-keep-alive', default=DEFAULT_KEEP_ALIVE,
+                        help='运行期间分析模型在Ollama中的驻留时间，秒数或"30m"这样的时长，负数表示一直驻留；'
+                             '结束时恢复为Ollama默认的5分钟（默认: -1）')
+    parser.add_argument('--no-ollama-warmup', action='store_true',
+                        help='不在启动时预加载分析模型（默认在转写期间后台加载并评估固定的提示词前缀）')
+    parser.add_argument('--queue-size', type=int, default=4,
+                        help='阶段间队列容量，队列满时上游阶段等待（默认: 4）')
+    parser.add_argument('--ollama-stream', action='store_true',
+                        help='流式调用Ollama，收到完整JSON后立即终止生成')
+    parser.add_argument('--window-tokens', type=int, default=0,
+                        help='分窗分析时每个窗口的最大token数，0表示整段分析（默认: 0）')
+    parser.add_argument('--window-overlap', type=int, default=200,
+                        help='相邻窗口重叠的token数（默认: 200）')
+    parser.add_argument('--structured', action='store_true',
+                        help='使用JSON Schema约束Ollama输出并校验结果，校验失败时重新请求')
+    parser.add_argument('--max-reasks', type=int, default=2,
+                        help='结构化输出校验失败时的最大重新请求次数（默认: 2）')
+    parser.add_argument('--transcript-format', choices=TRANSCRIPT_FORMATS, default=DEFAULT_TRANSCRIPT_FORMAT,
+                        help='转写结果保存格式：npz为紧凑列式格式，json为whisper原始输出（默认: npz）')
+    parser.add_argument('--export-csv', action='store_true',
+                        help='汇总后同时导出output/ads_summary.csv（结果数据集为output/results下的Parquet文件）')
+    parser.add_argument('--segment-filter', action='store_true',
+                        help='发送给Ollama前过滤分段：去掉无语音幻觉、高重复度分段，折叠重复词句并合并重复分段')
+    parser.add_argument('--max-no-speech-prob', type=float, default=0.6,
+                        help='no_speech_prob高于该值且avg_logprob低于 --min-avg-logprob 的分段视为无语音（默认: 0.6）')
+    parser.add_argument('--min-avg-logprob', type=float, default=-1.0,
+                        help='见 --max-no-speech-prob（默认: -1.0）')
+    parser.add_argument('--max-compression-ratio', type=float, default=2.4,
+                        help='compression_ratio高于该值的分段视为重复幻觉（默认: 2.4）')
+    parser.add_argument('--prescreen', action='store_true',
+                        help='词典预筛：转写文本（或窗口）中没有品牌/商品词和广告触发词时直接判为无广告，不调用Ollama')
+    parser.add_argument('--prescreen-min-hits', type=int, default=1,
+                        help='命中多少个不同词条才送Ollama分析（默认: 1）')
+    parser.add_argument('--lexicon', default=DEFAULT_LEXICON_PATH,
+                        help=f'预筛词典路径，不存在时根据已有结果生成（默认: {DEFAULT_LEXICON_PATH}）')
+    parser.add_argument('--no-metrics', action='store_true', help='不记录运行指标')
+    parser.add_argument('--metrics-dir', default=DEFAULT_METRICS_DIR,
+                        help=f'运行指标目录，每次运行写入一个trace-<运行ID>.jsonl事件流（默认: {DEFAULT_METRICS_DIR}）')
+    parser.add_argument('--metrics-textfile', default=None,
+                        help='Prometheus文本格式指标文件路径，可指向node_exporter的textfile目录'
+                             '（默认: 指标目录下的ad_pipeline.prom）')
+    parser.add_argument('--profile', action='store_true',
+                        help='性能剖析：按阶段和视频记录cProfile数据及tracemalloc内存峰值，'
+                             '结果和热点函数摘要写入剖析目录')
+    parser.add_argument('--profile-dir', default=DEFAULT_PROFILE_DIR,
+                        help=f'性能剖析结果目录（默认: {DEFAULT_PROFILE_DIR}）')
+    parser.add_argument('--enqueue', action='store_true',
+                        help='扫描视频目录并加入共享工作队列后退出（配合 --watch 持续加入新视频），由各机器的 --worker 处理')
+    parser.add_argument('--worker', action='store_true',
+                        help='工作模式：从共享工作队列领取视频处理，多台机器可同时运行，结果写入共享的output目录')
+    parser.add_argument('--drain', action='store_true', help='工作模式下队列处理完后退出（默认持续等待新视频）')
+    parser.add_argument('--queue-path', default=DEFAULT_QUEUE_PATH,
+                        help=f'工作队列SQLite文件，需放在各机器都能访问的共享卷上（默认: {DEFAULT_QUEUE_PATH}）')
+    parser.add_argument('--worker-id', default=None, help='工作进程标识（默认: 主机名-进程号）')
+    parser.add_argument('--lease-seconds', type=float, default=DEFAULT_LEASE_SECONDS,
+                        help=f'租约时长（秒），每1/3时长续约一次，进程失联超过该时长后视频重新排队（默认: {DEFAULT_LEASE_SECONDS}）')
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help=f'每个视频最多尝试次数，超过后标记为失败（默认: {DEFAULT_MAX_ATTEMPTS}）')
+    parser.add_argument('--poll-seconds', type=float, default=10.0,
+                        help='工作模式下队列为空时的轮询间隔（秒，默认: 10）')
+    parser.add_argument('--full-scan', action='store_true',
+                        help='忽略目录索引，重新列出视频目录下的全部子目录')
+    parser.add_argument('--watch', action='store_true',
+                        help='处理完现有视频后继续监听视频目录，新视频下载完成后自动处理（Ctrl+C退出）')
+    parser.add_argument('--no-manifest', action='store_true',
+                        help='不使用output/manifest.sqlite清单，改为逐个检查输出文件判断是否跳过')
+    parser.add_argument('--no-llm-cache', action='store_true', help='禁用LLM结果缓存')
+    parser.add_argument('--llm-cache-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help=f'LLM结果缓存容量上限，MB（默认: {DEFAULT_MAX_BYTES // (1024 * 1024)}）')
     return parser.parse_args()
 
 
-def main():
-    args = parse_args()
-    video_files = get_video_files(VIDEO_DIR)
-    print(f"共找到 {len(video_files)} 个mp4视频文件：")
+def build_analysis_config(args):
+    """
+    根据命令行参数生成分析配置
+    """
+    return AnalysisConfig(
+        model_name=args.ollama_model,
+        window_tokens=args.window_tokens,
+        window_overlap=args.window_overlap,
+        structured=args.structured,
+        max_reasks=args.max_reasks,
+        segment_filter=SegmentFilter(
+            max_no_speech_prob=args.max_no_speech_prob,
+            min_avg_logprob=args.min_avg_logprob,
+            max_compression_ratio=args.max_compression_ratio,
+        ) if args.segment_filter else None,
+        prescreen=Prescreen(load_lexicon(args.lexicon), args.prescreen_min_hits) if args.prescreen else None,
+    )
+
+
+def get_video_paths(video_path, transcript_format=DEFAULT_TRANSCRIPT_FORMAT):
+    """
+    根据视频路径生成各阶段的输出文件路径
+    """
+    base_name = os.path.splitext(os.path.basename(video_path))[0]
+    return {
+        'video_path': video_path,
+        'audio_path': os.path.join(OUTPUT_AUDIO_DIR, base_name + '.wav'),
+        'transcript_path': os.path.join(OUTPUT_TRANSCRIPT_DIR, transcript_filename(base_name, transcript_format)),
+        'analysis_path': os.path.join(OUTPUT_ANALYSIS_DIR, base_name + '_analysis.json'),
+    }
+
+
+def plan_videos(video_files, force=False, asr_model='base', config=None, file_stats=None,
+                transcript_format=DEFAULT_TRANSCRIPT_FORMAT):
+    """
+    生成各视频的处理计划
+
+    有清单记录的视频直接由清单判断是否跳过转写/分析（skip_transcribe/skip_analyze为True或False）；
+    没有记录的视频为None，由各阶段检查输出文件，并把结果补记到清单
+    file_stats 为目录索引中的 {视频路径: (大小, 修改时间)}，提供时不再逐个stat
+    """
+    if config is None:
+        config = AnalysisConfig()
+    if file_stats is None:
+        file_stats = {}
+    manifest = get_default_manifest()
+    records = manifest.load(video_files) if manifest is not None else {}
 
-    print("\n开始提取音频...")
+    items = []
     for video_path in video_files:
-        audio_filename = os.path.splitext(os.path.basename(video_path))[0] + '.wav'
-        audio_path = os.path.join(OUTPUT_AUDIO_DIR, audio_filename)
-        
-        # 检查是否已存在音频文件
-        if os.path.exists(audio_path) and not args.force:
-            print(f"音频文件已存在，跳过: {audio_path}")
+        item = get_video_paths(video_path, transcript_format)
+        item.update(force=force, skip_transcribe=None, skip_analyze=None)
+        items.append(item)
+        if manifest is None:
             continue
-            
-        success = extract_audio(video_path, audio_path)
-        if success:
-            print(f"音频提取成功: {audio_path}")
+        if video_path in file_stats:
+            size, mtime = file_stats[video_path]
         else:
-            print(f"音频提取失败: {video_path}")
+            try:
+                stat = os.stat(video_path)
+            except OSError as e:
+                print(f"无法读取视频文件信息: {video_path}, 错误: {e}")
+                continue
+            size, mtime = stat.st_size, stat.st_mtime
+        item['size'] = size
+        item['mtime'] = mtime
 
-    print("\n开始音频转写...")
-    for video_path in video_files:
-        audio_filename = os.path.splitext(os.path.basename(video_path))[0] + '.wav'
-        audio_path = os.path.join(OUTPUT_AUDIO_DIR, audio_filename)
-        transcript_filename = os.path.splitext(os.path.basename(video_path))[0] + '.json'
-        transcript_path = os.path.join(OUTPUT_TRANSCRIPT_DIR, transcript_filename)
-        
-        if not os.path.exists(audio_path):
-            print(f"音频文件不存在，跳过: {audio_path}")
+        record = records.get(video_path)
+        if record is None:
             continue
-            
-        # 检查是否已存在转写文件
-        if os.path.exists(transcript_path) and not args.force:
-            print(f"转写文件已存在，跳过: {transcript_path}")
+        if record['size'] != size or record['mtime'] != mtime:
+            # 大小或修改时间变化时再用快速哈希确认内容是否真的变化
+            if record['quick_hash'] and record['size'] == size \
+                    and quick_hash(video_path) == record['quick_hash']:
+                manifest.update(video_path, mtime=mtime)
+            else:
+                print(f"视频文件已变化，重新处理: {video_path}")
+                manifest.reset(video_path, size, mtime)
+                item.update(force=True, skip_transcribe=False, skip_analyze=False)
+                continue
+        if force:
             continue
-            
-        print(f"转写: {audio_path}")
+        item['skip_transcribe'] = (record['transcribe_status'] == 'done'
+                                   and record['asr_model'] == asr_model)
+        # 需要重新转写时，基于旧转写的分析结果同样过期
+        item['skip_analyze'] = (item['skip_transcribe']
+                                and record['analyze_status'] == 'done'
+                                and record['llm_model'] == config.model_name
+                                and record['prompt_version'] == PROMPT_VERSION
+                                and record['analysis_mode'] == config.analysis_mode
+                                and record['output_format'] == config.output_format)
+    return items
+
+
+def record_stage(item, **fields):
+    """
+    将阶段结果写入清单（未启用清单时忽略）
+    """
+    manifest = get_default_manifest()
+    if manifest is None:
+        return
+    if 'size' in item:
+        fields.setdefault('size', item['size'])
+        fields.setdefault('mtime', item['mtime'])
+    manifest.update(item['video_path'], **fields)
+
+
+def extract_workers(args, engine):
+    """
+    提取阶段的线程数：写WAV时按CPU核数；内存解码时与转写进程数相同，
+    解码好的音频由decode_slots限制总数，提前解码只会占用内存（工作模式下还会提前领取租约）
+    """
+    if args.extract_workers:
+        return args.extract_workers
+    if args.keep_wav:
+        return os.cpu_count() or 1
+    return engine.workers
+
+
+def take_audio(item):
+    """
+    取出内存中解码好的音频，并归还解码名额
+    """
+    audio = item.pop('audio', None)
+    slots = item.pop('audio_slots', None)
+    if slots is not None:
+        slots.release()
+    return audio
+
+
+def extract_step(item, force=False, keep_wav=False, timeout=None, stats=None, decode_slots=None):
+    """
+    提取音频阶段，返回item；提取失败返回None
+
+    默认将音频解码到内存（item['audio']）直接交给转写阶段，
+    keep_wav为True时写入output/audio下的WAV缓存
+    decode_slots（信号量）限制已解码、尚未转写的音频数量，转写阶段取出音频时归还
+    """
+    if stats is None:
+        stats = ExtractionStats()
+    force = force or item.get('force', False)
+    audio_path = item['audio_path']
+
+    # 已有转写结果时无需再提取音频
+    skip = item.get('skip_transcribe')
+    if skip is None:
+        # 已有其他格式的转写文件时同样跳过（可用migrate_transcripts.py转换）
+        skip = find_transcript(item['transcript_path']) is not None and not force
+    if skip:
+        print(f"转写文件已存在，跳过音频提取: {item['video_path']}")
+        return item
+
+    # 检查是否已存在音频文件
+    if os.path.exists(audio_path) and not force:
+        print(f"音频文件已存在，跳过: {audio_path}")
+        return item
+
+    if not keep_wav:
+        if decode_slots is not None:
+            decode_slots.acquire()
+        audio = decode_audio(item['video_path'], timeout)
+        if audio is None:
+            if decode_slots is not None:
+                decode_slots.release()
+            stats.record_failure()
+            record_stage(item, extract_status='failed')
+            return None
+        item['audio'] = audio
+        if decode_slots is not None:
+            item['audio_slots'] = decode_slots
+        stats.record(len(audio) / SAMPLE_RATE)
+        print(f"音频解码完成 ({len(audio) / SAMPLE_RATE:.0f}s): {item['video_path']}")
+        return item
+
+    if extract_audio(item['video_path'], audio_path, timeout):
+        stats.record(get_wav_duration(audio_path))
+        record_stage(item, extract_status='done', audio_path=audio_path)
+        print(f"音频提取成功: {audio_path}")
+        return item
+    stats.record_failure()
+    record_stage(item, extract_status='failed')
+    print(f"音频提取失败: {item['video_path']}")
+    return None
+
+
+def transcribe_step(item, engine, force=False, timeout=None):
+    """
+    音频转写阶段，返回item；转写失败返回None
+    """
+    force = force or item.get('force', False)
+    audio_path = item['audio_path']
+    transcript_path = item['transcript_path']
+    # 转写后即释放内存中的音频
+    audio = take_audio(item)
+
+    # 检查是否已存在转写文件（清单中没有记录时检查文件，并补记到清单）
+    skip = item.get('skip_transcribe')
+    if skip is None and find_transcript(transcript_path) is not None and not force:
+        record_stage(item, transcribe_status='done', transcript_path=transcript_path,
+                     asr_model=engine.asr_model)
+        skip = True
+    if skip:
+        print(f"转写文件已存在，跳过: {transcript_path}")
+        return item
+
+    if audio is None:
+        if os.path.exists(audio_path) and not force:
+            audio = audio_path
+        else:
+            audio = decode_audio(item['video_path'], timeout)
+            if audio is None:
+                record_stage(item, extract_status='failed')
+                return None
+
+    print(f"转写: {item['video_path']}")
+    if isinstance(audio, str):
+        audio_seconds = get_wav_duration(audio)
+    else:
+        audio_seconds = len(audio) / SAMPLE_RATE
+    try:
+        start = time.perf_counter()
+        stats = engine.transcribe(audio, transcript_path)
+        record_transcription(item['video_path'], engine, stats, time.perf_counter() - start, audio_seconds)
+        if stats.get('audio_seconds'):
+            print(f"语音占比 {stats['speech_seconds'] / stats['audio_seconds']:.1%}"
+                  f"（{stats['speech_seconds']:.0f}s / {stats['audio_seconds']:.0f}s）: {item['video_path']}")
+        # 转写结果已更新，旧的分析结果不再有效
+        item['skip_analyze'] = False
+        record_stage(item, extract_status='done', transcribe_status='done', transcript_path=transcript_path,
+                     asr_model=engine.asr_model, quick_hash=quick_hash(item['video_path']),
+                     analyze_status=None)
+        print(f"转写完成: {transcript_path}")
+        return item
+    except Exception as e:
+        record_stage(item, transcribe_status='failed')
+        print(f"转写失败: {item['video_path']}\n错误: {e}")
+        return None
+
+
+def record_transcription(video_path, engine, stats, wall_seconds, audio_seconds):
+    """
+    记录一次转写的耗时和实时率（转写耗时 / 音频时长，小于1表示快于实时）；
+    wall_seconds包含等待工作进程空闲的时间
+    """
+    seconds = stats.get('seconds', wall_seconds)
+    rtf = seconds / audio_seconds if audio_seconds else None
+    record_event('transcribe', video=video_path, model=engine.asr_model, seconds=round(seconds, 3),
+                 wall_seconds=round(wall_seconds, 3), audio_seconds=round(audio_seconds, 3),
+                 speech_seconds=stats.get('speech_seconds'), chunks=stats.get('chunks', 1),
+                 rtf=round(rtf, 4) if rtf is not None else None)
+    observe('transcribe_seconds', seconds, model=engine.asr_model)
+    observe('transcribe_wait_seconds', max(wall_seconds - seconds, 0.0), model=engine.asr_model)
+    inc('transcribe_audio_seconds', audio_seconds, model=engine.asr_model)
+    if rtf is not None:
+        observe('whisper_rtf', rtf, model=engine.asr_model)
+
+
+def needs_analysis(analysis_path, force=False, config=None):
+    """
+    检查是否需要执行分析
+
+    模型、提示词版本、分析模式或输出格式与当前不一致的结果视为过期
+    （旧文件没有这些字段，按默认模型、版本1、整段分析、文本输出处理）
+    """
+    if config is None:
+        config = AnalysisConfig()
+    if not os.path.exists(analysis_path) or force:
+        return True
+    try:
+        with open(analysis_path, 'r', encoding='utf-8') as f:
+            analysis_data = json.load(f)
+        # 检查analysis_result字段是否存在且不为null
+        analysis_result = analysis_data.get('analysis_result')
+        if analysis_result is None or not analysis_result.strip():
+            print(f"分析文件存在但结果为空，重新分析: {analysis_path}")
+        elif (analysis_data.get('model', ANALYSIS_MODEL) != config.model_name
+              or analysis_data.get('prompt_version', 1) != PROMPT_VERSION
+              or analysis_data.get('analysis_mode', 'full') != config.analysis_mode
+              or analysis_data.get('output_format', 'text') != config.output_format):
+            print(f"分析结果的模型、提示词版本或分析方式已变更，重新分析: {analysis_path}")
+        else:
+            print(f"分析文件已存在且有效，跳过: {analysis_path}")
+            return False
+    except Exception as e:
+        print(f"读取分析文件失败，重新分析: {analysis_path}\n错误: {e}")
+    return True
+
+
+def record_analysis(item, config, status='done'):
+    """
+    将分析结果及其模型、提示词版本写入清单
+    """
+    record_stage(item, analyze_status=status, analysis_path=item['analysis_path'],
+                 llm_model=config.model_name, prompt_version=PROMPT_VERSION,
+                 analysis_mode=config.analysis_mode, output_format=config.output_format)
+
+
+def analyze_step(item, force=False, config=None):
+    """
+    广告分析阶段，返回item；分析失败返回None
+    """
+    if config is None:
+        config = AnalysisConfig()
+    force = force or item.get('force', False)
+    transcript_path = item['transcript_path']
+    analysis_path = item['analysis_path']
+
+    if item.get('skip_analyze'):
+        print(f"分析结果已记录且有效，跳过: {analysis_path}")
+        return item
+
+    if find_transcript(transcript_path) is None:
+        print(f"转写文件不存在，跳过: {transcript_path}")
+        return None
+
+    # 清单中没有记录时检查分析文件，并补记到清单
+    if item.get('skip_analyze') is None and not needs_analysis(analysis_path, force, config):
+        record_analysis(item, config)
+        return item
+
+    print(f"分析: {transcript_path}")
+    try:
+        start = time.perf_counter()
+        result = analyze_transcript(transcript_path, analysis_path, config)
+        seconds = time.perf_counter() - start
+        status = 'done' if result['analysis_result'] else 'failed'
+        record_event('analyze', video=item['video_path'], model=config.model_name, mode=config.analysis_mode,
+                     status=status, seconds=round(seconds, 3), windows=len(result.get('windows', [])),
+                     prescreen_skipped=not result.get('prescreen', {}).get('candidate', True))
+        observe('analyze_seconds', seconds, mode=config.analysis_mode, status=status)
+        # 结果为空（Ollama调用失败或结构化输出校验失败）时下次运行重新分析
+        record_analysis(item, config, status)
+        if status == 'failed':
+            # 按失败返回，工作模式下视频交还队列重试
+            print(f"分析结果为空: {analysis_path}")
+            return None
+        print(f"分析完成: {analysis_path}")
+        return item
+    except Exception as e:
+        record_stage(item, analyze_status='failed')
+        print(f"分析失败: {transcript_path}\n错误: {e}")
+        return None
+
+
+def run_sequential(video_files, engine, args):
+    """
+    逐阶段执行：先提取全部音频，再全部转写，最后全部分析
+    """
+    items = plan_videos(video_files, args.force, engine.asr_model, build_analysis_config(args),
+                        transcript_format=args.transcript_format)
+
+    if args.keep_wav:
+        workers = extract_workers(args, engine)
+        print(f"\n开始提取音频（{workers} 个并发）...")
+        # 每个线程驱动一个ffmpeg子进程，并发数即同时运行的ffmpeg进程数
+        stats = ExtractionStats()
+        extract = profiled('extract', partial(extract_step, force=args.force, keep_wav=True,
+                                              timeout=args.extract_timeout, stats=stats))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(extract, items))
+        record_report('extract', stats.print_report())
+    else:
+        print("\n内存解码模式：音频将在转写时直接解码")
+
+    print("\n开始音频转写...")
+    # 每个工作进程对应一个提交线程
+    transcribe = profiled('transcribe', partial(transcribe_step, engine=engine, force=args.force,
+                                                timeout=args.extract_timeout))
+    with ThreadPoolExecutor(max_workers=engine.workers) as executor:
+        list(executor.map(transcribe, items))
+
+    print("\n开始广告分析...")
+    analyze = profiled('analyze', partial(analyze_step, force=args.force, config=build_analysis_config(args)))
+    with ThreadPoolExecutor(max_workers=args.analyze_workers or args.ollama_concurrency) as executor:
+        list(executor.map(analyze, items))
+
+
+def build_stages(engine, args, config, extract_stats):
+    """
+    流水线的提取、转写、分析三个阶段
+    """
+    # 已解码、尚未转写的音频最多为转写进程数加队列容量（每个约数百MB）
+    decode_slots = None if args.keep_wav else threading.BoundedSemaphore(engine.workers + args.queue_size)
+    return [
+        Stage('extract', profiled('extract', partial(extract_step, force=args.force, keep_wav=args.keep_wav,
+                                                     timeout=args.extract_timeout, stats=extract_stats,
+                                                     decode_slots=decode_slots)),
+              workers=extract_workers(args, engine), queue_size=args.queue_size),
+        Stage('transcribe', profiled('transcribe', partial(transcribe_step, engine=engine, force=args.force,
+                                                           timeout=args.extract_timeout)),
+              workers=engine.workers, queue_size=args.queue_size),
+        Stage('analyze', profiled('analyze', partial(analyze_step, force=args.force, config=config)),
+              workers=args.analyze_workers or args.ollama_concurrency, queue_size=args.queue_size),
+    ]
+
+
+def run_pipelined(video_infos, engine, args):
+    """
+    流水线执行：提取、转写、分析三个阶段通过有界队列并发运行
+
+    args.watch 为True时处理完现有视频后继续监听目录，新视频下载完成即进入流水线
+    返回所有处理过的视频路径
+    """
+    config = build_analysis_config(args)
+    extract_stats = ExtractionStats()
+    stages = build_stages(engine, args, config, extract_stats)
+    video_files = [info['path'] for info in video_infos]
+    file_stats = {info['path']: (info['size_bytes'], info['mtime']) for info in video_infos}
+    items = plan_videos(video_files, args.force, engine.asr_model, config, file_stats, args.transcript_format)
+
+    if args.watch:
+        def watched_items():
+            for video_path in watch_videos(VIDEO_DIR, MIN_VIDEO_SIZE_BYTES, known=video_files):
+                print(f"发现新视频: {video_path}")
+                video_files.append(video_path)
+                yield from plan_videos([video_path], args.force, engine.asr_model, config,
+                                       transcript_format=args.transcript_format)
+
+        items = itertools.chain(items, watched_items())
+
+    print("\n开始流水线处理（提取 → 转写 → 分析）...")
+    try:
+        run_pipeline(items, stages)
+    except KeyboardInterrupt:
+        print("\n已停止监听")
+    record_report('extract', extract_stats.print_report())
+    return video_files
+
+
+def worker_step(stage, func, keeper):
+    """
+    工作模式下包装阶段函数：处理前确认仍持有租约，成功后在队列中记录该阶段完成；
+    失败时交还队列，未达到最大尝试次数的视频由其他工作进程重试
+    """
+    def step(item):
+        video_path = item['video_path']
+        if not keeper.holds(video_path):
+            print(f"租约已失效，放弃处理: {video_path}")
+            keeper.drop(video_path)
+            take_audio(item)
+            return None
         try:
-            transcribe_audio(audio_path, transcript_path)
-            print(f"转写完成: {transcript_path}")
+            result = func(item)
         except Exception as e:
-            print(f"转写失败: {audio_path}\n错误: {e}")
+            keeper.fail(video_path, f"{stage}: {e}")
+            raise
+        if result is None:
+            keeper.fail(video_path, f"{stage}失败")
+            return None
+        if not keeper.commit_stage(video_path, stage):
+            # 输出文件已原子写入，接管租约的进程会据此跳过该阶段
+            print(f"租约已失效，停止处理: {video_path}")
+            keeper.drop(video_path)
+            take_audio(item)
+            return None
+        return result
+    return step
 
-    print("\n开始广告分析...")
-    for video_path in video_files:
-        transcript_filename = os.path.splitext(os.path.basename(video_path))[0] + '.json'
-        transcript_path = os.path.join(OUTPUT_TRANSCRIPT_DIR, transcript_filename)
-        analysis_filename = os.path.splitext(os.path.basename(video_path))[0] + '_analysis.json'
-        analysis_path = os.path.join(OUTPUT_ANALYSIS_DIR, analysis_filename)
-        
-        if not os.path.exists(transcript_path):
-            print(f"转写文件不存在，跳过: {transcript_path}")
-            continue
-        
-        # 检查是否需要执行分析
-        should_analyze = True
-        if os.path.exists(analysis_path) and not args.force:
+
+def run_worker(engine, args):
+    """
+    工作模式：从共享队列领取视频，经流水线处理后在队列中标记完成
+
+    args.drain 为True时队列中没有待处理（及其他进程处理中）的视频后退出，否则持续等待新视频
+    返回本进程处理完成的视频路径
+    """
+    config = build_analysis_config(args)
+    extract_stats = ExtractionStats()
+    work_queue = WorkQueue(args.queue_path, args.max_attempts)
+    worker_id = args.worker_id or default_worker_id()
+    keeper = LeaseKeeper(work_queue, worker_id, args.lease_seconds)
+    stages = build_stages(engine, args, config, extract_stats)
+    for stage in stages:
+        stage.func = worker_step(stage.name, stage.func, keeper)
+
+    def claimed_items():
+        # 流水线输入队列满时这里阻塞，因此只领取即将处理的视频
+        while True:
             try:
-                with open(analysis_path, 'r', encoding='utf-8') as f:
-                    analysis_data = json.load(f)
-                # 检查analysis_result字段是否存在且不为null
-                analysis_result = analysis_data.get('analysis_result')
-                if analysis_result is not None and analysis_result.strip():
-                    print(f"分析文件已存在且有效，跳过: {analysis_path}")
-                    should_analyze = False
-                else:
-                    print(f"分析文件存在但结果为空，重新分析: {analysis_path}")
-            except Exception as e:
-                print(f"读取分析文件失败，重新分析: {analysis_path}\n错误: {e}")
-        
-        if should_analyze:
-            print(f"分析: {transcript_path}")
+                job = work_queue.claim(worker_id, args.lease_seconds)
+                counts = work_queue.counts() if job is None else None
+            except sqlite3.Error as e:
+                # 共享卷暂时不可用或锁等待超时时稍后重试
+                print(f"访问工作队列失败，稍后重试: {e}")
+                time.sleep(args.poll_seconds)
+                continue
+            if job is None:
+                # 处理中的视频失败或租约过期后会重新排队，因此等所有进程（包括本进程）都处理完再退出
+                if args.drain and counts['queued'] == 0 and counts['leased'] == 0:
+                    return
+                time.sleep(args.poll_seconds)
+                continue
+            video_path = job['video_path']
+            keeper.add(video_path)
+            print(f"领取: {video_path}（第 {job['attempts']} 次）")
+            record_event('claim', video=video_path, worker=worker_id, attempt=job['attempts'])
+            inc('queue_claims')
+            yield from plan_videos([video_path], args.force or bool(job['force']), engine.asr_model, config,
+                                   transcript_format=args.transcript_format)
+
+    completed = []
+
+    def on_result(item):
+        if keeper.complete(item['video_path']):
+            completed.append(item['video_path'])
+            inc('queue_completed')
+
+    print(f"\n工作模式: {worker_id}，队列: {args.queue_path}")
+    work_queue.print_report()
+    keeper.start()
+    try:
+        run_pipeline(claimed_items(), stages, on_result)
+    except KeyboardInterrupt:
+        print("\n已停止领取")
+    finally:
+        # 归还尚未处理完的租约，其他工作进程无需等待租约过期
+        keeper.stop()
+        record_report('work_queue', work_queue.print_report())
+        work_queue.close()
+    record_report('extract', extract_stats.print_report())
+    print(f"本进程完成 {len(completed)} 个视频")
+    return completed
+
+
+def enqueue_videos(args):
+    """
+    扫描视频目录并加入共享队列；args.watch 为True时继续监听目录，新视频下载完成后加入队列
+    """
+    work_queue = WorkQueue(args.queue_path, args.max_attempts)
+    try:
+        video_files = get_video_files(VIDEO_DIR, args.full_scan)
+        added = work_queue.enqueue(video_files, args.force)
+        print(f"共找到 {len(video_files)} 个mp4视频文件，新加入队列 {added} 个")
+        record_event('enqueue', videos=len(video_files), added=added)
+        work_queue.print_report()
+        if args.watch:
             try:
-                analyze_transcript(transcript_path, analysis_path)
-                print(f"分析完成: {analysis_path}")
-            except Exception as e:
-                print(f"分析失败: {transcript_path}\n错误: {e}")
+                for video_path in watch_videos(VIDEO_DIR, MIN_VIDEO_SIZE_BYTES, known=video_files):
+                    if work_queue.enqueue([video_path], args.force):
+                        print(f"新视频已加入队列: {video_path}")
+                        record_event('enqueue', videos=1, added=1)
+            except KeyboardInterrupt:
+                print("\n已停止监听")
+    finally:
+        work_queue.close()
+
+
+def host_local_path(path):
+    """
+    工作模式下清单和LLM缓存按主机分开存放：它们使用WAL模式，不能由多台机器同时打开
+    """
+    directory, name = os.path.split(path)
+    return os.path.join(directory, 'hosts', socket.gethostname(), name)
+
+
+def main():
+    args = parse_args()
+    if args.watch and args.sequential:
+        print("错误: --watch 只能在流水线模式下使用")
+        return
+    if args.worker and (args.enqueue or args.sequential or args.watch):
+        print("错误: --worker 不能与 --enqueue、--sequential 或 --watch 同时使用")
+        return
+    metrics_textfile = args.metrics_textfile
+    if args.worker and metrics_textfile is None:
+        # 多台机器共享metrics目录时各写各的.prom文件
+        metrics_textfile = os.path.join(args.metrics_dir, f"ad_pipeline-{socket.gethostname()}.prom")
+    configure_default_metrics(args.metrics_dir, metrics_textfile, not args.no_metrics)
+    configure_default_profiler('main', args.profile, args.profile_dir)
+    try:
+        if args.enqueue:
+            enqueue_videos(args)
+        else:
+            run(args)
+    finally:
+        close_default_profiler()
+        close_default_metrics()
+
+
+def run(args):
+    """
+    执行一次完整运行：提取、转写、分析，最后汇总
+    """
+    record_event('config', **vars(args))
+    video_infos = []
+    if not args.worker:
+        start = time.perf_counter()
+        with profile_section('scan'):
+            video_infos = get_video_infos(VIDEO_DIR, args.full_scan)
+        video_files = [info['path'] for info in video_infos]
+        print(f"共找到 {len(video_files)} 个mp4视频文件：")
+        record_event('scan', videos=len(video_files), seconds=round(time.perf_counter() - start, 3))
+
+    client = configure_default_client(args.ollama_url, args.ollama_concurrency, args.ollama_timeout,
+                                      args.ollama_stream, args.ollama_keep_alive)
+    if not args.no_ollama_warmup:
+        # 后台加载模型，与音频提取和转写重叠进行
+        client.warm_up(args.ollama_model, ANALYSIS_SYSTEM_PROMPT, wait=False)
+    cache_path, manifest_path = DEFAULT_CACHE_PATH, DEFAULT_MANIFEST_PATH
+    if args.worker:
+        cache_path, manifest_path = host_local_path(cache_path), host_local_path(manifest_path)
+    configure_default_cache(cache_path, args.llm_cache_mb * 1024 * 1024, not args.no_llm_cache)
+    configure_default_manifest(manifest_path, not args.no_manifest)
+    engine = TranscriptionEngine(args.whisper_model, args.asr_workers, args.torch_threads, args.vad, args.asr_backend,
+                                 args.chunk_seconds)
+    engine.start()
+    try:
+        if args.worker:
+            video_files = run_worker(engine, args)
+        elif args.sequential:
+            run_sequential(video_files, engine, args)
+        else:
+            video_files = run_pipelined(video_infos, engine, args)
+    finally:
+        engine.close()
+        close_default_client()
+        close_default_cache()
+        close_default_manifest()
+    record_report('structured_output', parse_stats.print_report())
+    record_report('segment_filter', filter_stats.print_report())
+    record_report('prescreen', prescreen_stats.print_report())
+    record_report('asr', engine.print_report())
+
+    if args.worker:
+        # 多台机器同时汇总会争用summary.sqlite，由一台机器在队列处理完后运行 python main.py 汇总
+        print("\n工作模式不汇总结果，队列处理完后在任意一台机器上运行 python main.py 汇总")
+        return
 
     # 汇总统计
     print("\n开始汇总统计...")
-    summarize_results(video_files)
+    with profile_section('summarize'):
+        summarize_results(video_files, args.export_csv)
 
 
 def parse_ollama_response(response_text):
@@ -274,117 +1228,140 @@ def parse_ollama_response(response_text):
 
 def load_publish_dates():
     """
-    加载发布时间数据
+    加载发布时间索引（进程内缓存，published.json未变化时不重复读取）
     """
-    published_path = os.path.join('output', 'published.json')
-    if not os.path.exists(published_path):
-        print("警告: 发布时间文件不存在，将使用空值")
-        return {}
-    
-    try:
-        with open(published_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data
-    except Exception as e:
-        print(f"读取发布时间文件失败: {e}")
-        return {}
+    return load_publish_index()
 
 def get_publish_date(filename, publish_dates):
     """
-    获取视频发布时间
+    获取视频发布时间（按文件名或BV/av号查索引）
     """
-    for video_id, info in publish_dates.items():
-        if info.get('filename') == filename:
-            return info.get('publish_date', '')
-    return ''
+    return publish_dates.lookup(filename)
 
-def update_analysis_with_publish_date(analysis_path, publish_date):
+def load_previous_responses(append_all=False):
     """
-    更新分析文件，添加发布时间信息
+    读取数据集中各视频最新的原始响应 {文件名: 原始响应}，用于判断分析结果是否变化
     """
-    try:
-        with open(analysis_path, 'r', encoding='utf-8') as f:
-            analysis_data = json.load(f)
-        
-        # 添加发布时间信息
-        analysis_data['publish_date'] = publish_date
-        
-        # 保存更新后的文件
-        with open(analysis_path, 'w', encoding='utf-8') as f:
-            json.dump(analysis_data, f, ensure_ascii=False, indent=2)
-        
-        return True
-    except Exception as e:
-        print(f"更新分析文件失败 {analysis_path}: {e}")
-        return False
+    if append_all:
+        return {}
+    df = read_results(['文件名', '原始响应'])
+    if df is None:
+        return {}
+    return dict(zip(df['文件名'], df['原始响应']))
+
 
-def summarize_results(video_files):
+def summarize_results(video_files, export_csv=False):
     """
-    汇总所有分析结果，输出为CSV
+    汇总所有分析结果，追加到按发布月份分区的Parquet数据集（output/results），
+    export_csv为True时同时导出ads_summary.csv视图
+
+    分析文件只读不写：解析后的汇总行按文件修改时间和大小缓存在output/summary.sqlite，
+    只有新增或变化的分析文件才会重新读取；发布时间记录在同一数据库的元数据表中。
+    只有新增、分析结果变化或发布时间变化的视频才会写入数据集
     """
     results = []
+    changed_rows = []
+    start = time.perf_counter()
+    parse_seconds = 0.0
     
     # 加载发布时间数据
     publish_dates = load_publish_dates()
+    cache = SummaryCache()
+    # 数据集不存在时写入全部结果
+    append_all = not dataset_exists()
+    # 数据集中各视频之前的原始响应，首次需要重新解析分析文件时才读取
+    previous_responses = None
     
-    for video_path in video_files:
-        analysis_filename = os.path.splitext(os.path.basename(video_path))[0] + '_analysis.json'
-        analysis_path = os.path.join(OUTPUT_ANALYSIS_DIR, analysis_filename)
-        
-        if not os.path.exists(analysis_path):
-            continue
-            
-        try:
-            with open(analysis_path, 'r', encoding='utf-8') as f:
-                analysis_data = json.load(f)
+    try:
+        for video_path in video_files:
+            analysis_filename = os.path.splitext(os.path.basename(video_path))[0] + '_analysis.json'
+            analysis_path = os.path.join(OUTPUT_ANALYSIS_DIR, analysis_filename)
             
-            # 解析Ollama响应
-            ollama_response = analysis_data.get('analysis_result', '')
-            parsed_result = parse_ollama_response(ollama_response)
+            try:
+                stat = os.stat(analysis_path)
+            except OSError:
+                continue
             
             # 提取视频文件名（不含路径）
             video_filename = os.path.basename(video_path)
+            changed = append_all
             
-            # 获取发布时间
-            publish_date = get_publish_date(video_filename, publish_dates)
+            try:
+                row = cache.get_row(analysis_path, stat.st_mtime, stat.st_size)
+                if row is None:
+                    with open(analysis_path, 'r', encoding='utf-8') as f:
+                        analysis_data = json.load(f)
+                    
+                    # 解析Ollama响应
+                    ollama_response = analysis_data.get('analysis_result', '')
+                    parse_start = time.perf_counter()
+                    parsed_result = parse_ollama_response(ollama_response)
+                    parse_elapsed = time.perf_counter() - parse_start
+                    parse_seconds += parse_elapsed
+                    observe('parse_seconds', parse_elapsed, format='text')
+                    row = {
+                        '文件名': video_filename,
+                        '是否包含广告': parsed_result.get('is_ad', False),
+                        '广告类型': parsed_result.get('ad_type', '无'),
+                        '商品名称': parsed_result.get('product_name', ''),
+                        '广告文本': parsed_result.get('ad_text', ''),
+                        '置信度': parsed_result.get('confidence', 0.0),
+                        '时间戳': parsed_result.get('timestamp', ''),
+                        '原始响应': ollama_response
+                    }
+                    cache.put_row(analysis_path, stat.st_mtime, stat.st_size, row)
+                    # 旧版本写入分析文件的发布时间迁移到元数据表
+                    if analysis_data.get('publish_date'):
+                        cache.set_publish_date(video_filename, analysis_data['publish_date'])
+                    if previous_responses is None:
+                        previous_responses = load_previous_responses(append_all)
+                    if previous_responses.get(video_filename) != (ollama_response or ''):
+                        changed = True
+                        # 分析结果变化后旧的ads_time失效；结果未变（如分析文件被重写、缓存被删除）时
+                        # 不写ads_time，读取时沿用之前的值（包括--import-csv导入和video_timestamp写入的）
+                        if video_filename in previous_responses:
+                            row = {**row, 'ads_time': ''}
+            except Exception as e:
+                print(f"处理分析文件失败: {analysis_path}\n错误: {e}")
+                continue
             
-            # 更新分析文件，添加发布时间
-            if publish_date:
-                update_analysis_with_publish_date(analysis_path, publish_date)
+            # 获取发布时间（只在变化时写入元数据表）
+            publish_date = get_publish_date(video_filename, publish_dates)
+            if publish_date and cache.set_publish_date(video_filename, publish_date):
                 print(f"已更新发布时间: {video_filename} -> {publish_date}")
+                changed = True
+            publish_date = publish_date or cache.get_publish_date(video_filename)
             
             # 添加到结果列表
-            results.append({
-                '文件名': video_filename,
-                '发布时间': publish_date,
-                '是否包含广告': parsed_result.get('is_ad', False),
-                '广告类型': parsed_result.get('ad_type', '无'),
-                '商品名称': parsed_result.get('product_name', ''),
-                '广告文本': parsed_result.get('ad_text', ''),
-                '置信度': parsed_result.get('confidence', 0.0),
-                '时间戳': parsed_result.get('timestamp', ''),
-                '原始响应': ollama_response
-            })
-            
-        except Exception as e:
-            print(f"处理分析文件失败: {analysis_path}\n错误: {e}")
+            summary_row = {'文件名': video_filename, '发布时间': publish_date, **row}
+            results.append(summary_row)
+            if changed:
+                changed_rows.append(summary_row)
+    finally:
+        cache.close()
+    cache.print_report()
     
-    # 创建DataFrame并保存为CSV
-    if results:
-        df = pd.DataFrame(results)
-        output_csv = os.path.join('output', 'ads_summary.csv')
-        df.to_csv(output_csv, index=False, encoding='utf-8-sig')
-        print(f"\n汇总完成，结果保存到: {output_csv}")
-        print(f"共分析 {len(results)} 个文件")
-        
-        # 统计广告数量
-        ad_count = df[df['是否包含广告'] == True].shape[0]
-        print(f"其中包含广告的文件: {ad_count} 个")
-        
-        return df
-    else:
+    if not results:
         print("没有找到任何分析结果")
         return None
+    
+    # 只追加变化的行（没有ads_time的行读取时沿用之前的值）
+    if changed_rows:
+        append_rows(changed_rows)
+    record_event('summarize', videos=len(video_files), rows=len(results), changed=len(changed_rows),
+                 reused=cache.reused, parsed=cache.parsed, parse_seconds=round(parse_seconds, 3),
+                 seconds=round(time.perf_counter() - start, 3))
+    print(f"\n汇总完成，结果数据集: {DEFAULT_DATASET_DIR}（新增/更新 {len(changed_rows)} 条）")
+    print(f"共分析 {len(results)} 个文件")
+    
+    # 统计广告数量
+    df = pd.DataFrame(results)
+    ad_count = int(df['是否包含广告'].map(lambda value: str(value).lower() == 'true').sum())
+    print(f"其中包含广告的文件: {ad_count} 个")
+    
+    if export_csv:
+        export_results_csv()
+    return df
 
 if __name__ == '__main__':
     main()
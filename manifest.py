@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线清单：用SQLite记录每个视频的输入信息（大小、修改时间、哈希）、
+各阶段状态、模型版本和输出路径，跳过判断只需一次查询，无需逐个检查输出文件
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_MANIFEST_PATH = os.path.join('output', 'manifest.sqlite')
+
+# 快速哈希读取文件首尾各多少字节
+_HASH_CHUNK = 64 * 1024
+
+_COLUMNS = (
+    'video_path', 'size', 'mtime', 'quick_hash',
+    'audio_path', 'transcript_path', 'analysis_path',
+    'extract_status', 'transcribe_status', 'analyze_status',
+    'asr_model', 'llm_model', 'prompt_version', 'analysis_mode', 'output_format',
+    'updated_at',
+)
+
+
+def quick_hash(path):
+    """
+    计算文件快速哈希：文件大小 + 首尾各64KB内容
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(_HASH_CHUNK))
+        if size > _HASH_CHUNK:
+            f.seek(max(size - _HASH_CHUNK, _HASH_CHUNK))
+            digest.update(f.read(_HASH_CHUNK))
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    基于SQLite的流水线清单（多线程安全）
+    """
+
+    def __init__(self, path=DEFAULT_MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS videos (
+                video_path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL,
+                quick_hash TEXT,
+                audio_path TEXT,
+                transcript_path TEXT,
+                analysis_path TEXT,
+                extract_status TEXT,
+                transcribe_status TEXT,
+                analyze_status TEXT,
+                asr_model TEXT,
+                llm_model TEXT,
+                prompt_version INTEGER,
+                analysis_mode TEXT,
+                output_format TEXT,
+                updated_at REAL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS videos_analyze_status ON videos (analyze_status)')
+        self._conn.commit()
+
+    def load_all(self):
+        """
+        一次查询读取全部记录，返回 {视频路径: 记录dict}
+        """
+        with self._lock:
+            rows = self._conn.execute('SELECT * FROM videos').fetchall()
+        return {row['video_path']: dict(row) for row in rows}
+
+    def load(self, video_paths):
+        """
+        读取指定视频的记录：数量少时按主键逐条查询，否则一次读取全部
+        """
+        if len(video_paths) > 100:
+            return self.load_all()
+        records = {}
+        for video_path in video_paths:
+            record = self.get(video_path)
+            if record is not None:
+                records[video_path] = record
+        return records
+
+    def get(self, video_path):
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM videos WHERE video_path = ?', (video_path,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def update(self, video_path, **fields):
+        """
+        新增或更新记录的指定字段
+        """
+        unknown = set(fields) - set(_COLUMNS)
+        if unknown:
+            raise ValueError(f"未知字段: {sorted(unknown)}")
+        fields['updated_at'] = time.time()
+        names = ', '.join(fields)
+        placeholders = ', '.join('?' for _ in fields)
+        updates = ', '.join(f'{name} = excluded.{name}' for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f'INSERT INTO videos (video_path, {names}) VALUES (?, {placeholders}) '
+                f'ON CONFLICT(video_path) DO UPDATE SET {updates}',
+                (video_path, *fields.values()),
+            )
+            self._conn.commit()
+
+    def reset(self, video_path, size, mtime, quick_hash=None):
+        """
+        输入视频发生变化：记录新的输入信息并清空各阶段状态
+        """
+        self.update(
+            video_path, size=size, mtime=mtime, quick_hash=quick_hash,
+            extract_status=None, transcribe_status=None, analyze_status=None,
+        )
+
+    def delete(self, video_path):
+        with self._lock:
+            self._conn.execute('DELETE FROM videos WHERE video_path = ?', (video_path,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# 进程内共享的默认清单，None表示禁用
+_default_manifest = None
+
+
+def configure_default_manifest(path=DEFAULT_MANIFEST_PATH, enabled=True):
+    """
+    按参数重新创建默认清单
+    """
+    global _default_manifest
+    close_default_manifest()
+    if enabled:
+        _default_manifest = Manifest(path)
+    return _default_manifest
+
+
+def get_default_manifest():
+    return _default_manifest
+
+
+def close_default_manifest():
+    global _default_manifest
+    if _default_manifest is not None:
+        _default_manifest.close()
+        _default_manifest = None
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行指标：每个阶段的耗时和吞吐写入JSONL事件流（output/metrics/trace-<run_id>.jsonl，每行一个事件），
+同时汇总为Prometheus文本格式（output/metrics/ad_pipeline.prom，可由node_exporter的textfile收集器读取）
+
+- 事件（record_event）：每个视频每个阶段一行，如ffmpeg耗时、转写实时率、Ollama的token数和耗时
+- 汇总（observe/inc/set_gauge）：按名称和标签累计count/sum/max，写入.prom文件
+- 各模块的统计报告（report()）在运行结束时通过record_report写入事件流和.prom文件
+
+未调用configure_default_metrics时所有记录函数都是空操作
+"""
+
+import os
+import re
+import json
+import time
+import tempfile
+import threading
+import contextlib
+
+DEFAULT_METRICS_DIR = os.path.join('output', 'metrics')
+TEXTFILE_NAME = 'ad_pipeline.prom'
+METRIC_PREFIX = 'ad_pipeline'
+# .prom文件的最短刷新间隔（秒），长时间运行时也能看到进度
+TEXTFILE_INTERVAL = 15.0
+
+_INVALID_NAME_CHARS = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def metric_name(name):
+    return f"{METRIC_PREFIX}_{_INVALID_NAME_CHARS.sub('_', name)}"
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels) + '}'
+
+
+class Metrics:
+    """
+    指标记录器（多线程安全）
+    """
+
+    def __init__(self, trace_path, textfile_path, run_id=None, interval=TEXTFILE_INTERVAL):
+        self.run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.trace_path = trace_path
+        self.textfile_path = textfile_path
+        self.interval = interval
+        self.start_time = time.time()
+        # {(名称, 标签): [count, sum, max]}
+        self._summaries = {}
+        self._counters = {}
+        self._gauges = {}
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+        # 同一时刻只有一个线程写.prom文件
+        self._write_lock = threading.Lock()
+        for path in (trace_path, textfile_path):
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._trace = open(trace_path, 'a', encoding='utf-8')
+        self.event('run_start', pid=os.getpid())
+
+    def event(self, event, **fields):
+        """
+        写入一行事件
+        """
+        record = {'ts': round(time.time(), 3), 'run_id': self.run_id, 'event': event}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._trace.closed:
+                return
+            self._trace.write(line + '\n')
+            self._trace.flush()
+        self._maybe_write_textfile()
+
+    def observe(self, name, value, **labels):
+        """
+        记录一次观测值（耗时等），汇总为count/sum/max
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            summary = self._summaries.setdefault(key, [0, 0.0, value])
+            summary[0] += 1
+            summary[1] += value
+            summary[2] = max(summary[2], value)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def record_report(self, name, report):
+        """
+        记录模块的统计报告：完整内容写入事件流，数值字段写为gauge
+        """
+        if not report:
+            return
+        self.event('report', name=name, report=report)
+        for key, value in report.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            self.set_gauge(f"{name}_{key}", value)
+
+    def _render(self):
+        lines = []
+        with self._lock:
+            self._gauges[('run_seconds', ())] = time.time() - self.start_time
+            self._gauges[('run_start_timestamp_seconds', ())] = self.start_time
+            for kind, values in (('counter', self._counters), ('gauge', self._gauges),
+                                 ('summary', self._summaries)):
+                by_name = {}
+                for (name, labels), value in values.items():
+                    by_name.setdefault(name, []).append((labels, value))
+                for name in sorted(by_name):
+                    full_name = metric_name(name)
+                    if kind == 'counter' and not full_name.endswith('_total'):
+                        full_name += '_total'
+                    lines.append(f"# TYPE {full_name} {kind}")
+                    for labels, value in sorted(by_name[name]):
+                        label_text = _format_labels(labels)
+                        if kind == 'summary':
+                            lines.append(f"{full_name}_sum{label_text} {value[1]}")
+                            lines.append(f"{full_name}_count{label_text} {value[0]}")
+                        else:
+                            lines.append(f"{full_name}{label_text} {value}")
+                    if kind == 'summary':
+                        # 最大值单独作为gauge输出（summary类型不能包含其他后缀）
+                        lines.append(f"# TYPE {full_name}_max gauge")
+                        for labels, value in sorted(by_name[name]):
+                            lines.append(f"{full_name}_max{_format_labels(labels)} {value[2]}")
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self):
+        """
+        写入Prometheus文本文件（先写临时文件再改名，收集器不会读到写了一半的文件）
+        """
+        with self._write_lock:
+            self._write_textfile()
+
+    def _write_textfile(self):
+        content = self._render()
+        # 每次写入使用独立的临时文件，共享同一指标目录的其他进程也不会写到同一个文件
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(self.textfile_path)}.",
+                                        suffix='.tmp', dir=os.path.dirname(self.textfile_path) or '.')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, self.textfile_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._last_write = time.monotonic()
+
+    def _maybe_write_textfile(self):
+        if time.monotonic() - self._last_write < self.interval:
+            return
+        # 其他线程正在写入时直接返回，不阻塞记录事件的线程
+        if not self._write_lock.acquire(blocking=False):
+            return
+        try:
+            # 持有锁后再检查一次，刚有其他线程写完时不重复写入
+            if time.monotonic() - self._last_write >= self.interval:
+                self._write_textfile()
+        except OSError as e:
+            print(f"写入指标文件失败: {e}")
+        finally:
+            self._write_lock.release()
+
+    def close(self):
+        self.event('run_end', seconds=round(time.time() - self.start_time, 3))
+        self.write_textfile()
+        with self._lock:
+            self._trace.close()
+
+
+# 进程内共享的默认指标记录器，None表示禁用
+_default_metrics = None
+
+
+def configure_default_metrics(metrics_dir=DEFAULT_METRICS_DIR, textfile_path=None, enabled=True):
+    """
+    按参数重新创建默认指标记录器；textfile_path默认为metrics_dir下的ad_pipeline.prom
+    """
+    global _default_metrics
+    close_default_metrics()
+    if enabled:
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        _default_metrics = Metrics(
+            os.path.join(metrics_dir, f"trace-{run_id}.jsonl"),
+            textfile_path or os.path.join(metrics_dir, TEXTFILE_NAME),
+            run_id,
+        )
+        print(f"运行指标: {_default_metrics.trace_path}，{_default_metrics.textfile_path}")
+    return _default_metrics
+
+
+def get_default_metrics():
+    return _default_metrics
+
+
+def close_default_metrics():
+    global _default_metrics
+    if _default_metrics is not None:
+        _default_metrics.close()
+        _default_metrics = None
+
+
+def record_event(event, **fields):
+    if _default_metrics is not None:
+        _default_metrics.event(event, **fields)
+
+
+def observe(name, value, **labels):
+    if _default_metrics is not None:
+        _default_metrics.observe(name, value, **labels)
+
+
+def inc(name, value=1, **labels):
+    if _default_metrics is not None:
+        _default_metrics.inc(name, value, **labels)
+
+
+def record_report(name, report):
+    if _default_metrics is not None:
+        _default_metrics.record_report(name, report)
+
+
+@contextlib.contextmanager
+def timed(name, **labels):
+    """
+    计时上下文，结束时observe耗时（秒）
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
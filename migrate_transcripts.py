@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+一次性迁移：将output/transcript/下的whisper JSON转写文件转换为紧凑的.npz格式，
+校验转换结果后删除原JSON文件（--keep-json时保留）
+"""
+
+import os
+import json
+import argparse
+
+from manifest import DEFAULT_MANIFEST_PATH, Manifest
+from transcript_store import load_transcript, save_transcript
+
+
+def migrate_file(json_path, keep_json=False):
+    """
+    转换单个转写文件，返回 (原大小, 新大小)
+    """
+    with open(json_path, 'r', encoding='utf-8') as f:
+        result = json.load(f)
+    npz_path = os.path.splitext(json_path)[0] + '.npz'
+    save_transcript(result, npz_path)
+
+    transcript = load_transcript(npz_path)
+    segments = result.get('segments', [])
+    if transcript.text != result.get('text', '') or transcript.segment_texts != [s.get('text', '') for s in segments]:
+        os.remove(npz_path)
+        raise ValueError("转换后的文本与原文件不一致")
+
+    sizes = (os.path.getsize(json_path), os.path.getsize(npz_path))
+    if not keep_json:
+        os.remove(json_path)
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='将JSON转写文件迁移为紧凑的.npz格式')
+    parser.add_argument('--transcript-dir', default=os.path.join('output', 'transcript'),
+                        help='转写文件目录（默认: output/transcript）')
+    parser.add_argument('--keep-json', action='store_true', help='转换后保留原JSON文件')
+    parser.add_argument('-d', '--dry-run', action='store_true', help='仅统计需要转换的文件，不实际转换')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.transcript_dir):
+        print(f"错误: 目录不存在 {args.transcript_dir}")
+        return
+    json_files = sorted(
+        os.path.join(args.transcript_dir, name)
+        for name in os.listdir(args.transcript_dir) if name.endswith('.json')
+    )
+    print(f"共找到 {len(json_files)} 个JSON转写文件")
+    if args.dry_run or not json_files:
+        return
+
+    manifest = Manifest() if os.path.exists(DEFAULT_MANIFEST_PATH) else None
+    migrated = failed = 0
+    before = after = 0
+    try:
+        for json_path in json_files:
+            try:
+                old_size, new_size = migrate_file(json_path, args.keep_json)
+            except Exception as e:
+                failed += 1
+                print(f"转换失败: {json_path}, 错误: {e}")
+                continue
+            migrated += 1
+            before += old_size
+            after += new_size
+        # 清单中记录的转写路径指向已删除的JSON文件时更新为新路径
+        if manifest is not None and not args.keep_json:
+            for video_path, record in manifest.load_all().items():
+                path = record.get('transcript_path')
+                if path and path.endswith('.json') and not os.path.exists(path):
+                    npz_path = os.path.splitext(path)[0] + '.npz'
+                    if os.path.exists(npz_path):
+                        manifest.update(video_path, transcript_path=npz_path)
+    finally:
+        if manifest is not None:
+            manifest.close()
+
+    print(f"\n迁移完成: 成功 {migrated} 个，失败 {failed} 个")
+    if after:
+        print(f"磁盘占用: {before / 1024 / 1024:.1f}MB -> {after / 1024 / 1024:.1f}MB"
+              f"（缩小 {before / after:.1f} 倍）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基于asyncio的Ollama客户端：长连接池 + 可配置的并发请求数，并提供同步包装
+
+运行期间通过keep_alive让模型常驻内存，结束时恢复Ollama默认的驻留时间；
+每次调用记录提示词评估（prompt eval）和生成的token数及耗时
+"""
+
+import json
+import time
+import asyncio
+import threading
+
+import aiohttp
+
+from metrics import inc, observe, record_event, record_report
+
+OLLAMA_URL = 'http://localhost:11434'
+DEFAULT_TIMEOUT = 300
+# 运行期间模型的驻留时间：负数表示一直驻留，也可以是"30m"这样的时长
+DEFAULT_KEEP_ALIVE = '-1'
+# 结束运行时恢复的驻留时间（Ollama的默认值）
+RELEASE_KEEP_ALIVE = '5m'
+# load_duration超过该值（秒）视为模型被重新加载
+RELOAD_SECONDS = 1.0
+
+
+def keep_alive_value(value):
+    """
+    Ollama的keep_alive接受秒数或带单位的时长字符串，纯数字的字符串转换为数值
+    """
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return value
+
+
+class JsonObjectScanner:
+    """
+    增量扫描流式文本，检测第一个完整的顶层JSON对象（正确处理字符串内的括号和转义）
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.result = None
+        self._pos = 0
+        self._start = -1
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk):
+        """
+        追加文本，找到完整且合法的JSON对象时返回该对象的文本，否则返回None
+        """
+        self.text += chunk
+        if self.result is not None:
+            return None
+        while self._pos < len(self.text):
+            char = self.text[self._pos]
+            self._pos += 1
+            if self._start < 0:
+                if char == '{':
+                    self._start = self._pos - 1
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = self.text[self._start:self._pos]
+                    try:
+                        json.loads(candidate)
+                        self.result = candidate
+                        return candidate
+                    except ValueError:
+                        # 括号配对但不是合法JSON（如末尾多余逗号），继续等待后续对象
+                        self._start = -1
+        return None
+
+
+class StreamStats:
+    """
+    流式调用统计：首token延迟、生成token数、提前终止次数及估算节省的token数
+
+    每 calibration_interval 次请求中有一次不提前终止，用于测量JSON结束后
+    模型平均还会继续生成多少token（即每次提前终止节省的token数）
+    """
+
+    def __init__(self, calibration_interval=20):
+        self.calibration_interval = calibration_interval
+        self.requests = 0
+        self.early_stops = 0
+        self.tokens = 0
+        self.ttft_seconds = 0.0
+        self.tail_samples = 0
+        self.tail_tokens = 0
+        self._lock = threading.Lock()
+
+    def next_is_calibration(self):
+        with self._lock:
+            self.requests += 1
+            return self.calibration_interval > 0 and self.requests % self.calibration_interval == 0
+
+    def record(self, ttft, tokens, early_stop, tail_tokens=None):
+        with self._lock:
+            self.tokens += tokens
+            if ttft is not None:
+                self.ttft_seconds += ttft
+            if early_stop:
+                self.early_stops += 1
+            if tail_tokens is not None:
+                self.tail_samples += 1
+                self.tail_tokens += tail_tokens
+
+    def tokens_saved(self):
+        """
+        估算提前终止节省的token数；尚无校准样本时返回None
+        """
+        if not self.tail_samples:
+            return None
+        return self.early_stops * self.tail_tokens / self.tail_samples
+
+    def report(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'early_stops': self.early_stops,
+                'tokens': self.tokens,
+                'avg_ttft_seconds': self.ttft_seconds / self.requests if self.requests else 0.0,
+                'tokens_saved': self.tokens_saved(),
+            }
+
+    def print_report(self):
+        report = self.report()
+        if not report['requests']:
+            return report
+        saved = report['tokens_saved']
+        saved_text = f"约 {saved:.0f}" if saved is not None else "未知（无校准样本）"
+        print(f"Ollama流式: 请求 {report['requests']} 次，提前终止 {report['early_stops']} 次，"
+              f"平均首token延迟 {report['avg_ttft_seconds']:.2f}s，生成 {report['tokens']} token，"
+              f"节省 {saved_text} token")
+        return report
+
+
+class LatencyStats:
+    """
+    每次调用的耗时统计：提示词评估（prompt eval）与生成分开记录，
+    复用了缓存前缀时prompt_eval_count只包含新评估的token（即转写文本部分）
+
+    流式提前终止的调用没有最终的统计字段，只计入unmeasured
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.unmeasured = 0
+        self.prompt_tokens = 0
+        self.eval_tokens = 0
+        self.eval_seconds = 0.0
+        self.reloads = 0
+        self.load_seconds = 0.0
+        self.prompt_seconds = []
+        self._lock = threading.Lock()
+
+    def record(self, result):
+        with self._lock:
+            self.requests += 1
+            if not result.get('done'):
+                self.unmeasured += 1
+                return
+            load_seconds = result.get('load_duration', 0) / 1e9
+            self.prompt_tokens += result.get('prompt_eval_count', 0)
+            self.prompt_seconds.append(result.get('prompt_eval_duration', 0) / 1e9)
+            self.eval_tokens += result.get('eval_count', 0)
+            self.eval_seconds += result.get('eval_duration', 0) / 1e9
+            if load_seconds > RELOAD_SECONDS:
+                self.reloads += 1
+                self.load_seconds += load_seconds
+
+    def report(self):
+        with self._lock:
+            measured = len(self.prompt_seconds)
+            ordered = sorted(self.prompt_seconds)
+            return {
+                'requests': self.requests,
+                'measured': measured,
+                'unmeasured': self.unmeasured,
+                'avg_prompt_tokens': self.prompt_tokens / measured if measured else 0.0,
+                'avg_prompt_seconds': sum(ordered) / measured if measured else 0.0,
+                'p50_prompt_seconds': ordered[measured // 2] if measured else 0.0,
+                'max_prompt_seconds': ordered[-1] if measured else 0.0,
+                'eval_tokens': self.eval_tokens,
+                'eval_seconds': self.eval_seconds,
+                'reloads': self.reloads,
+                'load_seconds': self.load_seconds,
+            }
+
+    def print_report(self):
+        report = self.report()
+        if not report['measured']:
+            return report
+        print(f"Ollama耗时: {report['measured']} 次调用，提示词平均评估 {report['avg_prompt_tokens']:.0f} token，"
+              f"平均 {report['avg_prompt_seconds']:.2f}s（中位数 {report['p50_prompt_seconds']:.2f}s，"
+              f"最长 {report['max_prompt_seconds']:.2f}s），生成 {report['eval_tokens']} token 共 "
+              f"{report['eval_seconds']:.1f}s；模型重新加载 {report['reloads']} 次（{report['load_seconds']:.1f}s）")
+        if report['unmeasured']:
+            print(f"  另有 {report['unmeasured']} 次提前终止的流式调用没有耗时统计")
+        return report
+
+
+class AsyncOllamaClient:
+    """
+    异步Ollama客户端
+
+    max_in_flight 为同时发往服务器的请求数上限，应与服务器的 OLLAMA_NUM_PARALLEL 对应
+    keep_alive 随每个请求发送，为None时使用服务器的默认值
+    """
+
+    def __init__(self, base_url=OLLAMA_URL, max_in_flight=1, timeout=DEFAULT_TIMEOUT, keep_alive=None):
+        self.base_url = base_url.rstrip('/')
+        self.max_in_flight = max(1, max_in_flight)
+        self.timeout = timeout
+        self.keep_alive = keep_alive_value(keep_alive)
+        self._session = None
+        self._semaphore = None
+        self._pinned = set()
+        self.stream_stats = StreamStats()
+        self.latency_stats = LatencyStats()
+
+    def _get_session(self):
+        # 会话和信号量必须在事件循环内创建
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_in_flight, keepalive_timeout=300)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._session
+
+    def _record_call(self, model, result, seconds, slot_wait):
+        """
+        记录一次调用：Ollama响应中的token数和耗时（纳秒转换为秒）写入统计和运行指标
+        """
+        self.latency_stats.record(result)
+        fields = {
+            'model': model,
+            'seconds': round(seconds, 3),
+            'slot_wait_seconds': round(slot_wait, 3),
+            'done': bool(result.get('done')),
+        }
+        for name in ('prompt_eval_count', 'eval_count'):
+            if name in result:
+                fields[name] = result[name]
+        for name in ('prompt_eval_duration', 'eval_duration', 'load_duration', 'total_duration'):
+            if name in result:
+                fields[name.replace('_duration', '_seconds')] = round(result[name] / 1e9, 4)
+        for name in ('early_stop', 'ttft', 'tokens'):
+            if result.get(name) is not None:
+                fields[name] = result[name]
+        record_event('llm_call', **fields)
+        observe('llm_call_seconds', seconds, model=model)
+        observe('llm_slot_wait_seconds', slot_wait, model=model)
+        if 'prompt_eval_seconds' in fields:
+            observe('llm_prompt_eval_seconds', fields['prompt_eval_seconds'], model=model)
+        if 'eval_seconds' in fields:
+            observe('llm_eval_seconds', fields['eval_seconds'], model=model)
+        inc('llm_prompt_tokens', result.get('prompt_eval_count', 0), model=model)
+        inc('llm_eval_tokens', result.get('eval_count', result.get('tokens', 0)), model=model)
+
+    async def _acquire_slot(self):
+        """
+        等待并发名额，返回等待时间（秒）
+        """
+        start = time.perf_counter()
+        await self._semaphore.acquire()
+        return time.perf_counter() - start
+
+    async def _post(self, path, payload):
+        session = self._get_session()
+        async with self._semaphore:
+            async with session.post(self.base_url + path, json=payload) as response:
+                response.raise_for_status()
+                return await response.json()
+
+    def _payload(self, prompt, model, stream, fields):
+        payload = {'model': model, 'prompt': prompt, 'stream': stream}
+        if self.keep_alive is not None:
+            payload['keep_alive'] = self.keep_alive
+            self._pinned.add(model)
+        payload.update(fields)
+        return payload
+
+    async def generate(self, prompt, model, timeout=None, **fields):
+        """
+        调用 /api/generate（非流式），返回完整的响应JSON
+
+        timeout 为该请求的截止时间（秒，包含排队等待），默认使用客户端的timeout
+        """
+        payload = self._payload(prompt, model, False, fields)
+        result = await asyncio.wait_for(self._generate(payload), timeout or self.timeout)
+        return result
+
+    async def _generate(self, payload):
+        session = self._get_session()
+        slot_wait = await self._acquire_slot()
+        start = time.perf_counter()
+        try:
+            async with session.post(self.base_url + '/api/generate', json=payload) as response:
+                response.raise_for_status()
+                result = await response.json()
+        finally:
+            self._semaphore.release()
+        self._record_call(payload['model'], result, time.perf_counter() - start, slot_wait)
+        return result
+
+    async def warm_up(self, model, system=None):
+        """
+        预先加载模型（按keep_alive驻留）；给出system时再生成1个token，
+        让服务器评估并缓存这段固定的前缀
+        """
+        payload = self._payload('', model, False, {})
+        start = time.perf_counter()
+        try:
+            await self._post('/api/generate', payload)
+            if system:
+                payload.update(system=system, options={'num_predict': 1})
+                await self._post('/api/generate', payload)
+        except Exception as e:
+            print(f"Ollama预热失败（不影响后续分析）: {e!r}")
+            return False
+        print(f"Ollama模型已加载: {model}（{time.perf_counter() - start:.1f}s）")
+        return True
+
+    async def release(self):
+        """
+        将本次运行中固定驻留的模型恢复为Ollama默认的驻留时间
+        """
+        for model in sorted(self._pinned):
+            payload = {'model': model, 'prompt': '', 'stream': False, 'keep_alive': RELEASE_KEEP_ALIVE}
+            try:
+                await asyncio.wait_for(self._post('/api/generate', payload), self.timeout)
+            except Exception as e:
+                print(f"恢复模型驻留时间失败: {model}: {e!r}")
+        self._pinned.clear()
+
+    async def _stream(self, payload, early_stop):
+        session = self._get_session()
+        scanner = JsonObjectScanner()
+        ttft = None
+        tokens = 0
+        tokens_at_object = None
+        final = {}
+        slot_wait = await self._acquire_slot()
+        start = time.perf_counter()
+        try:
+            async with session.post(self.base_url + '/api/generate', json=payload) as response:
+                response.raise_for_status()
+                async for line in response.content:
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    piece = chunk.get('response', '')
+                    if piece:
+                        if ttft is None:
+                            ttft = time.perf_counter() - start
+                        tokens += 1
+                    if scanner.feed(piece) is not None:
+                        tokens_at_object = tokens
+                        if early_stop:
+                            # 关闭连接，Ollama检测到客户端断开后停止生成
+                            response.close()
+                            break
+                    if chunk.get('done'):
+                        final = chunk
+                        break
+        finally:
+            self._semaphore.release()
+
+        stopped = early_stop and tokens_at_object is not None and not final
+        tail = tokens - tokens_at_object if (not early_stop and tokens_at_object is not None) else None
+        self.stream_stats.record(ttft, tokens, stopped, tail)
+        result = dict(final)
+        result.update({
+            'response': scanner.result if stopped else scanner.text,
+            'done': bool(final),
+            'early_stop': stopped,
+            'ttft': ttft,
+            'tokens': tokens,
+        })
+        self._record_call(payload['model'], result, time.perf_counter() - start, slot_wait)
+        return result
+
+    async def generate_stream(self, prompt, model, timeout=None, **fields):
+        """
+        流式调用 /api/generate，收到完整且合法的JSON对象后立即终止生成
+
+        返回与非流式相同结构的响应（response为截至终止时的文本），
+        另含 early_stop、ttft（首token延迟，秒）、tokens（收到的token数）
+        """
+        payload = self._payload(prompt, model, True, fields)
+        early_stop = not self.stream_stats.next_is_calibration()
+        return await asyncio.wait_for(self._stream(payload, early_stop), timeout or self.timeout)
+
+    async def close(self):
+        await self.release()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class OllamaClient:
+    """
+    同步包装：在后台线程中运行事件循环，可被多个线程并发调用
+
+    stream为True时 complete() 使用流式调用并在JSON完整后提前终止
+    """
+
+    def __init__(self, base_url=OLLAMA_URL, max_in_flight=1, timeout=DEFAULT_TIMEOUT, stream=False,
+                 keep_alive=None):
+        self.stream = stream
+        self._client = AsyncOllamaClient(base_url, max_in_flight, timeout, keep_alive)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='ollama-client', daemon=True)
+        self._thread.start()
+
+    @property
+    def max_in_flight(self):
+        return self._client.max_in_flight
+
+    def run(self, coro):
+        """
+        在客户端的事件循环中执行协程并等待结果
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    @property
+    def stream_stats(self):
+        return self._client.stream_stats
+
+    @property
+    def latency_stats(self):
+        return self._client.latency_stats
+
+    def warm_up(self, model, system=None, wait=True):
+        """
+        预热模型；wait为False时在后台进行，返回concurrent.futures.Future
+        """
+        future = asyncio.run_coroutine_threadsafe(self._client.warm_up(model, system), self._loop)
+        return future.result() if wait else future
+
+    def generate(self, prompt, model, timeout=None, **fields):
+        return self.run(self._client.generate(prompt, model, timeout, **fields))
+
+    def generate_stream(self, prompt, model, timeout=None, **fields):
+        return self.run(self._client.generate_stream(prompt, model, timeout, **fields))
+
+    def complete(self, prompt, model, timeout=None, **fields):
+        """
+        按客户端配置选择流式或非流式调用
+        """
+        if self.stream:
+            return self.generate_stream(prompt, model, timeout, **fields)
+        return self.generate(prompt, model, timeout, **fields)
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        self.run(self._client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+# 进程内共享的默认客户端
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def configure_default_client(base_url=OLLAMA_URL, max_in_flight=1, timeout=DEFAULT_TIMEOUT, stream=False,
+                             keep_alive=None):
+    """
+    按参数重新创建默认客户端
+    """
+    global _default_client
+    with _default_lock:
+        if _default_client is not None:
+            _default_client.close()
+        _default_client = OllamaClient(base_url, max_in_flight, timeout, stream, keep_alive)
+        return _default_client
+
+
+def get_default_client():
+    """
+    获取默认客户端，首次调用时按默认参数创建
+    """
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = OllamaClient()
+        return _default_client
+
+
+def close_default_client():
+    global _default_client
+    with _default_lock:
+        if _default_client is not None:
+            stream_report = _default_client.stream_stats.print_report()
+            if _default_client.stream:
+                record_report('ollama_stream', stream_report)
+            record_report('ollama_latency', _default_client.latency_stats.print_report())
+            _default_client.close()
+            _default_client = None
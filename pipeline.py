@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分阶段流水线：各阶段之间使用有界队列连接，不同视频可同时处于不同阶段
+
+每个item在各阶段的排队等待时间、处理时间和因下游队列满而阻塞的时间记录到运行指标
+"""
+
+import time
+import queue
+import threading
+
+from metrics import observe, record_event, record_report
+
+# 队列结束标记
+_DONE = object()
+
+
+class Stage:
+    """
+    流水线阶段
+
+    func(item) 返回传递给下一阶段的item，返回None表示该视频不再继续处理
+    workers 为该阶段的并发线程数，queue_size 为该阶段输入队列的容量（背压）
+    """
+
+    def __init__(self, name, func, workers=1, queue_size=4):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        # 在输入队列中等待的累计时间，以及下游队列满时阻塞的累计时间
+        self.queue_wait_seconds = 0.0
+        self.blocked_seconds = 0.0
+
+    def report(self):
+        return {
+            'workers': self.workers,
+            'processed': self.processed,
+            'failed': self.failed,
+            'busy_seconds': self.busy_seconds,
+            'queue_wait_seconds': self.queue_wait_seconds,
+            'blocked_seconds': self.blocked_seconds,
+        }
+
+
+def _item_label(item):
+    """
+    事件中标识item：流水线中的item是带video_path的dict
+    """
+    if isinstance(item, dict):
+        return item.get('video_path')
+    return None
+
+
+def _run_stage_worker(stage, in_queue, out_queue, lock, remaining, next_workers):
+    while True:
+        entry = in_queue.get()
+        if entry is _DONE:
+            break
+        # 队列中存放 (入队时间, item)，入队时间为上游处理完成的时间，排队时间包含等待队列空位的时间
+        enqueued, item = entry
+        start = time.perf_counter()
+        queue_wait = start - enqueued
+        ok = True
+        try:
+            result = stage.func(item)
+        except Exception as e:
+            print(f"[{stage.name}] 处理失败: {e}")
+            result = None
+            ok = False
+            with lock:
+                stage.failed += 1
+        busy = time.perf_counter() - start
+        blocked = 0.0
+        if result is not None:
+            put_start = time.perf_counter()
+            out_queue.put((time.perf_counter(), result))
+            blocked = time.perf_counter() - put_start
+        with lock:
+            stage.processed += 1
+            stage.busy_seconds += busy
+            stage.queue_wait_seconds += queue_wait
+            stage.blocked_seconds += blocked
+        observe('stage_seconds', busy, stage=stage.name)
+        observe('stage_queue_wait_seconds', queue_wait, stage=stage.name)
+        observe('stage_blocked_seconds', blocked, stage=stage.name)
+        record_event('stage', stage=stage.name, item=_item_label(item), ok=ok, passed=result is not None,
+                     seconds=round(busy, 3), queue_wait_seconds=round(queue_wait, 3),
+                     blocked_seconds=round(blocked, 3))
+
+    # 本阶段最后一个退出的线程负责通知下一阶段结束
+    with lock:
+        remaining[stage.name] -= 1
+        last = remaining[stage.name] == 0
+    if last:
+        for _ in range(next_workers):
+            out_queue.put(_DONE)
+
+
+def run_pipeline(items, stages, on_result=None):
+    """
+    运行流水线，items可以是任意（包括无限的）可迭代对象
+
+    on_result(item) 在每个item走完全部阶段后于调用线程中回调
+    返回全部走完流水线的item列表
+    """
+    queues = [queue.Queue(maxsize=stage.queue_size) for stage in stages]
+    # 最后一个阶段的输出队列不限容量，由调用线程消费
+    queues.append(queue.Queue())
+    lock = threading.Lock()
+    remaining = {stage.name: stage.workers for stage in stages}
+
+    threads = []
+    for index, stage in enumerate(stages):
+        next_workers = stages[index + 1].workers if index + 1 < len(stages) else 1
+        for n in range(stage.workers):
+            thread = threading.Thread(
+                target=_run_stage_worker,
+                args=(stage, queues[index], queues[index + 1], lock, remaining, next_workers),
+                name=f"{stage.name}-{n}",
+                daemon=True,
+            )
+            thread.start()
+            threads.append(thread)
+
+    feed_errors = []
+
+    def feed():
+        # 输入队列满时阻塞，形成背压；items抛出异常时也要通知各阶段结束，异常由调用线程重新抛出
+        try:
+            for item in items:
+                queues[0].put((time.perf_counter(), item))
+        except BaseException as e:
+            feed_errors.append(e)
+        finally:
+            for _ in range(stages[0].workers):
+                queues[0].put(_DONE)
+
+    feeder = threading.Thread(target=feed, name='pipeline-feeder', daemon=True)
+    feeder.start()
+
+    start = time.perf_counter()
+    first_result_seconds = None
+    results = []
+    while True:
+        entry = queues[-1].get()
+        if entry is _DONE:
+            break
+        item = entry[1]
+        if first_result_seconds is None:
+            first_result_seconds = time.perf_counter() - start
+            print(f"首个结果产出耗时: {first_result_seconds:.1f}s")
+        results.append(item)
+        if on_result is not None:
+            on_result(item)
+
+    feeder.join()
+    for thread in threads:
+        thread.join()
+    if feed_errors:
+        raise feed_errors[0]
+
+    total_seconds = time.perf_counter() - start
+    print(f"\n流水线完成，耗时 {total_seconds:.1f}s")
+    for stage in stages:
+        print(f"  [{stage.name}] 线程 {stage.workers}，处理 {stage.processed} 个，"
+              f"失败 {stage.failed} 个，累计耗时 {stage.busy_seconds:.1f}s，"
+              f"排队 {stage.queue_wait_seconds:.1f}s，下游阻塞 {stage.blocked_seconds:.1f}s")
+        record_report(f"stage_{stage.name}", stage.report())
+    record_event('pipeline', seconds=round(total_seconds, 3),
+                 first_result_seconds=round(first_result_seconds, 3) if first_result_seconds is not None else None)
+    return results
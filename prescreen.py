@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM之前的词典预筛：用Aho-Corasick自动机在转写文本中查找品牌/商品词和广告触发词，
+没有命中的文本（或窗口）直接判为无广告，不再调用Ollama
+
+词典保存在output/ad_lexicon.txt（每行一个词，#开头为注释，可手工维护），
+不存在时根据已有结果中的商品名称生成；安装了pyahocorasick时使用其C实现
+
+python prescreen.py --seed 重新生成词典，--eval 用已有的标注结果评估召回率
+"""
+
+import os
+import re
+import argparse
+import threading
+from collections import deque
+
+DEFAULT_LEXICON_PATH = os.path.join('output', 'ad_lexicon.txt')
+
+# 广告常见的触发词
+TRIGGER_PHRASES = (
+    '推荐', '安利', '种草', '好物', '链接', '下单', '购买', '入手', '优惠', '折扣', '优惠券', '优惠码',
+    '推荐码', '旗舰店', '官方', '同款', '品牌', '赞助', '合作', '恰饭', '广告', '测评', '开箱', '性价比',
+    '评论区', '置顶', '直播间', '限时',
+)
+
+# 商品名称中无意义的取值
+_INVALID_NAMES = {'无', 'nan', 'none', '未识别', '无特定产品名称', '未知', '不明'}
+_NAME_SEPARATORS = re.compile(r"[、,，;；/|\[\]'\"]+")
+
+# 判为无广告时使用的分析结果
+NO_AD_RESULT = {
+    'is_ad': False,
+    'ad_type': '无',
+    'product_name': '',
+    'ad_text': '',
+    'confidence': 0.0,
+    'timestamp': '',
+}
+
+
+class AhoCorasick:
+    """
+    纯Python实现的Aho-Corasick自动机
+    """
+
+    def __init__(self, words):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for word in words:
+            self._add(word)
+        self._build()
+
+    def _add(self, word):
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(word)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter(self, text):
+        """
+        依次产出 (结束位置, 命中的词)
+        """
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for word in self._output[state]:
+                yield index, word
+
+
+def _build_automaton(words):
+    try:
+        import ahocorasick
+    except ImportError:
+        return AhoCorasick(words)
+    automaton = ahocorasick.Automaton()
+    for word in words:
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    return automaton
+
+
+def split_product_names(value):
+    """
+    将商品名称拆分为词典条目，过滤无意义的取值和单字
+    """
+    if value is None or (isinstance(value, float) and value != value):
+        return []
+    if isinstance(value, (list, tuple)):
+        value = '、'.join(str(item) for item in value)
+    names = []
+    for name in _NAME_SEPARATORS.split(str(value)):
+        name = name.strip().lower()
+        if len(name) >= 2 and name not in _INVALID_NAMES and name not in names:
+            names.append(name)
+    return names
+
+
+class Prescreen:
+    """
+    词典预筛：命中的不同词条数达到min_hits时视为候选（需要LLM分析）
+    """
+
+    def __init__(self, terms, min_hits=1, use_triggers=True):
+        self.terms = sorted({term.lower() for term in terms if term})
+        self.triggers = set(TRIGGER_PHRASES) if use_triggers else set()
+        self.min_hits = min_hits
+        self._automaton = _build_automaton(sorted(set(self.terms) | self.triggers))
+
+    def hits(self, text):
+        """
+        返回文本中命中的不同词条
+        """
+        found = []
+        for _, word in self._automaton.iter(text.lower()):
+            if word not in found:
+                found.append(word)
+        return found
+
+    def screen(self, text, exclude=()):
+        """
+        返回 (是否候选, 命中的词条)；exclude中的词条不计入（用于留一法评估）
+        """
+        found = [word for word in self.hits(text) if word not in exclude]
+        return len(found) >= self.min_hits, found
+
+
+class PrescreenStats:
+    """
+    预筛统计（多线程安全）
+    """
+
+    def __init__(self):
+        self.screened = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def record(self, candidate):
+        with self._lock:
+            self.screened += 1
+            if not candidate:
+                self.skipped += 1
+
+    def report(self):
+        with self._lock:
+            return {
+                'screened': self.screened,
+                'skipped': self.skipped,
+                'skip_rate': self.skipped / self.screened if self.screened else 0.0,
+            }
+
+    def print_report(self):
+        report = self.report()
+        if not report['screened']:
+            return report
+        print(f"词典预筛: 检查 {report['screened']} 段文本，跳过 {report['skipped']} 次LLM调用"
+              f"（{report['skip_rate']:.1%}）")
+        return report
+
+
+# 进程内共享的预筛统计
+prescreen_stats = PrescreenStats()
+
+
+def _labeled_results():
+    from results_dataset import load_results
+    return load_results(['文件名', '是否包含广告', '商品名称'])
+
+
+def seed_terms(df):
+    """
+    从已有结果的商品名称中收集词条，返回 {词条: 出现该词条的文件名集合}
+    """
+    sources = {}
+    if df is None:
+        return sources
+    for filename, value in zip(df['文件名'], df['商品名称']):
+        for name in split_product_names(value):
+            sources.setdefault(name, set()).add(filename)
+    return sources
+
+
+def save_lexicon(terms, lexicon_path=DEFAULT_LEXICON_PATH):
+    directory = os.path.dirname(lexicon_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(lexicon_path, 'w', encoding='utf-8') as f:
+        f.write('# 广告预筛词典：每行一个品牌/商品词，可手工增删；触发词见prescreen.py中的TRIGGER_PHRASES\n')
+        for term in sorted(terms):
+            f.write(term + '\n')
+
+
+def load_lexicon(lexicon_path=DEFAULT_LEXICON_PATH):
+    """
+    读取词典；不存在时根据已有结果生成并保存
+    """
+    if not os.path.exists(lexicon_path):
+        terms = sorted(seed_terms(_labeled_results()))
+        save_lexicon(terms, lexicon_path)
+        print(f"已根据已有结果生成预筛词典（{len(terms)} 个词条）: {lexicon_path}")
+        return terms
+    with open(lexicon_path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def evaluate(transcript_dir, min_hits=1):
+    """
+    用已有的标注结果评估召回率：每个视频自身贡献的词条不计入（留一法），
+    避免用视频自己的商品名称去命中自己
+    """
+    from transcript_store import find_transcript, load_transcript
+
+    df = _labeled_results()
+    if df is None:
+        return None
+    sources = seed_terms(df)
+    screen = Prescreen(sources, min_hits)
+    stats = {'videos': 0, 'positives': 0, 'recalled': 0, 'skipped': 0, 'missed': []}
+    for filename, is_ad in zip(df['文件名'], df['是否包含广告']):
+        base_name = os.path.splitext(filename)[0]
+        path = find_transcript(os.path.join(transcript_dir, base_name + '.npz'))
+        if path is None:
+            continue
+        text = load_transcript(path).get('text', '')
+        own_terms = {term for term, files in sources.items() if files == {filename}}
+        candidate, _ = screen.screen(text, exclude=own_terms)
+        is_ad = str(is_ad).lower() == 'true'
+        stats['videos'] += 1
+        if not candidate:
+            stats['skipped'] += 1
+        if is_ad:
+            stats['positives'] += 1
+            if candidate:
+                stats['recalled'] += 1
+            else:
+                stats['missed'].append(filename)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='广告词典预筛：生成词典或评估召回率')
+    parser.add_argument('--seed', action='store_true', help='根据已有结果的商品名称重新生成词典（覆盖原文件）')
+    parser.add_argument('--eval', action='store_true', help='用已有的标注结果评估召回率（留一法）')
+    parser.add_argument('--lexicon', default=DEFAULT_LEXICON_PATH, help=f'词典路径（默认: {DEFAULT_LEXICON_PATH}）')
+    parser.add_argument('--min-hits', type=int, default=1, help='命中多少个不同词条才送LLM分析（默认: 1）')
+    parser.add_argument('--transcript-dir', default=os.path.join('output', 'transcript'))
+    args = parser.parse_args()
+
+    if args.seed:
+        terms = sorted(seed_terms(_labeled_results()))
+        save_lexicon(terms, args.lexicon)
+        print(f"已生成预筛词典（{len(terms)} 个词条）: {args.lexicon}")
+    if args.eval:
+        stats = evaluate(args.transcript_dir, args.min_hits)
+        if not stats or not stats['videos']:
+            print("没有可评估的视频（需要结果数据集或ads_summary.csv，以及对应的转写文件）")
+            return
+        recall = stats['recalled'] / stats['positives'] if stats['positives'] else 0.0
+        print(f"评估视频 {stats['videos']} 个，其中广告 {stats['positives']} 个")
+        print(f"召回率: {recall:.1%}（{stats['recalled']}/{stats['positives']}），"
+              f"可跳过LLM调用: {stats['skipped']} 个（{stats['skipped'] / stats['videos']:.1%}）")
+        for filename in stats['missed']:
+            print(f"  漏检: {filename}")
+
+
+if __name__ == '__main__':
+    main()
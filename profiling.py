@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能剖析模式（--profile）：按阶段和视频用cProfile记录调用耗时，用tracemalloc记录内存峰值，
+结果写入output/profile/<脚本名>-<运行ID>/：
+
+- <阶段>/<视频>-<路径哈希>.prof：每个视频每个阶段的cProfile数据（可用snakeviz或pstats查看），重复剖析时加序号
+- <阶段>.prof：同一阶段所有视频合并后的数据
+- sections.jsonl：每个剖析区段的耗时和内存（每行一个）。没有其他区段在进行时，区段开始时重置tracemalloc峰值，
+  memory_peak_mb为本区段的峰值（memory_peak_scope为section）；与其他线程的区段重叠时为这些区段共同的峰值（shared）
+- memory_peak_<序号>.txt：内存峰值创新高时的tracemalloc快照（占用最多的代码行）
+- summary.txt：各阶段最耗时的函数、最慢的视频和内存峰值
+
+cProfile只记录开启它的线程；同一线程内嵌套的区段只计时。Python 3.12起同一时刻只能有一个cProfile
+在运行，并发的区段此时只计时不剖析（summary中记为未剖析）。转写在 --asr-workers > 1 的工作进程中
+进行时，转写阶段只能看到等待时间
+"""
+
+import io
+import os
+import re
+import json
+import hashlib
+import time
+import pstats
+import cProfile
+import threading
+import contextlib
+import tracemalloc
+
+DEFAULT_PROFILE_DIR = os.path.join('output', 'profile')
+# tracemalloc记录的调用栈深度
+TRACE_FRAMES = 10
+# 内存峰值比上次快照高出该比例时才重新快照（快照本身开销较大）
+SNAPSHOT_GROWTH = 0.1
+
+_UNSAFE_CHARS = re.compile(r'[^\w.\-\[\]]+')
+
+
+def _safe_name(label):
+    name = _UNSAFE_CHARS.sub('_', os.path.splitext(os.path.basename(str(label)))[0])
+    return name[:120] or 'item'
+
+
+def _item_filename(item, count):
+    """
+    单个区段的.prof文件名：加上完整路径的短哈希区分不同目录下的同名视频，
+    同一视频再次剖析（如重试）时加序号
+    """
+    digest = hashlib.sha1(str(item).encode('utf-8')).hexdigest()[:8]
+    suffix = f"-{count}" if count > 1 else ''
+    return f"{_safe_name(item)}-{digest}{suffix}.prof"
+
+
+def item_label(item):
+    """
+    流水线item（带video_path的dict）或文件名作为区段标识
+    """
+    if isinstance(item, dict):
+        return item.get('video_path')
+    return item
+
+
+class RunProfiler:
+    """
+    一次运行的剖析器（多线程安全）
+    """
+
+    def __init__(self, name, output_dir=DEFAULT_PROFILE_DIR, per_item=True, memory=True, top=25):
+        self.run_id = time.strftime('%Y%m%d-%H%M%S')
+        self.directory = os.path.join(output_dir, f"{name}-{self.run_id}")
+        self.per_item = per_item
+        self.memory = memory
+        self.top = top
+        # {阶段: pstats.Stats}，{阶段: [(耗时, 视频)]}
+        self._stage_stats = {}
+        self._stage_items = {}
+        self._unprofiled = {}
+        # {(阶段, 视频): 已写出的.prof文件数}
+        self._item_counts = {}
+        self._snapshots = 0
+        # 正在进行的区段数，以及区段开始时有其他区段在进行的累计次数（用于判断内存峰值是否只属于一个区段）
+        self._active = 0
+        self._overlaps = 0
+        self._run_peak = 0
+        self._snapshot_peak = 0
+        self._peak_section = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._sections = open(os.path.join(self.directory, 'sections.jsonl'), 'w', encoding='utf-8')
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        print(f"性能剖析已开启，结果目录: {self.directory}")
+
+    def _start_profile(self):
+        if getattr(self._local, 'active', False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # 其他线程中的cProfile正在运行（Python 3.12+）
+            return None
+        self._local.active = True
+        return profile
+
+    @contextlib.contextmanager
+    def section(self, stage, item=None):
+        """
+        剖析一个区段：stage为阶段名，item为视频（None表示整个阶段）
+        """
+        exclusive = self._enter_section()
+        overlaps = self._overlaps
+        profile = self._start_profile()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+                self._local.active = False
+            with self._lock:
+                self._active -= 1
+                # 期间没有其他区段开始才能把内存峰值算到本区段
+                exclusive = exclusive and self._overlaps == overlaps
+            self._record(stage, item, seconds, profile, exclusive)
+
+    def _enter_section(self):
+        """
+        没有其他区段在进行时重置tracemalloc峰值，返回本区段是否独占
+        """
+        with self._lock:
+            exclusive = self._active == 0
+            if exclusive:
+                if self.memory and tracemalloc.is_tracing():
+                    _, peak = tracemalloc.get_traced_memory()
+                    self._run_peak = max(self._run_peak, peak)
+                    tracemalloc.reset_peak()
+            else:
+                self._overlaps += 1
+            self._active += 1
+            return exclusive
+
+    def wrap(self, stage, func, label=item_label):
+        """
+        包装阶段函数func(item, ...)，每次调用作为一个区段
+        """
+        def wrapper(item, *args, **kwargs):
+            with self.section(stage, label(item)):
+                return func(item, *args, **kwargs)
+        return wrapper
+
+    def _record(self, stage, item, seconds, profile, exclusive=True):
+        current = peak = 0
+        if self.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+        record = {
+            'stage': stage,
+            'item': item,
+            'seconds': round(seconds, 4),
+            'profiled': profile is not None,
+            'memory_current_mb': round(current / 1024 / 1024, 2),
+            'memory_peak_mb': round(peak / 1024 / 1024, 2),
+            # section：峰值只属于本区段；shared：与其他线程（或嵌套）的区段重叠，峰值为这些区段共同的峰值
+            'memory_peak_scope': 'section' if exclusive else 'shared',
+        }
+        take_snapshot = False
+        with self._lock:
+            self._run_peak = max(self._run_peak, peak)
+            self._sections.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._stage_items.setdefault(stage, []).append((seconds, item))
+            if profile is None:
+                self._unprofiled[stage] = self._unprofiled.get(stage, 0) + 1
+            else:
+                stats = pstats.Stats(profile)
+                if stage in self._stage_stats:
+                    self._stage_stats[stage].add(stats)
+                else:
+                    self._stage_stats[stage] = stats
+                if self.per_item and item is not None:
+                    stage_dir = os.path.join(self.directory, _safe_name(stage))
+                    os.makedirs(stage_dir, exist_ok=True)
+                    key = (stage, item)
+                    self._item_counts[key] = self._item_counts.get(key, 0) + 1
+                    stats.dump_stats(os.path.join(stage_dir, _item_filename(item, self._item_counts[key])))
+            if peak > self._snapshot_peak * (1 + SNAPSHOT_GROWTH):
+                self._snapshot_peak = peak
+                self._peak_section = (stage, item, peak)
+                self._snapshots += 1
+                take_snapshot = True
+                index = self._snapshots
+        if take_snapshot:
+            self._write_snapshot(index, stage, item, peak)
+
+    def _write_snapshot(self, index, stage, item, peak):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        path = os.path.join(self.directory, f"memory_peak_{index:03d}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"阶段: {stage}  视频: {item}  峰值: {peak / 1024 / 1024:.1f}MB\n\n")
+            for stat in snapshot.statistics('lineno')[:self.top]:
+                f.write(f"{stat}\n")
+
+    def summary(self):
+        """
+        生成文本摘要：各阶段合计耗时、最耗时的函数（按累计耗时）和最慢的视频
+        """
+        out = io.StringIO()
+        with self._lock:
+            for stage, items in self._stage_items.items():
+                total = sum(seconds for seconds, _ in items)
+                out.write(f"===== 阶段 {stage}: {len(items)} 个区段，合计 {total:.2f}s，"
+                          f"未剖析 {self._unprofiled.get(stage, 0)} 个 =====\n")
+                slowest = sorted(items, key=lambda pair: pair[0], reverse=True)[:10]
+                if any(item is not None for _, item in slowest):
+                    out.write("最慢的视频:\n")
+                    for seconds, item in slowest:
+                        out.write(f"  {seconds:10.3f}s  {item}\n")
+                stats = self._stage_stats.get(stage)
+                if stats is not None:
+                    stats.stream = out
+                    out.write("最耗时的函数（按累计耗时）:\n")
+                    stats.sort_stats('cumulative').print_stats(self.top)
+                    out.write("自身耗时最多的函数:\n")
+                    stats.sort_stats('tottime').print_stats(self.top)
+            if self._peak_section is not None:
+                stage, item, peak = self._peak_section
+                out.write(f"内存峰值最高的区段: {peak / 1024 / 1024:.1f}MB（阶段 {stage}，视频 {item}），"
+                          f"快照见 memory_peak_{self._snapshots:03d}.txt\n")
+                out.write(f"整个运行的内存峰值: {self._run_peak / 1024 / 1024:.1f}MB\n")
+        return out.getvalue()
+
+    def close(self):
+        """
+        写出合并后的各阶段数据和摘要，停止tracemalloc，返回摘要路径
+        """
+        with self._lock:
+            for stage, stats in self._stage_stats.items():
+                stats.dump_stats(os.path.join(self.directory, _safe_name(stage) + '.prof'))
+            self._sections.close()
+        summary_path = os.path.join(self.directory, 'summary.txt')
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write(self.summary())
+        if self.memory and tracemalloc.is_tracing():
+            self._run_peak = max(self._run_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        self.print_report()
+        return summary_path
+
+    def print_report(self):
+        with self._lock:
+            stages = [(stage, sum(seconds for seconds, _ in items), len(items))
+                      for stage, items in self._stage_items.items()]
+        print(f"\n性能剖析结果: {self.directory}")
+        for stage, total, count in sorted(stages, key=lambda entry: entry[1], reverse=True):
+            print(f"  [{stage}] {count} 个区段，合计 {total:.1f}s")
+        if self._peak_section is not None:
+            print(f"  内存峰值 {self._peak_section[2] / 1024 / 1024:.1f}MB（阶段 {self._peak_section[0]}）")
+        print(f"  热点函数见 {os.path.join(self.directory, 'summary.txt')}")
+
+
+# 进程内共享的默认剖析器，None表示未开启
+_default_profiler = None
+
+
+def configure_default_profiler(name, enabled=True, output_dir=DEFAULT_PROFILE_DIR, per_item=True):
+    """
+    开启剖析（enabled为False时不做任何事）
+    """
+    global _default_profiler
+    close_default_profiler()
+    if enabled:
+        _default_profiler = RunProfiler(name, output_dir, per_item)
+    return _default_profiler
+
+
+def get_default_profiler():
+    return _default_profiler
+
+
+def close_default_profiler():
+    global _default_profiler
+    if _default_profiler is not None:
+        _default_profiler.close()
+        _default_profiler = None
+
+
+def profile_section(stage, item=None):
+    """
+    剖析区段；未开启剖析时为空操作
+    """
+    if _default_profiler is None:
+        return contextlib.nullcontext()
+    return _default_profiler.section(stage, item)
+
+
+def profiled(stage, func, label=item_label):
+    """
+    按阶段包装函数；未开启剖析时原样返回
+    """
+    if _default_profiler is None:
+        return func
+    return _default_profiler.wrap(stage, func, label)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+发布时间索引：published.json只加载一次，按B站视频ID和文件名建立字典，O(1)查询
+"""
+
+import os
+import json
+import threading
+
+from fetch_publish_dates import extract_bilibili_id
+
+DEFAULT_PUBLISHED_PATH = os.path.join('output', 'published.json')
+
+
+class PublishDateIndex:
+    """
+    发布时间索引 {视频ID: 发布时间} 和 {文件名: 发布时间}
+    """
+
+    def __init__(self, published=None):
+        self.by_id = {}
+        self.by_filename = {}
+        for video_id, info in (published or {}).items():
+            publish_date = info.get('publish_date', '')
+            if not publish_date:
+                continue
+            self.by_id[video_id] = publish_date
+            if info.get('filename'):
+                self.by_filename[info['filename']] = publish_date
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def lookup(self, filename):
+        """
+        查询视频发布时间：先按文件名精确匹配，再按文件名中的BV/av号匹配；找不到返回空字符串
+        """
+        publish_date = self.by_filename.get(filename)
+        if publish_date:
+            return publish_date
+        video_id = extract_bilibili_id(filename)
+        if video_id:
+            return self.by_id.get(video_id, '')
+        return ''
+
+
+# 已加载的索引 {文件路径: (修改时间, 索引)}，文件更新后自动重新加载
+_INDEXES = {}
+_lock = threading.Lock()
+
+
+def load_publish_index(published_path=DEFAULT_PUBLISHED_PATH):
+    """
+    加载发布时间索引（同一进程内按文件修改时间缓存，多个阶段共用）
+    """
+    try:
+        mtime = os.path.getmtime(published_path)
+    except OSError:
+        print("警告: 发布时间文件不存在，将使用空值")
+        return PublishDateIndex()
+
+    with _lock:
+        cached = _INDEXES.get(published_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(published_path, 'r', encoding='utf-8') as f:
+                index = PublishDateIndex(json.load(f))
+        except Exception as e:
+            print(f"读取发布时间文件失败: {e}")
+            return PublishDateIndex()
+        _INDEXES[published_path] = (mtime, index)
+        return index
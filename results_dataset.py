@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析结果数据集：按发布月份分区的Parquet文件（output/results/publish_month=YYYY-MM/），
+只追加不改写，每行带updated_at，读取时按文件名去重保留最新的一行；
+下游脚本只读取需要的列，ads_summary.csv改为可选导出的视图
+"""
+
+import os
+import time
+import uuid
+import argparse
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+DEFAULT_DATASET_DIR = os.path.join('output', 'results')
+DEFAULT_CSV_PATH = os.path.join('output', 'ads_summary.csv')
+
+# 发布时间未知的视频放在该分区
+UNKNOWN_MONTH = 'unknown'
+
+SCHEMA = pa.schema([
+    ('文件名', pa.string()),
+    ('发布时间', pa.string()),
+    ('是否包含广告', pa.bool_()),
+    ('广告类型', pa.string()),
+    ('商品名称', pa.string()),
+    ('广告文本', pa.string()),
+    ('置信度', pa.float64()),
+    ('时间戳', pa.string()),
+    ('原始响应', pa.string()),
+    ('ads_time', pa.string()),
+    ('updated_at', pa.float64()),
+])
+COLUMNS = [field.name for field in SCHEMA]
+
+# 视图中的列顺序（不含内部字段updated_at）
+VIEW_COLUMNS = [name for name in COLUMNS if name != 'updated_at']
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() == 'true'
+    return bool(value) if value is not None and not pd.isna(value) else False
+
+
+def _to_float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if pd.isna(value) else value
+
+
+def _to_str(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return '、'.join(str(item) for item in value)
+    if isinstance(value, float) and pd.isna(value):
+        return None
+    return str(value)
+
+
+# 各列的类型转换和默认值
+_CONVERTERS = {
+    '发布时间': (_to_str, ''),
+    '是否包含广告': (_to_bool, False),
+    '广告类型': (_to_str, '无'),
+    '商品名称': (_to_str, ''),
+    '广告文本': (_to_str, ''),
+    '置信度': (_to_float, 0.0),
+    '时间戳': (_to_str, ''),
+    '原始响应': (_to_str, ''),
+    'ads_time': (_to_str, ''),
+}
+
+
+def normalize_row(row):
+    """
+    统一各列的类型；行中没有的列写入null，读取时沿用该视频之前的值，
+    因此只更新部分列（如ads_time）时只需写入文件名、发布时间和这些列
+    """
+    normalized = {'文件名': str(row['文件名'])}
+    for name, (convert, default) in _CONVERTERS.items():
+        if name in row:
+            value = convert(row[name])
+            normalized[name] = default if value is None else value
+        else:
+            normalized[name] = None
+    normalized['updated_at'] = row.get('updated_at') or time.time()
+    return normalized
+
+
+def publish_month(publish_date):
+    if publish_date and len(publish_date) >= 7:
+        return publish_date[:7]
+    return UNKNOWN_MONTH
+
+
+def append_rows(rows, dataset_dir=DEFAULT_DATASET_DIR):
+    """
+    追加结果行，每个发布月份写入一个新的Parquet文件，返回写入的行数
+    """
+    partitions = {}
+    for row in rows:
+        row = normalize_row(row)
+        partitions.setdefault(publish_month(row['发布时间']), []).append(row)
+
+    batch_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+    for month, month_rows in partitions.items():
+        partition_dir = os.path.join(dataset_dir, f"publish_month={month}")
+        os.makedirs(partition_dir, exist_ok=True)
+        table = pa.Table.from_pylist(month_rows, schema=SCHEMA)
+        name = f"part-{batch_id}.parquet"
+        # 先写临时文件（以.开头，读取时忽略）再改名，读取方不会看到写了一半的文件
+        tmp_path = os.path.join(partition_dir, f".{name}.tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(partition_dir, name))
+    return sum(len(month_rows) for month_rows in partitions.values())
+
+
+def dataset_exists(dataset_dir=DEFAULT_DATASET_DIR):
+    return os.path.isdir(dataset_dir) and any(
+        name.endswith('.parquet') for _, _, files in os.walk(dataset_dir) for name in files
+    )
+
+
+def read_results(columns=None, dataset_dir=DEFAULT_DATASET_DIR):
+    """
+    读取结果数据集，按文件名去重保留最新的一行，返回DataFrame
+
+    columns 为需要的列（默认全部），只有这些列会从磁盘读取；数据集不存在时返回None
+    """
+    if not dataset_exists(dataset_dir):
+        return None
+    columns = list(columns or VIEW_COLUMNS)
+    read_columns = list(dict.fromkeys(columns + ['文件名', 'updated_at']))
+    dataset = ds.dataset(dataset_dir, format='parquet', schema=SCHEMA, partitioning='hive')
+    df = dataset.to_table(columns=read_columns).to_pandas()
+    df = df.sort_values('updated_at', kind='stable')
+    # groupby().last() 跳过空值：只写入了部分列的行，其余列沿用之前的值
+    df = df.groupby('文件名', sort=False, as_index=False).last()
+    for name in columns:
+        if name in _CONVERTERS:
+            default = _CONVERTERS[name][1]
+            df[name] = df[name].where(df[name].notna(), default)
+    if '是否包含广告' in columns:
+        df['是否包含广告'] = df['是否包含广告'].astype(bool)
+    return df[columns].reset_index(drop=True)
+
+
+def load_results(columns, dataset_dir=DEFAULT_DATASET_DIR, csv_path=DEFAULT_CSV_PATH):
+    """
+    供下游脚本读取结果：优先读取数据集的指定列，数据集不存在时读取CSV视图；都不存在返回None
+    """
+    df = read_results(columns, dataset_dir)
+    if df is not None:
+        print(f"从结果数据集加载 {len(df)} 条记录")
+        return df
+    if not os.path.exists(csv_path):
+        print(f"错误: 结果数据集和CSV文件都不存在 {dataset_dir}, {csv_path}")
+        return None
+    df = pd.read_csv(csv_path, usecols=lambda name: name in columns)
+    print(f"从CSV加载 {len(df)} 条记录: {csv_path}")
+    return df
+
+
+def compact(dataset_dir=DEFAULT_DATASET_DIR):
+    """
+    合并数据集：去重后每个分区重写为一个文件，删除旧文件
+    """
+    df = read_results(COLUMNS, dataset_dir)
+    if df is None:
+        return 0
+    old_files = [
+        os.path.join(root, name)
+        for root, _, files in os.walk(dataset_dir) for name in files if name.endswith('.parquet')
+    ]
+    count = append_rows(df.to_dict('records'), dataset_dir)
+    for path in old_files:
+        os.remove(path)
+    return count
+
+
+def export_csv(csv_path=DEFAULT_CSV_PATH, dataset_dir=DEFAULT_DATASET_DIR):
+    """
+    将去重后的结果导出为CSV视图
+    """
+    df = read_results(VIEW_COLUMNS, dataset_dir)
+    if df is None:
+        print(f"错误: 结果数据集不存在 {dataset_dir}")
+        return None
+    df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+    print(f"已导出 {len(df)} 条记录到: {csv_path}")
+    return df
+
+
+def import_csv(csv_path=DEFAULT_CSV_PATH, dataset_dir=DEFAULT_DATASET_DIR):
+    """
+    将已有的ads_summary.csv导入数据集（首次迁移用）
+    """
+    df = pd.read_csv(csv_path)
+    count = append_rows(df.to_dict('records'), dataset_dir)
+    print(f"已从 {csv_path} 导入 {count} 条记录")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分析结果数据集维护')
+    parser.add_argument('--export-csv', action='store_true', help=f'导出CSV视图到 {DEFAULT_CSV_PATH}')
+    parser.add_argument('--import-csv', action='store_true', help=f'将 {DEFAULT_CSV_PATH} 导入数据集')
+    parser.add_argument('--compact', action='store_true', help='去重并合并每个分区的文件')
+    args = parser.parse_args()
+
+    if args.import_csv:
+        import_csv()
+    if args.compact:
+        print(f"合并完成，共 {compact()} 条记录")
+    if args.export_csv:
+        export_csv()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+发送给LLM之前的分段质量过滤：根据whisper的置信度字段去掉静音幻觉、
+低置信度和高重复度的分段，折叠分段内的重复词句并合并连续重复的分段
+"""
+
+import re
+import threading
+from dataclasses import dataclass
+
+from windowed_analysis import estimate_tokens
+
+# 同一短语（1-12个非数字字符）连续出现3次及以上时折叠为一次（不折叠数字，如1000）
+_REPEAT_PATTERN = re.compile(r'(\D{1,12}?)\1{2,}')
+_PUNCTUATION = re.compile(r'[\s\u3000-\u303f\uff00-\uffef,.!?;:]+')
+
+
+def collapse_repeats(text):
+    """
+    折叠连续重复的短语，如"我去找你我去找你我去找你" -> "我去找你"
+    """
+    return _REPEAT_PATTERN.sub(r'\1', text)
+
+
+def _normalize(text):
+    return _PUNCTUATION.sub('', text).lower()
+
+
+@dataclass
+class SegmentFilter:
+    """
+    分段过滤阈值（默认值与whisper自身判断静音和重复输出的阈值一致）
+    """
+    # no_speech_prob高于该值且avg_logprob低于min_avg_logprob时视为无语音
+    max_no_speech_prob: float = 0.6
+    min_avg_logprob: float = -1.0
+    # compression_ratio高于该值的分段通常是重复幻觉
+    max_compression_ratio: float = 2.4
+
+    def drop_reason(self, segment):
+        """
+        返回分段应被丢弃的原因，保留时返回None
+        """
+        no_speech = segment.get('no_speech_prob')
+        logprob = segment.get('avg_logprob')
+        compression = segment.get('compression_ratio')
+        if no_speech is not None and logprob is not None \
+                and no_speech > self.max_no_speech_prob and logprob < self.min_avg_logprob:
+            return 'no_speech'
+        if compression is not None and compression > self.max_compression_ratio:
+            return 'repetitive'
+        if not _normalize(segment.get('text', '')):
+            return 'empty'
+        return None
+
+    def apply(self, segments):
+        """
+        过滤分段，返回 (保留的分段列表, 统计信息)；不修改传入的分段
+        """
+        kept = []
+        dropped = {}
+        for segment in segments:
+            reason = self.drop_reason(segment)
+            if reason is not None:
+                dropped[reason] = dropped.get(reason, 0) + 1
+                continue
+            text = collapse_repeats(segment.get('text', ''))
+            # 与上一分段内容相同时合并（延长上一分段的结束时间）
+            if kept and _normalize(text) == _normalize(kept[-1]['text']):
+                kept[-1]['end'] = segment.get('end', kept[-1]['end'])
+                dropped['duplicate'] = dropped.get('duplicate', 0) + 1
+                continue
+            kept.append({**segment, 'text': text})
+
+        stats = {
+            'segments': len(segments),
+            'kept': len(kept),
+            'dropped': dropped,
+            'tokens_before': estimate_tokens(''.join(segment.get('text', '') for segment in segments)),
+            'tokens_after': estimate_tokens(''.join(segment['text'] for segment in kept)),
+        }
+        return kept, stats
+
+
+class FilterStats:
+    """
+    分段过滤的累计统计（多线程安全）
+    """
+
+    def __init__(self):
+        self.videos = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self._lock = threading.Lock()
+
+    def record(self, stats):
+        with self._lock:
+            self.videos += 1
+            self.tokens_before += stats['tokens_before']
+            self.tokens_after += stats['tokens_after']
+
+    def report(self):
+        with self._lock:
+            return {
+                'videos': self.videos,
+                'tokens_before': self.tokens_before,
+                'tokens_after': self.tokens_after,
+                'reduction': 1 - self.tokens_after / self.tokens_before if self.tokens_before else 0.0,
+            }
+
+    def print_report(self):
+        report = self.report()
+        if not report['videos']:
+            return report
+        print(f"分段过滤: {report['videos']} 个视频，提示词约 {report['tokens_before']} -> "
+              f"{report['tokens_after']} token（减少 {report['reduction']:.1%}）")
+        return report
+
+
+# 进程内共享的过滤统计
+filter_stats = FilterStats()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+汇总缓存：用SQLite保存每个分析文件解析后的汇总行（按文件修改时间和大小判断是否有效），
+以及发布时间等元数据（单独的小表，不再写回分析文件）
+"""
+
+import os
+import json
+import time
+import sqlite3
+
+DEFAULT_SUMMARY_PATH = os.path.join('output', 'summary.sqlite')
+
+
+class SummaryCache:
+    """
+    汇总行缓存与视频元数据表
+    """
+
+    def __init__(self, path=DEFAULT_SUMMARY_PATH):
+        self.path = path
+        self.reused = 0
+        self.parsed = 0
+        self.metadata_updates = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS rows (
+                analysis_path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                row TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS video_metadata (
+                filename TEXT PRIMARY KEY,
+                publish_date TEXT,
+                updated_at REAL NOT NULL
+            );
+        ''')
+        self._conn.commit()
+        self._rows = None
+        self._metadata = None
+
+    def _load(self):
+        # 一次读取全部缓存，避免逐个文件查询
+        if self._rows is None:
+            self._rows = {
+                path: (mtime, size, row)
+                for path, mtime, size, row in self._conn.execute('SELECT analysis_path, mtime, size, row FROM rows')
+            }
+            self._metadata = {
+                filename: publish_date
+                for filename, publish_date in self._conn.execute('SELECT filename, publish_date FROM video_metadata')
+            }
+
+    def get_row(self, analysis_path, mtime, size):
+        """
+        返回缓存的汇总行；分析文件的修改时间或大小变化时返回None
+        """
+        self._load()
+        cached = self._rows.get(analysis_path)
+        if cached is None or cached[0] != mtime or cached[1] != size:
+            return None
+        self.reused += 1
+        return json.loads(cached[2])
+
+    def put_row(self, analysis_path, mtime, size, row):
+        self._load()
+        data = json.dumps(row, ensure_ascii=False)
+        self._rows[analysis_path] = (mtime, size, data)
+        self.parsed += 1
+        self._conn.execute('INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?)', (analysis_path, mtime, size, data))
+
+    def get_publish_date(self, filename):
+        self._load()
+        return self._metadata.get(filename, '')
+
+    def set_publish_date(self, filename, publish_date):
+        """
+        记录发布时间，只在值变化时写入
+        """
+        self._load()
+        if self._metadata.get(filename) == publish_date:
+            return False
+        self._metadata[filename] = publish_date
+        self.metadata_updates += 1
+        self._conn.execute(
+            'INSERT OR REPLACE INTO video_metadata VALUES (?, ?, ?)', (filename, publish_date, time.time())
+        )
+        return True
+
+    def print_report(self):
+        print(f"汇总缓存: 复用 {self.reused} 个，重新解析 {self.parsed} 个，"
+              f"更新发布时间 {self.metadata_updates} 个")
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+汇总与结果数据集：--import-csv 导入的ads_time在再次汇总后应保留，分析结果变化时才清空
+"""
+
+import os
+import sys
+import json
+
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+VIDEOS = ['视频A [BV1aaaaaaaaa].mp4', '视频B [BV1bbbbbbbbb].mp4']
+
+
+def analysis_response(product):
+    return json.dumps({'is_ad': True, 'ad_type': '硬广', 'product_name': product, 'ad_text': '',
+                       'confidence': 0.9, 'timestamp': ''}, ensure_ascii=False)
+
+
+def write_analysis(filename, response):
+    path = os.path.join('output', 'analysis', os.path.splitext(filename)[0] + '_analysis.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'analysis_result': response, 'segments': []}, f, ensure_ascii=False)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # main导入时在当前目录下创建output子目录，各路径都是相对路径
+    monkeypatch.chdir(tmp_path)
+    import main
+    os.makedirs(main.OUTPUT_ANALYSIS_DIR, exist_ok=True)
+    for filename in VIDEOS:
+        write_analysis(filename, analysis_response('索尼A7M4'))
+    return main
+
+
+def import_csv_with_ads_time(main):
+    import results_dataset
+    rows = []
+    for filename in VIDEOS:
+        rows.append({'文件名': filename, '发布时间': '2024-05-01', '是否包含广告': True, '广告类型': '硬广',
+                     '商品名称': '索尼A7M4', '广告文本': '', '置信度': 0.9, '时间戳': '',
+                     '原始响应': analysis_response('索尼A7M4'), 'ads_time': '01:23'})
+    pd.DataFrame(rows).to_csv(results_dataset.DEFAULT_CSV_PATH, index=False, encoding='utf-8-sig')
+    results_dataset.import_csv()
+
+
+def ads_times():
+    import results_dataset
+    df = results_dataset.read_results(['文件名', 'ads_time'])
+    return dict(zip(df['文件名'], df['ads_time']))
+
+
+def test_import_then_summarize_keeps_ads_time(workdir):
+    import_csv_with_ads_time(workdir)
+    workdir.summarize_results([os.path.join('videos', filename) for filename in VIDEOS])
+    assert ads_times() == {filename: '01:23' for filename in VIDEOS}
+
+
+def test_changed_analysis_clears_ads_time(workdir):
+    import_csv_with_ads_time(workdir)
+    write_analysis(VIDEOS[0], analysis_response('大疆Pocket3'))
+    workdir.summarize_results([os.path.join('videos', filename) for filename in VIDEOS])
+    assert ads_times() == {VIDEOS[0]: '', VIDEOS[1]: '01:23'}
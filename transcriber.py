@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻转写引擎：每个工作进程只加载一次模型并在多个文件间复用
+识别后端可选openai-whisper（默认）或faster-whisper（CPU int8），见asr_backends.py
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from asr_backends import DEFAULT_ASR_BACKEND, load_audio, load_backend
+from transcript_store import save_transcript
+from vad import TimeMap, cut_speech, detect_speech, remap_result, split_at_silence
+
+SAMPLE_RATE = 16000
+
+# 语音占比高于该值时不再裁剪，直接转写整段音频
+_VAD_FULL_RATIO = 0.95
+
+# 进程内模型缓存 {(后端, 模型名): 模型}
+_MODELS = {}
+# 进程内模型加载耗时 {(后端, 模型名): 秒}
+_LOAD_SECONDS = {}
+# 当前进程的计算线程数（faster-whisper在加载模型时使用）
+_CPU_THREADS = None
+
+
+def get_asr_model(model_name="base", backend=DEFAULT_ASR_BACKEND):
+    """
+    获取识别模型，同一进程内每个后端的每个模型只加载一次
+    """
+    key = (backend, model_name)
+    model = _MODELS.get(key)
+    if model is None:
+        start = time.perf_counter()
+        model = load_backend(backend, model_name, _CPU_THREADS)
+        _LOAD_SECONDS[key] = time.perf_counter() - start
+        _MODELS[key] = model
+    return model
+
+
+def get_whisper_model(model_name="base"):
+    """
+    获取openai-whisper模型（兼容旧接口）
+    """
+    return get_asr_model(model_name, 'whisper').model
+
+
+def set_torch_threads(torch_threads, backend=DEFAULT_ASR_BACKEND):
+    """
+    设置当前进程的计算线程数（None表示使用默认值）
+    """
+    global _CPU_THREADS
+    _CPU_THREADS = torch_threads
+    if torch_threads and backend == 'whisper':
+        import torch
+        torch.set_num_threads(torch_threads)
+
+
+def transcribe_speech(model, audio, vad):
+    """
+    VAD预处理后转写：只转写语音片段，时间戳映射回原始时间轴
+    结果中的vad字段记录音频时长和语音时长（秒）
+    """
+    if isinstance(audio, str):
+        audio = model.load_audio(audio)
+    audio_seconds = len(audio) / SAMPLE_RATE
+    spans = detect_speech(audio, SAMPLE_RATE, vad)
+    time_map = TimeMap(spans, SAMPLE_RATE)
+    if not spans:
+        result = {'text': '', 'segments': [], 'language': 'zh'}
+    elif time_map.speech_seconds >= audio_seconds * _VAD_FULL_RATIO:
+        result = model.transcribe(audio, language='zh')
+    else:
+        result = remap_result(model.transcribe(cut_speech(audio, spans), language='zh'), time_map)
+    result['vad'] = {'audio_seconds': audio_seconds, 'speech_seconds': time_map.speech_seconds}
+    return result
+
+
+def transcribe_to_file(audio, transcript_path, model_name="base", vad=None, backend=DEFAULT_ASR_BACKEND):
+    """
+    使用缓存的模型转写音频，按transcript_path的扩展名保存为.npz或.json
+    audio可以是音频文件路径，也可以是16kHz单声道float32数组
+    vad为VAD方法（auto/energy/webrtc）时跳过静音和背景音乐，None表示转写整段音频
+    """
+    result = transcribe_audio_data(audio, model_name, vad, backend)
+    save_transcript(result, transcript_path)
+    return result
+
+
+def transcribe_audio_data(audio, model_name="base", vad=None, backend=DEFAULT_ASR_BACKEND):
+    """
+    使用缓存的模型转写音频，返回转写结果（不保存）
+    """
+    model = get_asr_model(model_name, backend)
+    if vad:
+        return transcribe_speech(model, audio, vad)
+    return model.transcribe(audio, language='zh')
+
+
+def stitch_results(results, offsets):
+    """
+    拼接各音频块的转写结果：分段时间加上块的起始时间（秒），重新编号id
+    """
+    segments = []
+    vad_stats = {'audio_seconds': 0.0, 'speech_seconds': 0.0}
+    for result, offset in zip(results, offsets):
+        for segment in result.get('segments', []):
+            segment = dict(segment)
+            segment['id'] = len(segments)
+            segment['start'] = round(segment['start'] + offset, 3)
+            segment['end'] = round(segment['end'] + offset, 3)
+            if 'seek' in segment:
+                # seek以10ms的mel帧为单位
+                segment['seek'] = segment['seek'] + int(round(offset * 100))
+            if segment.get('words'):
+                segment['words'] = [
+                    {**word, 'start': round(word['start'] + offset, 3), 'end': round(word['end'] + offset, 3)}
+                    for word in segment['words']
+                ]
+            segments.append(segment)
+        for name in vad_stats:
+            vad_stats[name] += result.get('vad', {}).get(name, 0.0)
+    stitched = {
+        'text': ''.join(result.get('text', '') for result in results),
+        'segments': segments,
+        'language': next((result['language'] for result in results if result.get('language')), 'zh'),
+    }
+    if any('vad' in result for result in results):
+        stitched['vad'] = vad_stats
+    return stitched
+
+
+def _init_worker(model_name, torch_threads, backend=DEFAULT_ASR_BACKEND):
+    """
+    工作进程初始化：设置线程数并预加载模型
+    """
+    set_torch_threads(torch_threads, backend)
+    get_asr_model(model_name, backend)
+
+
+def _worker_transcribe(audio, transcript_path, model_name, vad=None, backend=DEFAULT_ASR_BACKEND):
+    """
+    工作进程中执行转写，只返回统计信息，避免把完整结果传回主进程
+    """
+    start = time.perf_counter()
+    result = transcribe_to_file(audio, transcript_path, model_name, vad, backend)
+    stats = {
+        'pid': os.getpid(),
+        'load_seconds': _LOAD_SECONDS.get((backend, model_name), 0.0),
+        'seconds': time.perf_counter() - start,
+    }
+    if 'vad' in result:
+        stats.update(result['vad'])
+    return stats
+
+
+def _worker_transcribe_chunk(audio, model_name, vad=None, backend=DEFAULT_ASR_BACKEND):
+    """
+    工作进程中转写一个音频块，返回转写结果和统计信息
+    """
+    start = time.perf_counter()
+    result = transcribe_audio_data(audio, model_name, vad, backend)
+    stats = {
+        'pid': os.getpid(),
+        'load_seconds': _LOAD_SECONDS.get((backend, model_name), 0.0),
+        'seconds': time.perf_counter() - start,
+    }
+    return result, stats
+
+
+class TranscriptionEngine:
+    """
+    转写引擎：N个工作进程 × 每进程M个计算线程，模型在进程生命周期内常驻
+
+    workers <= 1 时直接在当前进程中转写；
+    chunk_seconds > 0 且有多个工作进程时，长音频在静音处切成约chunk_seconds秒的块，
+    由多个进程并行转写后拼接
+    """
+
+    def __init__(self, model_name="base", workers=1, torch_threads=None, vad=None, backend=DEFAULT_ASR_BACKEND,
+                 chunk_seconds=0):
+        self.model_name = model_name
+        self.backend = backend
+        self.workers = max(1, workers)
+        self.torch_threads = torch_threads
+        self.vad = vad
+        self.chunk_seconds = chunk_seconds
+        # 转写完成的文件数（分块转写的文件只计一次）
+        self._files = 0
+        self._chunked_files = 0
+        self._chunks = 0
+        self._audio_seconds = 0.0
+        self._speech_seconds = 0.0
+        self._pool = None
+        self._lock = threading.Lock()
+        # 每个进程的统计 {pid: {'load_seconds': x, 'jobs': n}}
+        self._process_stats = {}
+        self._busy_seconds = 0.0
+
+    def start(self):
+        if self.workers > 1 and self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.model_name, self.torch_threads, self.backend),
+            )
+        elif self.workers == 1:
+            set_torch_threads(self.torch_threads, self.backend)
+        return self
+
+    @property
+    def asr_model(self):
+        """
+        记录到清单的模型标识：默认后端只记模型名，与旧记录兼容
+        """
+        if self.backend == DEFAULT_ASR_BACKEND:
+            return self.model_name
+        return f"{self.backend}:{self.model_name}"
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def transcribe(self, audio, transcript_path):
+        """
+        转写单个音频（文件路径或float32数组，阻塞直到完成），可在多个线程中并发调用
+        """
+        if self._pool is not None and self.chunk_seconds > 0:
+            if isinstance(audio, str):
+                audio = load_audio(audio, self.backend)
+            bounds = split_at_silence(audio, self.chunk_seconds, SAMPLE_RATE)
+            if len(bounds) > 1:
+                return self._transcribe_chunks(audio, bounds, transcript_path)
+        if self._pool is not None:
+            stats = self._pool.submit(
+                _worker_transcribe, audio, transcript_path, self.model_name, self.vad, self.backend
+            ).result()
+        else:
+            stats = _worker_transcribe(audio, transcript_path, self.model_name, self.vad, self.backend)
+        self._record(stats)
+        with self._lock:
+            self._files += 1
+        return stats
+
+    def _transcribe_chunks(self, audio, bounds, transcript_path):
+        """
+        各音频块提交到进程池并行转写，拼接结果后在当前进程保存
+        """
+        start = time.perf_counter()
+        futures = [
+            self._pool.submit(
+                _worker_transcribe_chunk, audio[begin:end], self.model_name, self.vad, self.backend
+            )
+            for begin, end in bounds
+        ]
+        outputs = [future.result() for future in futures]
+        for _, stats in outputs:
+            self._record(stats)
+        result = stitch_results([result for result, _ in outputs], [begin / SAMPLE_RATE for begin, _ in bounds])
+        save_transcript(result, transcript_path)
+        with self._lock:
+            self._files += 1
+            self._chunked_files += 1
+            self._chunks += len(bounds)
+            self._audio_seconds += result.get('vad', {}).get('audio_seconds', 0.0)
+            self._speech_seconds += result.get('vad', {}).get('speech_seconds', 0.0)
+        stats = {
+            'pid': os.getpid(),
+            'seconds': time.perf_counter() - start,
+            'chunks': len(bounds),
+        }
+        stats.update(result.get('vad', {}))
+        return stats
+
+    def _record(self, stats):
+        with self._lock:
+            process = self._process_stats.setdefault(
+                stats['pid'], {'load_seconds': stats['load_seconds'], 'jobs': 0}
+            )
+            process['jobs'] += 1
+            self._busy_seconds += stats['seconds']
+            self._audio_seconds += stats.get('audio_seconds', 0.0)
+            self._speech_seconds += stats.get('speech_seconds', 0.0)
+
+    def report(self):
+        """
+        统计本次运行的模型加载次数，以及相比每个文件重新加载模型节省的启动时间
+
+        jobs为提交给转写进程的任务数（分块转写时每块一个），节省的加载次数按文件数计算
+        """
+        with self._lock:
+            loads = len(self._process_stats)
+            jobs = sum(p['jobs'] for p in self._process_stats.values())
+            load_seconds = sum(p['load_seconds'] for p in self._process_stats.values())
+            saved_seconds = load_seconds / loads * max(self._files - loads, 0) if loads else 0.0
+            return {
+                'model': self.asr_model,
+                'workers': self.workers,
+                'torch_threads': self.torch_threads,
+                'files': self._files,
+                'jobs': jobs,
+                'model_loads': loads,
+                'load_seconds': load_seconds,
+                'saved_seconds': saved_seconds,
+                'busy_seconds': self._busy_seconds,
+                'vad': self.vad,
+                'chunked_files': self._chunked_files,
+                'chunks': self._chunks,
+                'audio_seconds': self._audio_seconds,
+                'speech_seconds': self._speech_seconds,
+            }
+
+    def print_report(self):
+        report = self.report()
+        if not report['jobs']:
+            return report
+        print(f"转写引擎: 模型 {report['model']}，{report['workers']} 个进程 × "
+              f"{report['torch_threads'] or '默认'} 个线程")
+        print(f"转写文件 {report['files']} 个（任务 {report['jobs']} 个），模型加载 {report['model_loads']} 次"
+              f"（{report['load_seconds']:.1f}s），节省启动时间约 {report['saved_seconds']:.1f}s")
+        if report['chunked_files']:
+            print(f"分块并行转写长音频 {report['chunked_files']} 个，共 {report['chunks']} 块")
+        if report['vad'] and report['audio_seconds']:
+            print(f"VAD({report['vad']}): 音频 {report['audio_seconds'] / 3600:.2f}h，其中语音 "
+                  f"{report['speech_seconds'] / 3600:.2f}h（语音占比 "
+                  f"{report['speech_seconds'] / report['audio_seconds']:.1%}）")
+        return report
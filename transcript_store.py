@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+紧凑的转写结果存储：每个视频一个.npz文件，按列保存分段的起止时间、质量指标，
+分段文本拼接为一个UTF-8字节块加偏移量数组；不保存token列表等用不到的字段
+
+读取时按需加载：只访问全文或时间列时不会构造分段字典
+旧的.json转写文件仍可读取
+"""
+
+import io
+import os
+import json
+import socket
+
+import numpy as np
+
+TRANSCRIPT_FORMATS = ('npz', 'json')
+DEFAULT_TRANSCRIPT_FORMAT = 'npz'
+
+# 保存的分段数值字段及其类型
+_FLOAT_COLUMNS = {
+    'start': np.float64,
+    'end': np.float64,
+    'avg_logprob': np.float32,
+    'no_speech_prob': np.float32,
+    'compression_ratio': np.float32,
+}
+
+
+def transcript_filename(base_name, transcript_format=DEFAULT_TRANSCRIPT_FORMAT):
+    if transcript_format not in TRANSCRIPT_FORMATS:
+        raise ValueError(f"未知的转写格式: {transcript_format}")
+    return f"{base_name}.{transcript_format}"
+
+
+def find_transcript(transcript_path):
+    """
+    返回实际存在的转写文件路径：优先给定路径，其次同名的其他格式文件；都不存在时返回None
+    """
+    if os.path.exists(transcript_path):
+        return transcript_path
+    stem = os.path.splitext(transcript_path)[0]
+    for transcript_format in TRANSCRIPT_FORMATS:
+        candidate = f"{stem}.{transcript_format}"
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _encode_texts(texts):
+    encoded = [text.encode('utf-8') for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(data) for data in encoded])
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def save_transcript(result, transcript_path):
+    """
+    保存whisper转写结果，按扩展名选择格式（.npz为紧凑格式，.json为原始格式）
+    先写临时文件（按主机和进程区分）再替换，避免中断或多机同时写入时留下不完整的文件
+    """
+    tmp_path = f"{transcript_path}.{socket.gethostname()}-{os.getpid()}.tmp"
+    if transcript_path.endswith('.json'):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, transcript_path)
+        return
+
+    segments = result.get('segments', [])
+    blob, offsets = _encode_texts(segment.get('text', '') for segment in segments)
+    arrays = {
+        name: np.array([segment.get(name, 0.0) for segment in segments], dtype=dtype)
+        for name, dtype in _FLOAT_COLUMNS.items()
+    }
+    arrays['text_blob'] = blob
+    arrays['text_offsets'] = offsets
+    arrays['language'] = np.array(result.get('language') or '')
+    # whisper的全文与分段文本拼接结果一致时不重复保存
+    text = result.get('text', '')
+    if text != ''.join(segment.get('text', '') for segment in segments):
+        arrays['text'] = np.array(text)
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp_path, transcript_path)
+
+
+class Transcript:
+    """
+    按需加载的转写结果
+
+    text/segments 与whisper结果的同名字段一致，并支持 get()/[] 以兼容原先的dict用法；
+    starts/ends/segment_texts 等列可直接访问，无需构造分段字典
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # 文件很小，整体读入内存后不再占用文件句柄；各列仍在访问时才解压
+        with open(path, 'rb') as f:
+            self._npz = np.load(io.BytesIO(f.read()))
+        self._columns = {}
+        self._texts = None
+        self._segments = None
+
+    def column(self, name):
+        """
+        返回数值列（numpy数组）
+        """
+        if name not in self._columns:
+            self._columns[name] = self._npz[name]
+        return self._columns[name]
+
+    @property
+    def starts(self):
+        return self.column('start')
+
+    @property
+    def ends(self):
+        return self.column('end')
+
+    def __len__(self):
+        return len(self.column('text_offsets')) - 1
+
+    @property
+    def segment_texts(self):
+        if self._texts is None:
+            data = self._npz['text_blob'].tobytes()
+            offsets = self._npz['text_offsets'].tolist()
+            self._texts = [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+        return self._texts
+
+    @property
+    def text(self):
+        if 'text' in self._npz.files:
+            return str(self._npz['text'])
+        return ''.join(self.segment_texts)
+
+    @property
+    def language(self):
+        return str(self._npz['language'])
+
+    @property
+    def segments(self):
+        if self._segments is None:
+            # float32列转回float64时保留4位小数，避免出现 0.009999999776 这类数值
+            columns = {
+                name: (self.column(name) if dtype is np.float64
+                       else np.round(self.column(name).astype(np.float64), 4)).tolist()
+                for name, dtype in _FLOAT_COLUMNS.items()
+            }
+            self._segments = [
+                {'id': i, 'text': text, **{name: values[i] for name, values in columns.items()}}
+                for i, text in enumerate(self.segment_texts)
+            ]
+        return self._segments
+
+    def get(self, key, default=None):
+        if key in ('text', 'segments', 'language'):
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key):
+        if key not in ('text', 'segments', 'language'):
+            raise KeyError(key)
+        return getattr(self, key)
+
+
+def load_transcript(transcript_path):
+    """
+    加载转写结果：.npz返回按需加载的Transcript，.json返回原始dict
+    给定路径不存在时查找同名的其他格式文件，都不存在时抛出FileNotFoundError
+    """
+    path = find_transcript(transcript_path)
+    if path is None:
+        raise FileNotFoundError(transcript_path)
+    if path.endswith('.npz'):
+        return Transcript(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
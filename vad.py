@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+语音活动检测（VAD）：在转写前找出语音片段，只把语音部分交给whisper，
+再把转写结果的时间戳映射回原始音频的时间轴
+
+method 可选：
+- energy：基于帧能量（相对背景噪声的分贝数），无额外依赖
+- webrtc：使用webrtcvad（需要安装webrtcvad）
+- auto：安装了webrtcvad时使用webrtc，否则使用energy
+"""
+
+import bisect
+
+import numpy as np
+
+VAD_METHODS = ('auto', 'energy', 'webrtc')
+
+# 帧长（毫秒），webrtcvad只支持10/20/30ms
+FRAME_MS = 30
+
+
+def _energy_frames(audio, frame_len, threshold_db=12.0, floor_db=-50.0):
+    """
+    帧能量高于背景噪声（第10百分位）threshold_db以上的帧视为语音
+    """
+    n_frames = len(audio) // frame_len
+    frames = audio[:n_frames * frame_len].reshape(n_frames, frame_len)
+    energy_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    threshold = max(np.percentile(energy_db, 10) + threshold_db, floor_db)
+    return energy_db > threshold
+
+
+def _webrtc_frames(audio, frame_len, sample_rate, aggressiveness=2):
+    import webrtcvad
+    detector = webrtcvad.Vad(aggressiveness)
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+    n_frames = len(pcm) // frame_len
+    return np.array([
+        detector.is_speech(pcm[i * frame_len:(i + 1) * frame_len].tobytes(), sample_rate)
+        for i in range(n_frames)
+    ], dtype=bool)
+
+
+def _resolve_method(method):
+    if method == 'auto':
+        try:
+            import webrtcvad  # noqa: F401
+            return 'webrtc'
+        except ImportError:
+            return 'energy'
+    if method not in VAD_METHODS:
+        raise ValueError(f"未知的VAD方法: {method}")
+    return method
+
+
+def _runs(flags):
+    """
+    返回连续为True的区间 [(起始帧, 结束帧), ...]
+    """
+    padded = np.concatenate(([False], flags, [False]))
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(changes[::2].tolist(), changes[1::2].tolist()))
+
+
+def detect_speech(audio, sample_rate=16000, method='auto',
+                  min_speech_ms=250, min_silence_ms=500, pad_ms=200):
+    """
+    检测语音片段，返回 [(起始采样点, 结束采样点), ...]
+
+    间隔短于min_silence_ms的片段合并，短于min_speech_ms的片段丢弃，
+    每个片段前后各保留pad_ms，避免截断字词
+    """
+    frame_len = sample_rate * FRAME_MS // 1000
+    if len(audio) < frame_len:
+        return []
+    if _resolve_method(method) == 'webrtc':
+        flags = _webrtc_frames(audio, frame_len, sample_rate)
+    else:
+        flags = _energy_frames(audio, frame_len)
+
+    min_silence = max(1, min_silence_ms // FRAME_MS)
+    min_speech = max(1, min_speech_ms // FRAME_MS)
+    pad = pad_ms // FRAME_MS
+
+    # 合并间隔较短的片段
+    merged = []
+    for start, end in _runs(flags):
+        if merged and start - merged[-1][1] < min_silence:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+
+    spans = []
+    n_frames = len(flags)
+    for start, end in merged:
+        if end - start < min_speech:
+            continue
+        start = max(0, start - pad)
+        end = min(n_frames, end + pad)
+        if spans and start <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    total = len(audio)
+    return [(start * frame_len, total if end == n_frames else end * frame_len) for start, end in spans]
+
+
+class TimeMap:
+    """
+    拼接后的语音音频与原始音频之间的时间映射
+    """
+
+    def __init__(self, spans, sample_rate=16000):
+        self.sample_rate = sample_rate
+        # 每个片段在拼接音频中的起点（秒）和在原始音频中的起点（秒）
+        self.offsets = []
+        self.originals = []
+        self.durations = []
+        offset = 0
+        for start, end in spans:
+            self.offsets.append(offset / sample_rate)
+            self.originals.append(start / sample_rate)
+            self.durations.append((end - start) / sample_rate)
+            offset += end - start
+        self.speech_seconds = offset / sample_rate
+
+    def to_original(self, t, is_end=False):
+        """
+        将拼接音频中的时间转换为原始时间；片段边界上的结束时间归到前一个片段
+        """
+        if not self.offsets:
+            return t
+        if is_end:
+            i = bisect.bisect_left(self.offsets, t) - 1
+        else:
+            i = bisect.bisect_right(self.offsets, t) - 1
+        i = max(i, 0)
+        return self.originals[i] + min(max(t - self.offsets[i], 0.0), self.durations[i])
+
+
+def cut_speech(audio, spans):
+    """
+    拼接所有语音片段
+    """
+    if not spans:
+        return audio[:0]
+    return np.concatenate([audio[start:end] for start, end in spans])
+
+
+def remap_result(result, time_map):
+    """
+    将whisper结果中分段（及逐词时间戳）的起止时间映射回原始时间轴
+    """
+    for segment in result.get('segments', []):
+        segment['start'] = round(time_map.to_original(segment['start']), 3)
+        segment['end'] = round(time_map.to_original(segment['end'], is_end=True), 3)
+        for word in segment.get('words', []) or []:
+            word['start'] = round(time_map.to_original(word['start']), 3)
+            word['end'] = round(time_map.to_original(word['end'], is_end=True), 3)
+    return result
+
+
+def split_at_silence(audio, chunk_seconds, sample_rate=16000, search_seconds=None):
+    """
+    将长音频切分为约chunk_seconds秒的块，切点选在目标位置附近（±search_seconds）
+    平滑后能量最低的位置，尽量落在静音处；返回 [(起始采样点, 结束采样点), ...]
+    """
+    total = len(audio)
+    chunk_len = int(chunk_seconds * sample_rate)
+    if chunk_len <= 0 or total <= chunk_len * 1.5:
+        return [(0, total)]
+    if search_seconds is None:
+        search_seconds = min(30.0, chunk_seconds / 4)
+
+    frame_len = sample_rate * FRAME_MS // 1000
+    n_frames = total // frame_len
+    frames = audio[:n_frames * frame_len].reshape(n_frames, frame_len)
+    energy = np.mean(frames ** 2, axis=1)
+    # 约0.5秒的滑动平均，避免切在两个字之间的短暂停顿
+    width = max(1, 500 // FRAME_MS)
+    smoothed = np.convolve(energy, np.ones(width) / width, mode='same')
+
+    search = int(search_seconds * 1000 // FRAME_MS)
+    frames_per_chunk = chunk_len // frame_len
+    bounds = [0]
+    target = frames_per_chunk
+    while target < n_frames - frames_per_chunk // 2:
+        low = max(bounds[-1] // frame_len + 1, target - search)
+        high = min(n_frames, target + search)
+        cut = low + int(np.argmin(smoothed[low:high]))
+        bounds.append(cut * frame_len)
+        target = cut + frames_per_chunk
+    bounds.append(total)
+    return list(zip(bounds[:-1], bounds[1:]))
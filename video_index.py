@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频目录的持久化索引与监听：
+- 增量扫描：只重新列出修改时间变化的目录，其余目录直接使用索引
+- 监听模式：通过inotify（未安装inotify_simple时退化为轮询）发现新下载完成的mp4文件
+"""
+
+import os
+import json
+import time
+import sqlite3
+
+DEFAULT_INDEX_PATH = os.path.join('output', 'video_index.sqlite')
+VIDEO_EXTENSIONS = ('.mp4',)
+
+# 修改时间距扫描时刻在该秒数内的文件可能仍在写入，下次扫描时重新获取大小
+_SETTLE_SECONDS = 120
+
+
+def is_video_file(filename):
+    return filename.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def _file_info(path, size, mtime):
+    return {
+        'path': path,
+        'size_bytes': size,
+        'size_mb': size / (1024 * 1024),
+        'mtime': mtime,
+        'filename': os.path.basename(path),
+    }
+
+
+class VideoIndex:
+    """
+    持久化的视频文件索引
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS dirs (
+                dir_path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                scanned_at REAL NOT NULL,
+                subdirs TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                dir_path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS files_dir ON files (dir_path);
+        ''')
+        self._conn.commit()
+        self.rescanned_dirs = 0
+        self.reused_dirs = 0
+
+    def scan(self, root, full=False):
+        """
+        扫描root下所有视频文件，返回文件信息列表
+        full为True时忽略索引，重新列出全部目录
+        """
+        root = os.path.abspath(root)
+        self.rescanned_dirs = 0
+        self.reused_dirs = 0
+        dirs = {
+            row[0]: {'mtime': row[1], 'scanned_at': row[2], 'subdirs': json.loads(row[3])}
+            for row in self._conn.execute('SELECT dir_path, mtime, scanned_at, subdirs FROM dirs')
+        }
+        files_by_dir = {}
+        for path, dir_path, size, mtime in self._conn.execute('SELECT path, dir_path, size, mtime FROM files'):
+            files_by_dir.setdefault(dir_path, []).append((path, size, mtime))
+
+        visited = set()
+        results = []
+        pending = [root]
+        while pending:
+            dir_path = pending.pop()
+            if dir_path in visited:
+                continue
+            try:
+                dir_mtime = os.stat(dir_path).st_mtime
+            except OSError as e:
+                print(f"无法访问目录: {dir_path}, 错误: {e}")
+                continue
+            visited.add(dir_path)
+
+            cached = dirs.get(dir_path)
+            if not full and cached is not None and cached['mtime'] == dir_mtime:
+                self.reused_dirs += 1
+                files = self._refresh_recent(dir_path, files_by_dir.get(dir_path, []), cached['scanned_at'])
+                subdirs = cached['subdirs']
+            else:
+                self.rescanned_dirs += 1
+                files, subdirs = self._list_dir(dir_path, dir_mtime)
+            results.extend(_file_info(path, size, mtime) for path, size, mtime in files)
+            pending.extend(subdirs)
+
+        # 清理已删除目录的索引
+        removed = [
+            dir_path for dir_path in dirs
+            if dir_path not in visited and (dir_path == root or dir_path.startswith(root + os.sep))
+        ]
+        self._conn.executemany('DELETE FROM dirs WHERE dir_path = ?', [(d,) for d in removed])
+        self._conn.executemany('DELETE FROM files WHERE dir_path = ?', [(d,) for d in removed])
+        self._conn.commit()
+        return results
+
+    def _list_dir(self, dir_path, dir_mtime):
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif is_video_file(entry.name):
+                            stat = entry.stat()
+                            files.append((entry.path, stat.st_size, stat.st_mtime))
+                    except OSError as e:
+                        print(f"无法获取文件信息: {entry.path}, 错误: {e}")
+        except OSError as e:
+            print(f"无法列出目录: {dir_path}, 错误: {e}")
+        self._conn.execute('DELETE FROM files WHERE dir_path = ?', (dir_path,))
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+            [(path, dir_path, size, mtime) for path, size, mtime in files],
+        )
+        self._conn.execute(
+            'INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)',
+            (dir_path, dir_mtime, time.time(), json.dumps(subdirs, ensure_ascii=False)),
+        )
+        return files, subdirs
+
+    def _refresh_recent(self, dir_path, files, scanned_at):
+        """
+        目录未变化时，仅重新获取上次扫描时可能仍在写入的文件大小
+        """
+        refreshed = []
+        for path, size, mtime in files:
+            if mtime >= scanned_at - _SETTLE_SECONDS:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if (stat.st_size, stat.st_mtime) != (size, mtime):
+                    size, mtime = stat.st_size, stat.st_mtime
+                    self._conn.execute(
+                        'UPDATE files SET size = ?, mtime = ? WHERE path = ?', (size, mtime, path)
+                    )
+            refreshed.append((path, size, mtime))
+        return refreshed
+
+    def close(self):
+        self._conn.close()
+
+
+def scan_videos(root, full=False, index_path=DEFAULT_INDEX_PATH):
+    """
+    使用持久化索引扫描视频目录，返回文件信息列表
+    """
+    index = VideoIndex(index_path)
+    try:
+        files = index.scan(root, full)
+        print(f"目录扫描: 重新列出 {index.rescanned_dirs} 个目录，复用索引 {index.reused_dirs} 个目录")
+        return files
+    finally:
+        index.close()
+
+
+def _is_settled(path, min_size_bytes):
+    try:
+        return os.path.getsize(path) >= min_size_bytes
+    except OSError:
+        return False
+
+
+def watch_videos(root, min_size_bytes=0, poll_seconds=10, known=()):
+    """
+    监听root目录，持续产出新下载完成的视频文件路径（不会结束）
+
+    优先使用inotify（需要安装inotify_simple），监听写入完成和移入事件；
+    否则按poll_seconds轮询增量索引，文件大小两次轮询间不变时视为下载完成
+    """
+    try:
+        import inotify_simple
+    except ImportError:
+        print(f"未安装inotify_simple，使用轮询方式监听（每 {poll_seconds}s）: {root}")
+        return _watch_polling(root, min_size_bytes, poll_seconds, set(known))
+    print(f"使用inotify监听目录: {root}")
+    return _watch_inotify(inotify_simple, root, min_size_bytes, set(known))
+
+
+def _watch_polling(root, min_size_bytes, poll_seconds, seen):
+    sizes = {}
+    while True:
+        index = VideoIndex()
+        try:
+            files = index.scan(root)
+        finally:
+            index.close()
+        for info in files:
+            path = info['path']
+            if path in seen:
+                continue
+            if sizes.get(path) == info['size_bytes'] and info['size_bytes'] >= min_size_bytes:
+                seen.add(path)
+                yield path
+            sizes[path] = info['size_bytes']
+        time.sleep(poll_seconds)
+
+
+def _watch_inotify(inotify_simple, root, min_size_bytes, seen):
+    flags = inotify_simple.flags
+    inotify = inotify_simple.INotify()
+    watch_flags = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE
+    watches = {}
+
+    def add_watch(dir_path):
+        for current, _, _ in os.walk(dir_path):
+            try:
+                watches[inotify.add_watch(current, watch_flags)] = current
+            except OSError as e:
+                print(f"无法监听目录: {current}, 错误: {e}")
+
+    add_watch(os.path.abspath(root))
+    while True:
+        for event in inotify.read():
+            dir_path = watches.get(event.wd)
+            if dir_path is None or not event.name:
+                continue
+            path = os.path.join(dir_path, event.name)
+            event_flags = flags.from_mask(event.mask)
+            if flags.ISDIR in event_flags:
+                if flags.CREATE in event_flags or flags.MOVED_TO in event_flags:
+                    add_watch(path)
+                continue
+            # CREATE事件时文件仍在写入，等待CLOSE_WRITE或MOVED_TO
+            if flags.CREATE in event_flags or not is_video_file(event.name):
+                continue
+            if path not in seen and _is_settled(path, min_size_bytes):
+                seen.add(path)
+                yield path
@@ -5,11 +5,16 @@
 """
 
 import pandas as pd
-import json
+import numpy as np
 import os
 import re
+import argparse
 from typing import List, Dict, Tuple
 
+import transcript_store
+from profiling import DEFAULT_PROFILE_DIR, configure_default_profiler, close_default_profiler, profile_section
+from results_dataset import append_rows, dataset_exists, load_results
+
 def load_ads_summary(csv_path: str) -> pd.DataFrame:
     """
     加载ads_summary.csv文件
@@ -34,16 +39,14 @@ def load_ads_summary(csv_path: str) -> pd.DataFrame:
 
 def load_transcript(transcript_path: str) -> Dict:
     """
-    加载transcript JSON文件
+    加载transcript文件（.npz紧凑格式按需加载，或旧的JSON文件）
     """
-    if not os.path.exists(transcript_path):
+    if transcript_store.find_transcript(transcript_path) is None:
         print(f"警告: transcript文件不存在 {transcript_path}")
         return None
     
     try:
-        with open(transcript_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data
+        return transcript_store.load_transcript(transcript_path)
     except Exception as e:
         print(f"加载transcript文件失败 {transcript_path}: {e}")
         return None
@@ -92,7 +95,7 @@ def process_video_timestamps(row: pd.Series, transcript_dir: str) -> str:
     
     # 构建transcript文件路径
     base_name = os.path.splitext(filename)[0]
-    transcript_filename = f"{base_name}.json"
+    transcript_filename = transcript_store.transcript_filename(base_name)
     transcript_path = os.path.join(transcript_dir, transcript_filename)
     
     # 加载transcript数据
@@ -143,46 +146,61 @@ def process_video_timestamps(row: pd.Series, transcript_dir: str) -> str:
         print(f"警告: {filename} 未找到匹配的时间戳")
         return ''
 
-def main():
+def update_ads_time():
+    """
+    为所有广告视频查找时间戳并保存
+    """
     # 配置路径
     csv_path = os.path.join('output', 'ads_summary.csv')
     transcript_dir = os.path.join('output', 'transcript')
     
     print("开始处理视频时间戳...")
     
-    # 加载CSV文件
-    df = load_ads_summary(csv_path)
+    # 从结果数据集只读取需要的列；数据集不存在时读取并更新CSV文件
+    required_columns = ['文件名', '是否包含广告', '商品名称', '广告文本']
+    use_dataset = dataset_exists()
+    with profile_section('load'):
+        if use_dataset:
+            df = load_results(required_columns + ['发布时间', 'ads_time'])
+        else:
+            df = load_ads_summary(csv_path)
     if df is None:
         return
     
     # 检查必要的列是否存在
-    required_columns = ['文件名', '是否包含广告', '商品名称', '广告文本']
     missing_columns = [col for col in required_columns if col not in df.columns]
     if missing_columns:
-        print(f"错误: CSV文件缺少必要的列: {missing_columns}")
+        print(f"错误: 结果缺少必要的列: {missing_columns}")
         return
     
     # 添加ads_time列（如果不存在）
     if 'ads_time' not in df.columns:
         df['ads_time'] = ''
+    if '发布时间' not in df.columns:
+        df['发布时间'] = ''
     
     # 处理每个包含广告的视频
     ad_count = 0
     processed_count = 0
+    updates = []
     
     for index, row in df.iterrows():
         is_ad = row['是否包含广告']
         
         # 检查是否为广告
-        if is_ad and (isinstance(is_ad, bool) or (isinstance(is_ad, str) and is_ad.lower() == 'true')):
+        if is_ad and (isinstance(is_ad, (bool, np.bool_)) or (isinstance(is_ad, str) and is_ad.lower() == 'true')):
             ad_count += 1
             print(f"\n处理广告视频 {ad_count}: {row['文件名']}")
             
             # 查找时间戳
-            timestamps = process_video_timestamps(row, transcript_dir)
+            with profile_section('timestamps', row['文件名']):
+                timestamps = process_video_timestamps(row, transcript_dir)
             
-            # 更新DataFrame
-            df.at[index, 'ads_time'] = timestamps
+            # 只记录变化的行
+            old_timestamps = row['ads_time'] if not pd.isna(row['ads_time']) else ''
+            if timestamps != old_timestamps:
+                df.at[index, 'ads_time'] = timestamps
+                updates.append({'文件名': row['文件名'], '发布时间': row['发布时间'], 'ads_time': timestamps})
             
             if timestamps:
                 processed_count += 1
@@ -190,15 +208,33 @@ def main():
             else:
                 print("未找到时间戳")
     
-    # 保存更新后的CSV文件
+    # 保存结果：数据集只追加变化的ads_time；没有数据集时更新CSV文件
     try:
-        df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+        with profile_section('save'):
+            if use_dataset:
+                append_rows(updates)
+                saved_to = f"结果数据集（更新 {len(updates)} 条）"
+            else:
+                df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+                saved_to = csv_path
         print(f"\n处理完成!")
         print(f"总广告视频数: {ad_count}")
         print(f"成功找到时间戳的视频数: {processed_count}")
-        print(f"更新后的文件已保存到: {csv_path}")
+        print(f"更新后的结果已保存到: {saved_to}")
     except Exception as e:
-        print(f"保存CSV文件失败: {e}")
+        print(f"保存结果失败: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description='查找广告在视频中的出现时间')
+    parser.add_argument('--profile', action='store_true', help='性能剖析：按阶段和视频记录cProfile数据及内存峰值')
+    parser.add_argument('--profile-dir', default=DEFAULT_PROFILE_DIR, help=f'性能剖析结果目录（默认: {DEFAULT_PROFILE_DIR}）')
+    args = parser.parse_args()
+
+    configure_default_profiler('video_timestamp', args.profile, args.profile_dir)
+    try:
+        update_ads_time()
+    finally:
+        close_default_profiler()
 
 if __name__ == '__main__':
     main()
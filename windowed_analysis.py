@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+长转写文本的分窗分析：按whisper分段组成有重叠、token数受限的窗口，
+各窗口并发分析后合并为视频级结果（带真实起止时间）
+"""
+
+import re
+
+# 广告类型优先级，合并时取最高
+AD_TYPE_PRIORITY = {'硬广': 2, '软广': 1, '无': 0}
+
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text):
+    """
+    粗略估计token数：中文字符按1个token，其余字符按4个字符1个token
+    """
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def format_time(seconds):
+    """
+    将秒数转换为 MM:SS 格式
+    """
+    minutes = int(seconds // 60)
+    secs = int(seconds % 60)
+    return f"{minutes:02d}:{secs:02d}"
+
+
+def build_windows(segments, max_tokens=1500, overlap_tokens=200):
+    """
+    将分段组合为窗口，每个窗口不超过max_tokens（单个超长分段单独成窗），
+    相邻窗口之间重叠约overlap_tokens，避免广告内容被窗口边界截断
+    """
+    windows = []
+    sizes = [estimate_tokens(segment.get('text', '')) for segment in segments]
+    start = 0
+    while start < len(segments):
+        end = start
+        total = 0
+        while end < len(segments) and (end == start or total + sizes[end] <= max_tokens):
+            total += sizes[end]
+            end += 1
+
+        window_segments = segments[start:end]
+        windows.append({
+            'index': len(windows),
+            'start': window_segments[0].get('start', 0),
+            'end': window_segments[-1].get('end', 0),
+            'text': ''.join(segment.get('text', '') for segment in window_segments),
+            'segments': window_segments,
+        })
+        if end >= len(segments):
+            break
+
+        # 下一个窗口从末尾约overlap_tokens处开始，且至少前进一个分段
+        next_start = end
+        overlap = 0
+        while next_start - 1 > start and overlap + sizes[next_start - 1] <= overlap_tokens:
+            next_start -= 1
+            overlap += sizes[next_start]
+        start = next_start
+    return windows
+
+
+def _split_names(value, separators='、,，;；'):
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        value = separators[0].join(str(item) for item in value)
+    names = re.split('[' + re.escape(separators) + ']', str(value))
+    return [name.strip() for name in names if name.strip()]
+
+
+def locate_ad_span(window, parsed):
+    """
+    在窗口内查找商品名称或广告文本所在的分段，返回起止时间；找不到时使用整个窗口
+    """
+    search_texts = _split_names(parsed.get('product_name', ''))
+    if not search_texts:
+        search_texts = _split_names(parsed.get('ad_text', ''), '。！？!?')
+
+    matched = []
+    for segment in window['segments']:
+        segment_text = segment.get('text', '').lower()
+        if any(text.lower() in segment_text for text in search_texts):
+            matched.append(segment)
+    if matched:
+        return matched[0].get('start', 0), matched[-1].get('end', 0)
+    return window['start'], window['end']
+
+
+def merge_window_results(windows, parsed_results):
+    """
+    合并各窗口的解析结果为视频级结果
+
+    is_ad 任一窗口为真即为真；ad_type 取最高优先级；商品名称去重合并；
+    confidence 取最大值；timestamp 为各广告片段起始时间（MM:SS，以"; "分隔）
+    """
+    merged = {
+        'is_ad': False,
+        'ad_type': '无',
+        'product_name': '',
+        'ad_text': '',
+        'confidence': 0.0,
+        'timestamp': '',
+        'ad_spans': [],
+    }
+    products = []
+    ad_texts = []
+    for window, parsed in zip(windows, parsed_results):
+        if not parsed or not parsed.get('is_ad'):
+            continue
+        merged['is_ad'] = True
+        ad_type = parsed.get('ad_type', '无')
+        if AD_TYPE_PRIORITY.get(ad_type, 0) > AD_TYPE_PRIORITY.get(merged['ad_type'], 0):
+            merged['ad_type'] = ad_type
+        try:
+            merged['confidence'] = max(merged['confidence'], float(parsed.get('confidence', 0) or 0))
+        except (TypeError, ValueError):
+            pass
+        for name in _split_names(parsed.get('product_name', '')):
+            if name not in products:
+                products.append(name)
+        ad_text = str(parsed.get('ad_text', '') or '').strip()
+        if ad_text and ad_text not in ad_texts:
+            ad_texts.append(ad_text)
+
+        start, end = locate_ad_span(window, parsed)
+        merged['ad_spans'].append({
+            'window': window['index'],
+            'start': start,
+            'end': end,
+            'product_name': parsed.get('product_name', ''),
+        })
+
+    if merged['is_ad'] and merged['ad_type'] == '无':
+        merged['ad_type'] = '软广'
+    merged['product_name'] = '、'.join(products)
+    merged['ad_text'] = '；'.join(ad_texts)
+    # 重叠窗口可能重复定位到同一时间点
+    timestamps = []
+    for span in merged['ad_spans']:
+        timestamp = format_time(span['start'])
+        if timestamp not in timestamps:
+            timestamps.append(timestamp)
+    merged['timestamp'] = '; '.join(timestamps)
+    return merged
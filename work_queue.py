@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多机共享的工作队列：SQLite文件放在共享卷上（默认output/work_queue.sqlite），
+各台机器上的 main.py --worker 从队列领取视频，领取时获得一段时间的租约，处理期间定时续约（心跳）；
+机器宕机或进程退出后租约过期，视频重新回到队列由其他机器领取
+
+SQLite使用默认的回滚日志而不是WAL（WAL依赖共享内存，不能跨机器使用），
+领取、续约、完成都在 BEGIN IMMEDIATE 事务中进行，并以租约持有者作为条件，
+租约已被他人接管的机器无法再提交结果
+"""
+
+import os
+import time
+import socket
+import sqlite3
+import threading
+
+DEFAULT_QUEUE_PATH = os.path.join('output', 'work_queue.sqlite')
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_MAX_ATTEMPTS = 3
+
+STATUSES = ('queued', 'leased', 'done', 'failed')
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    基于SQLite的租约式工作队列（多线程、多进程、多机器安全）
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH, max_attempts=DEFAULT_MAX_ATTEMPTS, busy_timeout=60):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # isolation_level=None：由下面的方法显式控制事务
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=DELETE')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                video_path TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                stage TEXT,
+                owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                force INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                enqueued_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, enqueued_at)')
+
+    def _transaction(self, func):
+        """
+        在写事务中执行func(conn)；BEGIN IMMEDIATE保证同一时刻只有一个写者
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = func(self._conn)
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            return result
+
+    def enqueue(self, video_paths, force=False):
+        """
+        加入队列，返回新加入（或重新排队）的数量；已在队列中的视频不重复加入，
+        force为True时已完成或失败的视频也重新排队（并强制重新处理）
+        """
+        now = time.time()
+
+        def insert(conn):
+            added = 0
+            for video_path in video_paths:
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO jobs (video_path, status, force, enqueued_at, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (video_path, 'queued', int(force), now, now),
+                )
+                if cursor.rowcount == 0 and force:
+                    cursor = conn.execute(
+                        "UPDATE jobs SET status = 'queued', stage = NULL, owner = NULL, lease_expires = NULL, "
+                        "attempts = 0, force = 1, error = NULL, enqueued_at = ?, updated_at = ? "
+                        "WHERE video_path = ? AND status IN ('done', 'failed')",
+                        (now, now, video_path),
+                    )
+                added += cursor.rowcount
+            return added
+
+        return self._transaction(insert)
+
+    def _requeue_expired(self, conn, now):
+        """
+        租约过期的视频重新排队；已达到最大尝试次数的标记为失败
+        """
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', owner = NULL, lease_expires = NULL, error = '租约过期次数过多', "
+            "updated_at = ? WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, now, self.max_attempts),
+        )
+        return conn.execute(
+            "UPDATE jobs SET status = 'queued', owner = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE status = 'leased' AND lease_expires < ?",
+            (now, now),
+        ).rowcount
+
+    def claim(self, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        领取最早加入队列的视频，返回任务dict；队列为空返回None
+        """
+        def take(conn):
+            now = time.time()
+            requeued = self._requeue_expired(conn, now)
+            if requeued:
+                print(f"{requeued} 个视频的租约已过期，重新排队")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY enqueued_at, video_path LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE video_path = ?",
+                (worker_id, now + lease_seconds, now, row['video_path']),
+            )
+            job = dict(row)
+            job.update(status='leased', owner=worker_id, attempts=row['attempts'] + 1)
+            return job
+
+        return self._transaction(take)
+
+    def heartbeat(self, video_path, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        续约；租约已过期并被他人领取（或已不在租约中）时返回False
+        """
+        def renew(conn):
+            return conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE video_path = ? AND owner = ? AND status = 'leased'",
+                (time.time() + lease_seconds, time.time(), video_path, worker_id),
+            ).rowcount == 1
+
+        return self._transaction(renew)
+
+    def commit_stage(self, video_path, worker_id, stage):
+        """
+        记录阶段完成（仍持有租约时），返回是否成功
+        """
+        def update(conn):
+            return conn.execute(
+                "UPDATE jobs SET stage = ?, updated_at = ? WHERE video_path = ? AND owner = ? AND status = 'leased'",
+                (stage, time.time(), video_path, worker_id),
+            ).rowcount == 1
+
+        return self._transaction(update)
+
+    def complete(self, video_path, worker_id):
+        def update(conn):
+            return conn.execute(
+                "UPDATE jobs SET status = 'done', owner = NULL, lease_expires = NULL, error = NULL, updated_at = ? "
+                "WHERE video_path = ? AND owner = ? AND status = 'leased'",
+                (time.time(), video_path, worker_id),
+            ).rowcount == 1
+
+        return self._transaction(update)
+
+    def fail(self, video_path, worker_id, error=''):
+        """
+        处理失败：未达到最大尝试次数时重新排队，否则标记为失败
+        """
+        def update(conn):
+            now = time.time()
+            return conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                "owner = NULL, lease_expires = NULL, error = ?, updated_at = ? "
+                "WHERE video_path = ? AND owner = ? AND status = 'leased'",
+                (self.max_attempts, str(error)[:500], now, video_path, worker_id),
+            ).rowcount == 1
+
+        return self._transaction(update)
+
+    def release(self, video_path, worker_id):
+        """
+        主动归还租约（如进程退出时尚未处理完），不计入尝试次数
+        """
+        def update(conn):
+            return conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, lease_expires = NULL, "
+                "attempts = MAX(attempts - 1, 0), updated_at = ? "
+                "WHERE video_path = ? AND owner = ? AND status = 'leased'",
+                (time.time(), video_path, worker_id),
+            ).rowcount == 1
+
+        return self._transaction(update)
+
+    def counts(self):
+        """
+        各状态的视频数
+        """
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    def print_report(self):
+        counts = self.counts()
+        print(f"工作队列: 待处理 {counts['queued']} 个，处理中 {counts['leased']} 个，"
+              f"已完成 {counts['done']} 个，失败 {counts['failed']} 个（{self.path}）")
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LeaseKeeper:
+    """
+    跟踪本进程持有的租约，后台线程每 lease_seconds/3 秒续约一次；
+    续约失败（租约已被他人接管）的视频记为失效，之后的阶段结果不再提交
+    """
+
+    def __init__(self, queue, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.queue = queue
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self._held = set()
+        self._lost = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='lease-heartbeat', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            with self._lock:
+                held = list(self._held - self._lost)
+            for video_path in held:
+                try:
+                    renewed = self.queue.heartbeat(video_path, self.worker_id, self.lease_seconds)
+                except sqlite3.Error as e:
+                    # 共享卷暂时不可用时下次再试，租约时长应远大于续约间隔
+                    print(f"续约失败，稍后重试: {video_path}: {e}")
+                    continue
+                if not renewed:
+                    print(f"租约已失效: {video_path}")
+                    with self._lock:
+                        self._lost.add(video_path)
+
+    def add(self, video_path):
+        with self._lock:
+            self._held.add(video_path)
+            self._lost.discard(video_path)
+
+    def holds(self, video_path):
+        with self._lock:
+            return video_path in self._held and video_path not in self._lost
+
+    def drop(self, video_path):
+        """
+        不再跟踪该视频（租约已失效或已交还队列）
+        """
+        with self._lock:
+            self._held.discard(video_path)
+            self._lost.discard(video_path)
+
+    def commit_stage(self, video_path, stage):
+        """
+        记录阶段完成；租约已失效或无法访问队列时返回False，此时不再跟踪该视频
+        """
+        if not self.holds(video_path):
+            return False
+        try:
+            if self.queue.commit_stage(video_path, self.worker_id, stage):
+                return True
+        except sqlite3.Error as e:
+            print(f"记录阶段完成失败: {video_path}: {e}")
+            self.fail(video_path, f"{stage}: {e}")
+            return False
+        with self._lock:
+            self._lost.add(video_path)
+        return False
+
+    def complete(self, video_path):
+        ok = False
+        try:
+            ok = self.holds(video_path) and self.queue.complete(video_path, self.worker_id)
+        except sqlite3.Error as e:
+            print(f"标记完成失败: {video_path}: {e}")
+            self.fail(video_path, str(e))
+        self.drop(video_path)
+        return ok
+
+    def fail(self, video_path, error=''):
+        """
+        交还队列；无法访问队列时只停止续约，租约过期后由其他进程重新领取
+        """
+        try:
+            if self.holds(video_path):
+                self.queue.fail(video_path, self.worker_id, error)
+        except sqlite3.Error as e:
+            print(f"交还队列失败，等待租约过期: {video_path}: {e}")
+        finally:
+            self.drop(video_path)
+
+    def stop(self):
+        """
+        停止续约，归还尚未处理完的租约
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        with self._lock:
+            held = list(self._held - self._lost)
+            self._held.clear()
+            self._lost.clear()
+        for video_path in held:
+            self.queue.release(video_path, self.worker_id)
+        if held:
+            print(f"已归还 {len(held)} 个未完成的租约")